@@ -8,3 +8,8 @@ pip install biopython
 
 # prodigal -i Human.fasta -o Human.gff -d Human_cds.fasta -p meta -a HBV_protein.faa -f gff
 
+
+# 向量化翻译（不依赖Prodigal）：CDS批量翻译、六框翻译、环状基因组ORF（含跨原点的重叠ORF）
+# python tools/translate.py cds --fasta 新更新/功能注释下载/cat_cds.fasta --output cat_protein.faa --table 11
+# python tools/translate.py frames --fasta Human.fasta --output Human_frames.faa --circular
+# python tools/translate.py orfs --fasta Human.fasta --output Human_orfs.faa --orf-table Human_orfs.tsv --circular --min-length 50
@@ -1,6 +1,15 @@
-from Bio import SeqIO
 import argparse
-from typing import Dict, Tuple
+import glob
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tools"))
+from fasta_io import iter_fasta
+from promoter_windows import CircularGenome, parse_windows, sweep_windows, window_output_path
 
 
 def load_genome_database(fasta_path: str) -> Dict[str, Dict[str, str | int]]:
@@ -10,7 +19,7 @@ def load_genome_database(fasta_path: str) -> Dict[str, Dict[str, str | int]]:
     """
     genome_dict = {}
     try:
-        for record in SeqIO.parse(fasta_path, "fasta"):
+        for record in iter_fasta(fasta_path, uppercase=True):
             # 提取基因组名称：>到第一个_之间的部分（如>ACNDV_... → ACNDV；>NC076022.1_... → NC076022.1）
             fasta_header = record.id  # 不含">"的序列名
             first_underscore_idx = fasta_header.find("_")
@@ -19,8 +28,8 @@ def load_genome_database(fasta_path: str) -> Dict[str, Dict[str, str | int]]:
                 continue
             genome_name = fasta_header[:first_underscore_idx]
             
-            # 处理序列（转为大写，确保无换行）
-            genome_seq = str(record.seq).upper()
+            # 处理序列（读取时已转为大写、去除换行）
+            genome_seq = record.sequence
             genome_len = len(genome_seq)
             
             # 去重（重复名称覆盖）
@@ -122,23 +131,21 @@ def extract_circular_promoter(genome_info: Dict[str, str | int], cds_start: int,
         return prom_seq
 
 
-def main(homer_path: str, fasta_path: str, output_path: str, promoter_len: int = 100):
-    # 1. 加载基因组数据库
-    genome_dict = load_genome_database(fasta_path)
-    
-    # 2. 处理Homer_1.txt并提取启动子
+def extract_promoters(homer_path: str, genome_dict: Dict[str, Dict[str, str | int]], output_path: str,
+                      promoter_len: int = 100, verbose: bool = True) -> Dict[str, int]:
+    """
+    处理一个Homer_*.txt并提取启动子写入output_path
+    返回计数：{"total": 非空行数, "success": 成功数, "missing_genome": 未找到基因组而跳过的行数, "error": 出错跳过的行数}
+    """
+    counts = {"total": 0, "success": 0, "missing_genome": 0, "error": 0}
     with open(homer_path, "r", encoding="utf-8") as homer_f, \
          open(output_path, "w", encoding="utf-8") as out_f:
-        
-        success_count = 0
-        total_count = 0
-        
         for line_num, line in enumerate(homer_f, 1):
             line = line.strip()
             # 跳过空行
             if not line:
                 continue
-            total_count += 1
+            counts["total"] += 1
             
             try:
                 # 解析Homer行
@@ -147,6 +154,7 @@ def main(homer_path: str, fasta_path: str, output_path: str, promoter_len: int =
                 # 检查基因组是否存在
                 if genome_name not in genome_dict:
                     print(f"跳过第{line_num}行：{original_header} → 未找到匹配基因组{genome_name}")
+                    counts["missing_genome"] += 1
                     continue
                 
                 # 提取启动子
@@ -158,26 +166,184 @@ def main(homer_path: str, fasta_path: str, output_path: str, promoter_len: int =
                 for i in range(0, len(promoter_seq), 80):
                     out_f.write(promoter_seq[i:i+80] + "\n")
                 
-                success_count += 1
-                print(f"处理成功第{line_num}行：{original_header}")
+                counts["success"] += 1
+                if verbose:
+                    print(f"处理成功第{line_num}行：{original_header}")
             
             except Exception as e:
                 print(f"跳过第{line_num}行：{line} → 错误：{str(e)}")
+                counts["error"] += 1
                 continue
+    return counts
+
+
+def main(homer_path: str, fasta_path: str, output_path: str, promoter_len: int = 100):
+    # 1. 加载基因组数据库
+    genome_dict = load_genome_database(fasta_path)
+    
+    # 2. 处理Homer_1.txt并提取启动子
+    counts = extract_promoters(homer_path, genome_dict, output_path, promoter_len)
     
     # 输出统计结果
-    print(f"\n处理完成！成功提取 {success_count}/{total_count} 个启动子")
+    print(f"\n处理完成！成功提取 {counts['success']}/{counts['total']} 个启动子")
     print(f"结果保存至：{output_path}")
 
 
+def iter_window_records(homer_path: str, genome_dict: Dict[str, Dict[str, str | int]]) -> Iterator[Tuple[str, CircularGenome, int]]:
+    """
+    扫描模式的记录生成器：逐行解析Homer_1.txt，给出(原始名称（不含">"）, 环状基因组, CDS起始位点)
+    每个基因组只建立一次CircularGenome，所有窗口共用同一环状索引
+    """
+    genomes: Dict[str, CircularGenome] = {}
+    with open(homer_path, "r", encoding="utf-8") as homer_f:
+        for line_num, line in enumerate(homer_f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                genome_name, cds_start, original_header = parse_homer_line(line)
+            except ValueError as e:
+                print(f"跳过第{line_num}行：{line} → 错误：{str(e)}")
+                continue
+            if genome_name not in genome_dict:
+                print(f"跳过第{line_num}行：{original_header} → 未找到匹配基因组{genome_name}")
+                continue
+            if not 1 <= cds_start <= genome_dict[genome_name]["len"]:
+                print(f"跳过第{line_num}行：{original_header} → CDS起始位点{cds_start}超出基因组范围")
+                continue
+            if genome_name not in genomes:
+                genomes[genome_name] = CircularGenome(genome_dict[genome_name]["seq"])
+            yield original_header[1:], genomes[genome_name], cds_start
+
+
+def sweep(homer_path: str, fasta_path: str, output_path: str, windows: List[Tuple[int, int]], columnar_path: str = None):
+    """扫描模式：基因组只加载一次，一次遍历提取全部窗口（每个窗口一个FASTA，或一个列式TSV）"""
+    genome_dict = load_genome_database(fasta_path)
+    count = sweep_windows(iter_window_records(homer_path, genome_dict), windows, output_path,
+                          columnar_path, line_width=80, fasta_outputs=not columnar_path)
+    print(f"\n处理完成！共提取 {count} 个CDS × {len(windows)} 个窗口")
+
+
+# 批量模式的工作进程状态：父进程加载基因组后放入_WORKER，fork出的工作进程直接继承，不再重新解析FASTA
+_WORKER: Dict[str, object] = {}
+BATCH_COLUMNS = ("table", "output", "status", "total", "success", "skipped", "seconds")
+
+
+def expand_tables(patterns: List[str]) -> List[str]:
+    """展开通配符（如"6_pre/Homer_*.txt"），按路径排序去重；没有匹配的模式给出警告"""
+    tables: List[str] = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern))
+        if not matches:
+            print(f"警告：{pattern} 没有匹配的CDS表，跳过")
+        tables.extend(m for m in matches if m not in tables)
+    return tables
+
+
+def batch_output_path(output_dir: str, homer_path: str) -> str:
+    """每个CDS表对应的输出：输出目录/表名（去扩展名）.promoters.fasta"""
+    return os.path.join(output_dir, os.path.splitext(os.path.basename(homer_path))[0] + ".promoters.fasta")
+
+
+def _init_worker(fasta_path: str, params: Dict[str, object]) -> None:
+    # fork启动时_WORKER已由父进程填好；不支持fork的平台（spawn）才在工作进程中自行加载
+    if "genomes" not in _WORKER:
+        _WORKER["genomes"] = load_genome_database(fasta_path)
+    _WORKER["params"] = params
+
+
+def _extract_table(homer_path: str, output_path: str) -> Dict[str, object]:
+    genome_dict = _WORKER["genomes"]
+    params = _WORKER["params"]
+    t0 = time.time()
+    status = "ok"
+    try:
+        if params["windows"]:
+            success = sweep_windows(iter_window_records(homer_path, genome_dict), params["windows"], output_path,
+                                    line_width=80)
+            with open(homer_path, "r", encoding="utf-8") as f:
+                total = sum(1 for line in f if line.strip())
+        else:
+            counts = extract_promoters(homer_path, genome_dict, output_path, params["promoter_len"], verbose=False)
+            total, success = counts["total"], counts["success"]
+    except OSError as e:
+        print(f"处理失败：{homer_path} → 错误：{str(e)}")
+        status, total, success = "failed", 0, 0
+    # 扫描模式下实际写出的是每个窗口一个文件，汇总表记录这些路径（逗号分隔）
+    if params["windows"]:
+        output_path = ",".join(window_output_path(output_path, up, down) for up, down in params["windows"])
+    return {"table": homer_path, "output": output_path, "status": status, "total": total, "success": success,
+            "skipped": total - success, "seconds": round(time.time() - t0, 3)}
+
+
+def batch(homer_patterns: List[str], fasta_path: str, output_dir: str, promoter_len: int = 100,
+          windows: List[Tuple[int, int]] = None, workers: int = 0, summary_path: str = None) -> List[Dict[str, object]]:
+    """
+    批量模式：基因组FASTA只加载一次，多个CDS表（如各蛋白类别、各基因型的Homer_*.txt）分配到进程池并行提取，
+    每个表输出一个启动子FASTA（扫描模式下每个表每个窗口一个），并写出汇总表（成功/跳过数）
+    """
+    tables = expand_tables(homer_patterns)
+    if not tables:
+        raise ValueError("没有可处理的CDS表")
+    os.makedirs(output_dir, exist_ok=True)
+    _WORKER["genomes"] = load_genome_database(fasta_path)
+    params = {"promoter_len": promoter_len, "windows": windows or []}
+    workers = min(workers or os.cpu_count() or 1, len(tables))
+    results: List[Dict[str, object]] = []
+    if workers <= 1:
+        _init_worker(fasta_path, params)
+        results = [_extract_table(table, batch_output_path(output_dir, table)) for table in tables]
+    else:
+        context = multiprocessing.get_context("fork") if "fork" in multiprocessing.get_all_start_methods() else None
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker,
+                                 initargs=(fasta_path, params)) as executor:
+            results = list(executor.map(_extract_table, tables, [batch_output_path(output_dir, t) for t in tables]))
+    summary_path = summary_path or os.path.join(output_dir, "batch_summary.tsv")
+    with open(summary_path, "w", encoding="utf-8") as f:
+        f.write("\t".join(BATCH_COLUMNS) + "\n")
+        for result in results:
+            f.write("\t".join(str(result[column]) for column in BATCH_COLUMNS) + "\n")
+    for result in results:
+        print(f"{result['table']}：成功 {result['success']}/{result['total']}，跳过 {result['skipped']}"
+              f"{'（处理失败）' if result['status'] != 'ok' else ''} → {result['output']}")
+    print(f"\n批量处理完成！{len(results)} 个CDS表，共成功提取 {sum(r['success'] for r in results)} 个启动子")
+    print(f"汇总表保存至：{summary_path}")
+    return results
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="提取HBV类环状基因组的启动子序列（适配Homer_1和DATA_fasta格式）")
-    parser.add_argument("--homer", required=True, help="Homer_1.txt文件路径（含CDS名称和起始位点）")
+    parser.add_argument("--homer", required=True, nargs="+", help="Homer_1.txt文件路径（含CDS名称和起始位点）；批量模式下可给多个文件或通配符")
     parser.add_argument("--fasta", required=True, help="DATA_fasta.txt文件路径（含基因组序列）")
     parser.add_argument("--output", required=True, help="输出启动子文件路径（FASTA格式）")
     parser.add_argument("--promoter-len", type=int, default=100, help="启动子长度（默认100bp）")
+    parser.add_argument("--windows", help="扫描模式：逗号分隔的\"上游[:下游]\"窗口列表（如100,250,500,1000:100），每个窗口输出一个文件")
+    parser.add_argument("--columnar", help="扫描模式下改为输出单个列式TSV文件（每个窗口一列）")
+    parser.add_argument("--batch", action="store_true", help="批量模式：--homer为多个CDS表或通配符（如'6_pre/Homer_*.txt'），--output为输出目录，基因组只加载一次")
+    parser.add_argument("--workers", type=int, default=0, help="批量模式的并行进程数（默认CPU核数）")
+    parser.add_argument("--summary", help="批量模式的汇总表路径（默认输出目录/batch_summary.tsv）")
     
     args = parser.parse_args()
+    windows = []
+    if args.windows:
+        try:
+            windows = parse_windows(args.windows)
+        except ValueError as e:
+            parser.error(str(e))
+    if args.batch:
+        if args.columnar:
+            parser.error("批量模式不支持--columnar")
+        try:
+            batch(args.homer, args.fasta, args.output, args.promoter_len, windows, args.workers, args.summary)
+        except ValueError as e:
+            parser.error(str(e))
+        sys.exit(0)
+    if len(args.homer) > 1:
+        parser.error("给出多个CDS表时请使用--batch")
+    args.homer = args.homer[0]
+    if windows:
+        sweep(args.homer, args.fasta, args.output, windows, args.columnar)
+        sys.exit(0)
     main(
         homer_path=args.homer,
         fasta_path=args.fasta,
@@ -18,3 +18,6 @@ blastn -db HBV_SP2_M.db -query Human.fasta -out all_add.blast4  -outfmt "6 qseqi
 
 # method_1
 
+
+# 翻译蛋白搜索（类似blastx，不需要安装BLAST）：在远缘nackednavirus基因组的六框翻译上定位HBV P/S/X/C的同源区域，并提取其上游启动子
+python ../tools/protein_search.py --proteins HBV_protein.faa --genomes ../不同物种代表性序列/* --output nackednavirus_protein.blastx --promoters nackednavirus_promoters.fasta --upstream 500 --circular --workers 8
@@ -1,13 +1,15 @@
+import os
 import sys
-from Bio import SeqIO
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "tools"))
+from fasta_io import iter_fasta
 
 def read_fasta_file(fasta_file):
     """读取FASTA文件，返回一个字典{序列ID(空格前部分): 序列}"""
     sequences = {}
-    for record in SeqIO.parse(fasta_file, "fasta"):
-        # 只提取空格前的部分作为序列ID
-        seq_id = record.id.split()[0]  # 分割空格，取第一个元素
-        sequences[seq_id] = str(record.seq)
+    for record in iter_fasta(fasta_file):
+        # record.id即">"后第一个空格前的部分
+        sequences[record.id] = record.sequence
     return sequences
 
 def extract_sequences(blast_result, fasta_sequences, output_file):
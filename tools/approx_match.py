@@ -0,0 +1,277 @@
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from fasta_io import FastaBatch, iter_fasta_batches
+
+# IUPAC字符 → 可匹配的碱基（序列中的N和简并碱基一律按错配计）
+IUPAC = {
+    "A": "A", "C": "C", "G": "G", "T": "T", "U": "T",
+    "R": "AG", "Y": "CT", "S": "CG", "W": "AT", "K": "GT", "M": "AC",
+    "B": "CGT", "D": "AGT", "H": "ACT", "V": "ACG", "N": "ACGT",
+}
+_IUPAC_COMPLEMENT = str.maketrans("ACGTURYSWKMBDHVN", "TGCAAYRSWMKVHDBN")
+BASE_CODES = {"A": 0, "C": 1, "G": 2, "T": 3}
+WORD_BITS = 64
+# 默认元件：经典核心启动子元件与HBV调控元件的共有序列（名称, IUPAC模式）
+DEFAULT_ELEMENTS = [
+    ("TATA_box", "TATAWAWR"),
+    ("CCAAT_box", "RRCCAATSR"),
+    ("GC_box", "GGGGCGGGG"),
+    ("HBV_DR1_DR2", "TTCACCTCTGC"),
+    ("HNF4_DR1", "RGGTCAAAGGTCA"),
+    ("HNF1", "GTTAATNATTAAC"),
+    ("CEBP", "ATTGCGCAAT"),
+    ("NF1", "TGGCNNNNNGCCAA"),
+]
+OUTPUT_COLUMNS = ("seq_id", "start", "end", "motif", "strand", "score", "mismatches")
+
+
+def reverse_complement_iupac(pattern: str) -> str:
+    return pattern.translate(_IUPAC_COMPLEMENT)[::-1]
+
+
+def read_patterns(path: str) -> List[Tuple[str, str, Optional[int]]]:
+    """
+    读取模式文件：每行"名称<TAB>IUPAC模式[<TAB>最大错配数]"，#开头为注释
+    返回[(名称, 模式, 最大错配数或None)]
+    """
+    patterns = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_num, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            parts = line.split()
+            try:
+                patterns.append((parts[0], parts[1].upper(), int(parts[2]) if len(parts) > 2 else None))
+            except (IndexError, ValueError):
+                print(f"跳过第{line_num}行：{line} → 格式错误（需为：名称 模式 [最大错配数]）")
+    return patterns
+
+
+class PatternSet:
+    """
+    多模式移位-与（shift-and）的位表：每个模式的正链与反向互补（回文模式只保留正链）依次装入64位字，
+    每条占连续的len位；starts/ends为各条首位/末位的掩码，masks[w, c]为字w中可匹配碱基c的位（c=4即N，全为0）
+    """
+
+    __slots__ = ("names", "patterns", "strands", "lengths", "max_mismatches", "words", "end_bits",
+                 "masks", "starts", "ends")
+
+    def __init__(self, patterns: List[Tuple[str, str, Optional[int]]], max_mismatches: int):
+        self.names: List[str] = []
+        self.patterns: List[str] = []
+        self.strands: List[str] = []
+        limits: List[int] = []
+        for name, pattern, k in patterns:
+            pattern = pattern.upper()
+            bad = set(pattern) - set(IUPAC)
+            if bad:
+                raise ValueError(f"模式{name}含非IUPAC字符：{''.join(sorted(bad))}")
+            if not 0 < len(pattern) <= WORD_BITS:
+                raise ValueError(f"模式{name}长度需为1~{WORD_BITS}：{len(pattern)}")
+            k = max_mismatches if k is None else k
+            if k >= len(pattern):
+                raise ValueError(f"模式{name}的最大错配数{k}不小于模式长度{len(pattern)}")
+            reverse = reverse_complement_iupac(pattern)
+            for strand, variant in [("+", pattern)] + ([("-", reverse)] if reverse != pattern else []):
+                self.names.append(name)
+                self.patterns.append(variant)
+                self.strands.append(strand)
+                limits.append(k)
+        self.lengths = np.array([len(p) for p in self.patterns], dtype=np.int64)
+        self.max_mismatches = np.array(limits, dtype=np.int64)
+        # 顺序装箱：当前字放不下时另起一个字
+        self.words = np.zeros(len(self.patterns), dtype=np.int64)
+        self.end_bits = np.zeros(len(self.patterns), dtype=np.int64)
+        word, used = 0, 0
+        for i, length in enumerate(self.lengths):
+            if used + length > WORD_BITS:
+                word, used = word + 1, 0
+            self.words[i] = word
+            self.end_bits[i] = used + length - 1
+            used += length
+        self.masks = np.zeros((word + 1, 5), dtype=np.uint64)
+        self.starts = np.zeros(word + 1, dtype=np.uint64)
+        self.ends = np.zeros(word + 1, dtype=np.uint64)
+        for i, pattern in enumerate(self.patterns):
+            w = self.words[i]
+            first = int(self.end_bits[i]) - len(pattern) + 1
+            self.starts[w] |= np.uint64(1 << first)
+            self.ends[w] |= np.uint64(1 << int(self.end_bits[i]))
+            for j, char in enumerate(pattern):
+                for base in IUPAC[char]:
+                    self.masks[w, BASE_CODES[base]] |= np.uint64(1 << (first + j))
+
+    def __len__(self) -> int:
+        return len(self.patterns)
+
+
+def shift_and_scan(codes: np.ndarray, patterns: PatternSet) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    带错配的多模式移位-与，对codes（N条序列 × T列，碱基编码，不足处以4填充）的所有序列同时推进：
+        R0' = ((R0 << 1) | starts) & masks[c]
+        Rd' = (((Rd << 1) | starts) & masks[c]) | ((R(d-1) << 1) | starts)     d = 1..k
+    Rd的第j位表示"模式前j+1位与当前位置结尾的文本最多d处错配"，末位置位即为命中
+    返回(序列下标, 模式条目下标, 命中末位置（0-based，含）, 错配数)
+    """
+    n_seqs, n_cols = codes.shape
+    k = int(patterns.max_mismatches.max())
+    n_words = len(patterns.starts)
+    columns = np.ascontiguousarray(codes.T)
+    one = np.uint64(1)
+    starts = patterns.starts[None, :, None]
+    ends = patterns.ends[:, None]
+    state = np.zeros((k + 1, n_words, n_seqs), dtype=np.uint64)
+    shifted = np.empty_like(state)
+    found = np.empty((n_words, n_seqs), dtype=np.uint64)
+    positions, word_index, seq_index, values = [], [], [], []
+    for t in range(n_cols):
+        np.left_shift(state, one, out=shifted)
+        np.bitwise_or(shifted, starts, out=shifted)
+        np.bitwise_and(shifted, patterns.masks[:, columns[t]][None], out=state)
+        if k:
+            np.bitwise_or(state[1:], shifted[:-1], out=state[1:])
+        np.bitwise_and(state[k], ends, out=found)
+        if found.any():
+            w, n = np.nonzero(found)
+            positions.append(np.full(len(w), t, dtype=np.int64))
+            word_index.append(w)
+            seq_index.append(n)
+            values.append(state[:, w, n].T)
+    if not positions:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty, empty
+    positions = np.concatenate(positions)
+    word_index = np.concatenate(word_index)
+    seq_index = np.concatenate(seq_index)
+    values = np.concatenate(values)
+    # 每个(位置, 字)可能同时含多个模式的命中：逐个模式条目取出，错配数 = 末位首次置位的层数
+    out_seq, out_entry, out_end, out_mismatch = [], [], [], []
+    for entry in range(len(patterns)):
+        bit = np.uint64(1 << int(patterns.end_bits[entry]))
+        rows = np.flatnonzero((word_index == patterns.words[entry]) & ((values[:, k] & bit) != 0))
+        if len(rows) == 0:
+            continue
+        mismatches = np.argmax((values[rows] & bit) != 0, axis=1)
+        keep = mismatches <= patterns.max_mismatches[entry]
+        rows = rows[keep]
+        out_seq.append(seq_index[rows])
+        out_entry.append(np.full(len(rows), entry, dtype=np.int64))
+        out_end.append(positions[rows])
+        out_mismatch.append(mismatches[keep])
+    if not out_seq:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty, empty
+    return (np.concatenate(out_seq), np.concatenate(out_entry), np.concatenate(out_end),
+            np.concatenate(out_mismatch))
+
+
+def pack_batch(batch: FastaBatch, wrap: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    一批序列排成矩阵（每行一条，不足处填4），wrap > 0时每条序列末尾接上其开头的wrap个碱基（环状基因组）
+    返回(编码矩阵, 各序列长度)
+    """
+    codes = batch.encoded()
+    lengths = np.diff(batch.offsets).astype(np.int64)
+    matrix = np.full((len(lengths), int(lengths.max(initial=0)) + wrap), 4, dtype=np.uint8)
+    for i, length in enumerate(lengths):
+        seq = codes[batch.offsets[i]:batch.offsets[i + 1]]
+        matrix[i, :length] = seq
+        if wrap and length:
+            matrix[i, length:length + wrap] = np.resize(seq, wrap)
+    return matrix, lengths
+
+
+def match_batch(batch: FastaBatch, patterns: PatternSet,
+                circular: bool) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """扫描一批序列，返回(序列下标, 起点, 终点, 模式条目下标, 错配数)各列，按序列、起点、条目排序"""
+    wrap = int(patterns.lengths.max()) - 1 if circular else 0
+    matrix, lengths = pack_batch(batch, wrap)
+    seq_index, entry, end, mismatches = shift_and_scan(matrix, patterns)
+    start = end + 1 - patterns.lengths[entry]
+    # 线性：命中不能伸入填充区；环状：起点在[0, L)，终点可超过L（跨原点）
+    keep = start < lengths[seq_index] if circular else end < lengths[seq_index]
+    seq_index, start, end, entry, mismatches = seq_index[keep], start[keep], end[keep] + 1, entry[keep], mismatches[keep]
+    order = np.lexsort((entry, start, seq_index))
+    return seq_index[order], start[order], end[order], entry[order], mismatches[order]
+
+
+_WORKER: Dict[str, object] = {}
+
+
+def _init_worker(patterns: List[Tuple[str, str, Optional[int]]], params: Dict[str, object]) -> None:
+    _WORKER["patterns"] = PatternSet(patterns, params["max_mismatches"])
+    _WORKER["params"] = params
+
+
+def _match_batch(batch: FastaBatch) -> List[str]:
+    """工作进程：扫描一批序列，返回统一命中表的输出行"""
+    patterns: PatternSet = _WORKER["patterns"]
+    seq_index, start, end, entry, mismatches = match_batch(batch, patterns, _WORKER["params"]["circular"])
+    labels = [f"\t{name}\t{strand}\t" for name, strand in zip(patterns.names, patterns.strands)]
+    ids = batch.ids
+    return [f"{ids[i]}\t{s}\t{e}{labels[p]}{score}\t{m}\n" for i, s, e, p, score, m in
+            zip(seq_index.tolist(), start.tolist(), end.tolist(), entry.tolist(),
+                (patterns.lengths[entry] - mismatches).tolist(), mismatches.tolist())]
+
+
+def parse_pattern_arg(text: str) -> Tuple[str, str, Optional[int]]:
+    """命令行模式："名称=IUPAC模式[:最大错配数]"，如DR1=TTCACCTCTGC:1"""
+    name, _, pattern = text.partition("=")
+    if not name or not pattern:
+        raise ValueError(f"模式格式错误：{text}（需为 名称=模式[:最大错配数]）")
+    pattern, _, k = pattern.partition(":")
+    return name, pattern.upper(), int(k) if k else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="核心启动子元件的近似匹配：多个IUPAC模式打包为位并行移位-与（允许k个错配），在所有序列上同时推进，报告两条链上的命中位置与错配数")
+    parser.add_argument("--fasta", required=True, help="输入FASTA（如sequences.fasta或启动子窗口FASTA）")
+    parser.add_argument("--output", required=True, help="输出统一命中表（seq_id start end motif strand score mismatches，0-based半开）")
+    parser.add_argument("--patterns", help="模式文件（每行：名称 IUPAC模式 [最大错配数]），不给出时使用内置的核心启动子/HBV元件")
+    parser.add_argument("--pattern", action="append", default=[], help="追加模式：名称=IUPAC模式[:最大错配数]，可重复")
+    parser.add_argument("--max-mismatches", type=int, default=2, help="默认最大错配数（默认2）")
+    parser.add_argument("--circular", action="store_true", help="按环状基因组处理（报告跨原点的命中，终点可大于序列长度）")
+    parser.add_argument("--workers", type=int, default=1, help="并行进程数（默认1）")
+    parser.add_argument("--batch-bases", type=int, default=1 << 20, help="每批序列的碱基数（默认1M）")
+    args = parser.parse_args()
+
+    try:
+        patterns = read_patterns(args.patterns) if args.patterns else []
+        patterns += [parse_pattern_arg(text) for text in args.pattern]
+        if not patterns:
+            patterns = [(name, pattern, None) for name, pattern in DEFAULT_ELEMENTS]
+        pattern_set = PatternSet(patterns, args.max_mismatches)
+    except ValueError as e:
+        parser.error(str(e))
+    params = {"max_mismatches": args.max_mismatches, "circular": args.circular}
+    print(f"模式 {len(patterns)} 个（含反向互补共 {len(pattern_set)} 条，打包为 {len(pattern_set.starts)} 个64位字），"
+          f"最大错配数 {int(pattern_set.max_mismatches.max())}")
+
+    t0 = time.time()
+    batches = iter_fasta_batches(args.fasta, args.batch_bases)
+    if args.workers > 1:
+        executor = ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker, initargs=(patterns, params))
+        results = executor.map(_match_batch, batches)
+    else:
+        executor = None
+        _init_worker(patterns, params)
+        results = map(_match_batch, batches)
+    total = 0
+    with open(args.output, "w", encoding="utf-8") as out:
+        out.write("\t".join(OUTPUT_COLUMNS) + "\n")
+        for lines in results:
+            out.writelines(lines)
+            total += len(lines)
+    if executor:
+        executor.shutdown()
+    print(f"匹配完成（{time.time() - t0:.2f} 秒）：共 {total} 个命中，结果保存至：{args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+import mmap
+import os
+from typing import Iterator, List, Tuple
+
+import numpy as np
+
+# ACGT → 0..3，其余字符（N及IUPAC简并碱基）→ 4
+_DNA_CODES = bytes(
+    {ord("A"): 0, ord("C"): 1, ord("G"): 2, ord("T"): 3,
+     ord("a"): 0, ord("c"): 1, ord("g"): 2, ord("t"): 3}.get(i, 4) for i in range(256)
+)
+
+# 序列行中去除的空白字符
+_WHITESPACE = b"\r\n \t"
+
+# 批量读取时每批的碱基数上限
+BATCH_BASES = 1 << 24
+
+
+class FastaRecord:
+    """
+    单条FASTA记录：id为">"后第一个空白前的部分，description为完整标题行（不含">"和行尾换行），
+    sequence为去除换行等空白后的序列
+    """
+    __slots__ = ("id", "description", "sequence")
+
+    def __init__(self, id: str, description: str, sequence: str):
+        self.id = id
+        self.description = description
+        self.sequence = sequence
+
+    def __len__(self) -> int:
+        return len(self.sequence)
+
+    def __repr__(self) -> str:
+        return f"FastaRecord({self.id!r}, {len(self.sequence)} bp)"
+
+
+def _next_header(buffer, start: int) -> int:
+    """start之后（含）下一个位于行首的">"的位置，没有时返回-1；">"在序列中极少出现，直接查找比查找"\n>"快"""
+    pos = buffer.find(b">", start)
+    while pos > 0 and buffer[pos - 1] != 10:
+        pos = buffer.find(b">", pos + 1)
+    return pos
+
+
+def fasta_offsets(buffer) -> Iterator[Tuple[int, int, int]]:
+    """
+    在FASTA原始字节（bytes或mmap）中定位各条记录，逐条给出(标题行起点（">"之后）, 序列起点, 序列终点)
+    以find（C层的memchr式扫描）查找行首的">"，不逐行处理；序列字节范围内仍含换行，由调用方去除
+    第一个">"之前的内容被忽略
+    """
+    size = len(buffer)
+    pos = _next_header(buffer, 0)
+    while pos >= 0:
+        header_end = buffer.find(b"\n", pos)
+        if header_end < 0:
+            header_end = size
+        next_pos = _next_header(buffer, header_end)
+        yield pos + 1, min(header_end + 1, size), next_pos if next_pos >= 0 else size
+        pos = next_pos
+
+
+def _parse_header(raw: bytes) -> Tuple[str, str]:
+    description = raw.rstrip(b"\r\n").decode("utf-8", errors="replace")
+    fields = description.split(None, 1)
+    return (fields[0] if fields else ""), description
+
+
+def _clean_sequence(raw: bytes, uppercase: bool) -> bytes:
+    """去除序列字节中的换行（以及仅在出现时才处理的回车、空格、制表符），按需转为大写"""
+    raw = raw.replace(b"\n", b"")
+    if b"\r" in raw or b" " in raw or b"\t" in raw:
+        raw = raw.translate(None, _WHITESPACE)
+    if uppercase and not raw.isupper():
+        raw = raw.upper()
+    return raw
+
+
+def iter_fasta(fasta_path: str, uppercase: bool = False) -> Iterator[FastaRecord]:
+    """
+    按文件顺序逐条产出FastaRecord：文件以内存映射打开，由fasta_offsets定位记录边界，
+    每条序列整段去除换行后一次解码，不为每行创建字符串
+    """
+    if os.path.getsize(fasta_path) == 0:
+        return
+    with open(fasta_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for header_start, seq_start, seq_end in fasta_offsets(mm):
+            seq_id, description = _parse_header(mm[header_start:seq_start])
+            raw = _clean_sequence(mm[seq_start:seq_end], uppercase)
+            yield FastaRecord(seq_id, description, raw.decode("ascii", errors="replace"))
+
+
+class FastaBatch:
+    """
+    一批FASTA记录的数组存储：全部序列（已去空白）首尾拼接为一个uint8数组data，
+    第i条序列为data[offsets[i]:offsets[i + 1]]，不为每条记录单独保存字符串
+    """
+    __slots__ = ("ids", "descriptions", "offsets", "data")
+
+    def __init__(self, ids: List[str], descriptions: List[str], offsets: np.ndarray, data: np.ndarray):
+        self.ids = ids
+        self.descriptions = descriptions
+        self.offsets = offsets
+        self.data = data
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def lengths(self) -> np.ndarray:
+        return np.diff(self.offsets)
+
+    def sequence(self, i: int) -> str:
+        return self.data[self.offsets[i]:self.offsets[i + 1]].tobytes().decode("ascii", errors="replace")
+
+    def codes(self, i: int) -> np.ndarray:
+        """第i条序列的碱基编码（同encode_dna）"""
+        return np.frombuffer(self.data[self.offsets[i]:self.offsets[i + 1]].tobytes().translate(_DNA_CODES),
+                             dtype=np.uint8)
+
+    def encoded(self) -> np.ndarray:
+        """全部序列（首尾拼接）的碱基编码，下标与data一致"""
+        return np.frombuffer(self.data.tobytes().translate(_DNA_CODES), dtype=np.uint8)
+
+    def __iter__(self) -> Iterator[FastaRecord]:
+        for i in range(len(self.ids)):
+            yield FastaRecord(self.ids[i], self.descriptions[i], self.sequence(i))
+
+
+def iter_fasta_batches(fasta_path: str, batch_bases: int = BATCH_BASES, uppercase: bool = True) -> Iterator[FastaBatch]:
+    """按碱基数分批读取FASTA，每批为一个FastaBatch（单条序列超过batch_bases时单独成批）"""
+    if os.path.getsize(fasta_path) == 0:
+        return
+    with open(fasta_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        ids: List[str] = []
+        descriptions: List[str] = []
+        parts: List[bytes] = []
+        total = 0
+        for header_start, seq_start, seq_end in fasta_offsets(mm):
+            seq_id, description = _parse_header(mm[header_start:seq_start])
+            raw = _clean_sequence(mm[seq_start:seq_end], uppercase)
+            if parts and total + len(raw) > batch_bases:
+                yield _make_batch(ids, descriptions, parts)
+                ids, descriptions, parts, total = [], [], [], 0
+            ids.append(seq_id)
+            descriptions.append(description)
+            parts.append(raw)
+            total += len(raw)
+        if parts:
+            yield _make_batch(ids, descriptions, parts)
+
+
+def _make_batch(ids: List[str], descriptions: List[str], parts: List[bytes]) -> FastaBatch:
+    offsets = np.zeros(len(parts) + 1, dtype=np.int64)
+    np.cumsum([len(p) for p in parts], out=offsets[1:])
+    data = np.frombuffer(b"".join(parts), dtype=np.uint8)
+    return FastaBatch(ids, descriptions, offsets, data)
+
+
+def read_fasta(fasta_path: str) -> List[Tuple[str, str]]:
+    """
+    读取FASTA文件，按文件顺序返回[(序列ID, 序列)]
+    序列ID取">"后第一个空格前的部分，序列去除换行并转为大写
+    """
+    return [(record.id, record.sequence) for record in iter_fasta(fasta_path, uppercase=True)]
+
+
+def encode_dna(seq: str) -> np.ndarray:
+    """将DNA序列编码为uint8数组（A/C/G/T → 0/1/2/3，其他 → 4）"""
+    return np.frombuffer(seq.encode("ascii", "replace").translate(_DNA_CODES), dtype=np.uint8)
@@ -0,0 +1,468 @@
+import argparse
+import json
+import math
+import os
+import sqlite3
+import sys
+import tarfile
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from fasta_io import iter_fasta
+from homer_results import (ResultTable, discover_sources, duplicate_runs, run_digests, scan_archive, scan_directory,
+                           source_fingerprint)
+from liftover import Hit, genome_lengths_from_fasta, window_downstream, window_origin
+from motifs import read_motif_file
+
+STORE_VERSION = 1
+# 每批插入的行数：单个事务内executemany，避免逐行提交
+INSERT_BATCH = 50000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE, kind TEXT NOT NULL, source TEXT NOT NULL,
+    species TEXT NOT NULL DEFAULT '', region TEXT NOT NULL DEFAULT '', fingerprint TEXT NOT NULL,
+    n_rows INTEGER NOT NULL DEFAULT 0, loaded_at REAL NOT NULL, content TEXT NOT NULL DEFAULT '');
+CREATE TABLE IF NOT EXISTS sequences (
+    id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE, length INTEGER, species TEXT NOT NULL DEFAULT '',
+    description TEXT NOT NULL DEFAULT '', gc REAL);
+CREATE TABLE IF NOT EXISTS motifs (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE, label TEXT NOT NULL DEFAULT '');
+CREATE TABLE IF NOT EXISTS hits (
+    run_id INTEGER NOT NULL, seq_id INTEGER NOT NULL, motif_id INTEGER NOT NULL,
+    start INTEGER NOT NULL, end INTEGER NOT NULL, strand INTEGER NOT NULL, score REAL, p_value REAL);
+CREATE TABLE IF NOT EXISTS enrichment (
+    run_id INTEGER NOT NULL, motif_id INTEGER NOT NULL, kind TEXT NOT NULL, consensus TEXT NOT NULL,
+    log10_p REAL, q_value REAL, n_target REAL, pct_target REAL, n_background REAL, pct_background REAL);
+CREATE INDEX IF NOT EXISTS enrichment_motif ON enrichment (motif_id, log10_p);
+CREATE INDEX IF NOT EXISTS enrichment_run ON enrichment (run_id);
+"""
+# 命中索引单独列出：大批量导入时先删除、导入后重建（逐条execute，保持在同一事务内）
+HIT_INDEXES = {
+    "hits_motif": "hits (motif_id, seq_id, start)",
+    "hits_position": "hits (seq_id, start)",
+    "hits_run": "hits (run_id)",
+}
+
+
+class HitStore:
+    """
+    跨运行的motif结果库（单个SQLite文件）：
+        sequences  序列元数据（名称、长度、物种、描述、GC）
+        motifs     motif表：name为命中表中的motif标识（如JASPAR ID MA0114.5），label为motif名称（如HNF4A，来自motif库）；
+                   hits/enrichment中只保存编号，按motif查询时同时匹配标识和名称
+        runs       每次导入的运行（名称唯一、数据来源、指纹），重复导入同名运行时指纹不变则跳过、变化则替换
+        hits       motif命中（基因组坐标0-based半开，终点可大于基因组长度表示跨原点；链+1/-1；得分、p值）
+        enrichment HOMER富集结果（knownResults.txt与homerResults/motifN.motif）
+    命中按(motif, 序列, 起点)与(序列, 起点)建索引，按motif或按区域查询只读取索引范围内的行；
+    导入在单个事务内分批executemany；一次导入的行数与库中已有命中相当时，先删除命中索引、导入后再整体重建
+    （排序建索引比逐行随机插入索引快得多）
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("PRAGMA cache_size=-262144")
+        self.db.executescript(SCHEMA)
+        # 早期创建的结果库motifs表没有label列
+        if "label" not in [row[1] for row in self.db.execute("PRAGMA table_info(motifs)")]:
+            self.db.execute("ALTER TABLE motifs ADD COLUMN label TEXT NOT NULL DEFAULT ''")
+        # runs表的content列（富集结果内容摘要，用于识别重复运行）同样是后加的
+        if "content" not in [row[1] for row in self.db.execute("PRAGMA table_info(runs)")]:
+            self.db.execute("ALTER TABLE runs ADD COLUMN content TEXT NOT NULL DEFAULT ''")
+        self._create_hit_indexes()
+        self.db.commit()
+        version = self.db.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        if version is None:
+            self.db.execute("INSERT INTO meta VALUES ('version', ?)", (str(STORE_VERSION),))
+            self.db.commit()
+        elif int(version[0]) != STORE_VERSION:
+            raise ValueError(f"结果库版本为{version[0]}，当前程序为{STORE_VERSION}：{path}")
+        self._motif_ids: Dict[str, int] = {}
+        self._motif_labels: Dict[int, str] = {}
+        for motif_id, name, label in self.db.execute("SELECT id, name, label FROM motifs"):
+            self._motif_ids[name] = motif_id
+            self._motif_labels[motif_id] = label
+        self._sequence_ids: Dict[str, int] = dict(self.db.execute("SELECT name, id FROM sequences"))
+
+    def close(self) -> None:
+        self.db.close()
+
+    def _create_hit_indexes(self) -> None:
+        for name, columns in HIT_INDEXES.items():
+            self.db.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {columns}")
+
+    def _motif_id(self, name: str, label: str = "") -> int:
+        """motif标识 → 编号（新标识自动登记）；给出名称且与已记录的不同时更新名称"""
+        motif_id = self._motif_ids.get(name)
+        if motif_id is None:
+            motif_id = self.db.execute("INSERT INTO motifs (name, label) VALUES (?, ?)", (name, label)).lastrowid
+            self._motif_ids[name] = motif_id
+            self._motif_labels[motif_id] = label
+        elif label and self._motif_labels[motif_id] != label:
+            self.db.execute("UPDATE motifs SET label = ? WHERE id = ?", (label, motif_id))
+            self._motif_labels[motif_id] = label
+        return motif_id
+
+    def _sequence_id(self, name: str) -> int:
+        if name not in self._sequence_ids:
+            self._sequence_ids[name] = self.db.execute("INSERT INTO sequences (name) VALUES (?)", (name,)).lastrowid
+        return self._sequence_ids[name]
+
+    def _begin_run(self, name: str, kind: str, source: str, fingerprint: Dict[str, object], species: str = "",
+                   region: str = "") -> Optional[int]:
+        """登记一次导入；同名运行指纹相同时返回None（跳过），不同时先删除旧数据"""
+        fingerprint_text = json.dumps(fingerprint, sort_keys=True)
+        row = self.db.execute("SELECT id, fingerprint FROM runs WHERE name = ?", (name,)).fetchone()
+        if row and row[1] == fingerprint_text:
+            return None
+        if row:
+            self.db.execute("DELETE FROM hits WHERE run_id = ?", (row[0],))
+            self.db.execute("DELETE FROM enrichment WHERE run_id = ?", (row[0],))
+            self.db.execute("DELETE FROM runs WHERE id = ?", (row[0],))
+        return self.db.execute(
+            "INSERT INTO runs (name, kind, source, species, region, fingerprint, loaded_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (name, kind, source, species, region, fingerprint_text, time.time())).lastrowid
+
+    def add_sequences(self, fasta_path: str, species: str = "") -> int:
+        """导入序列元数据（已存在的序列更新长度、物种、描述和GC）"""
+        rows = []
+        for record in iter_fasta(fasta_path, uppercase=True):
+            seq = record.sequence
+            acgt = sum(seq.count(base) for base in "ACGT")
+            gc = (seq.count("G") + seq.count("C")) / acgt if acgt else None
+            rows.append((record.id, len(seq), species, record.description, gc))
+        with self.db:
+            self.db.executemany(
+                "INSERT INTO sequences (name, length, species, description, gc) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET length = excluded.length, species = excluded.species, "
+                "description = excluded.description, gc = excluded.gc", rows)
+        self._sequence_ids = dict(self.db.execute("SELECT name, id FROM sequences"))
+        return len(rows)
+
+    def add_hits(self, run: str, hits: Iterator[Tuple[Hit, Optional[float], str]], source: str,
+                 fingerprint: Dict[str, object], species: str = "", region: str = "",
+                 motif_names: Optional[Dict[str, str]] = None) -> int:
+        """
+        批量导入一次运行的命中[(Hit, p值, motif名称)]，返回导入行数；运行已导入且指纹未变时返回-1
+        motif_names为motif库的{ID: 名称}，命中行本身没有名称时用它补上（如prefilter输出只有JASPAR ID）
+        """
+        motif_names = motif_names or {}
+        existing = self.db.execute("SELECT COALESCE(SUM(n_rows), 0) FROM runs WHERE kind = 'hits'").fetchone()[0]
+        indexed = True
+        with self.db:
+            run_id = self._begin_run(run, "hits", source, fingerprint, species, region)
+            if run_id is None:
+                return -1
+            count = 0
+            batch = []
+            for hit, p_value, label in hits:
+                motif_id = self._motif_id(hit.motif, label or motif_names.get(hit.motif, ""))
+                batch.append((run_id, self._sequence_id(hit.seq_id), motif_id, hit.start, hit.end,
+                               -1 if hit.strand == "-" else 1, hit.score, p_value))
+                if len(batch) >= INSERT_BATCH:
+                    if indexed and count + len(batch) > existing:
+                        for name in HIT_INDEXES:
+                            self.db.execute(f"DROP INDEX IF EXISTS {name}")
+                        indexed = False
+                    self.db.executemany("INSERT INTO hits VALUES (?, ?, ?, ?, ?, ?, ?, ?)", batch)
+                    count += len(batch)
+                    batch = []
+            self.db.executemany("INSERT INTO hits VALUES (?, ?, ?, ?, ?, ?, ?, ?)", batch)
+            count += len(batch)
+            if not indexed:
+                self._create_hit_indexes()
+            self.db.execute("UPDATE runs SET n_rows = ? WHERE id = ?", (count, run_id))
+            self.db.execute("INSERT INTO meta VALUES ('max_width', ?) ON CONFLICT(key) DO UPDATE SET "
+                            "value = MAX(CAST(value AS INTEGER), CAST(excluded.value AS INTEGER))",
+                            (str(self._max_width(run_id)),))
+        return count
+
+    def _max_width(self, run_id: int) -> int:
+        width = self.db.execute("SELECT MAX(end - start) FROM hits WHERE run_id = ?", (run_id,)).fetchone()[0]
+        return int(width or 0)
+
+    def add_homer(self, paths: List[str]) -> Tuple[int, int]:
+        """
+        导入HOMER富集结果（压缩包、分析目录或其上级目录，数据源的发现与解析同homer_results.py）；
+        每个数据源中的每个分析目录作为一次运行，数据源指纹未变时跳过。
+        内容与库中已有运行相同的运行（如解压目录与其ana_*.tar.gz）只导入一份，规则同homer_results.duplicate_runs。
+        返回(导入的运行数, 行数)
+        """
+        runs, total = 0, 0
+        stored = self.db.execute("SELECT content, source, name FROM runs WHERE kind = 'enrichment' AND content != ''")
+        seen = {content: (source, name.split("::", 1)[-1]) for content, source, name in stored}
+        for source in map(os.path.abspath, discover_sources(paths)):
+            fingerprint = source_fingerprint(source)
+            # 早期导入的运行没有内容摘要，重新导入一次
+            known = self.db.execute("SELECT fingerprint, content FROM runs WHERE source = ? AND kind = 'enrichment' "
+                                    "LIMIT 1", (source,)).fetchone()
+            if known and known[0] == json.dumps(fingerprint, sort_keys=True) and known[1]:
+                continue
+            try:
+                rows, _ = scan_directory(source) if os.path.isdir(source) else scan_archive(source)
+            except (tarfile.TarError, OSError) as e:
+                print(f"跳过数据源 {source} → 错误：{str(e)}")
+                continue
+            # 本数据源旧的导入即将被替换，不参与重复判断
+            seen = {digest: owner for digest, owner in seen.items() if owner[0] != source}
+            table = ResultTable.from_rows(rows)
+            duplicates = duplicate_runs(table, seen)
+            digests = run_digests(table)
+            by_run: Dict[str, List[Dict[str, object]]] = {}
+            for row in rows:
+                if row["run"] not in duplicates:
+                    by_run.setdefault(row["run"], []).append(row)
+            with self.db:
+                self.db.execute("DELETE FROM enrichment WHERE run_id IN "
+                                "(SELECT id FROM runs WHERE source = ? AND kind = 'enrichment')", (source,))
+                self.db.execute("DELETE FROM runs WHERE source = ? AND kind = 'enrichment'", (source,))
+                for run, run_rows in by_run.items():
+                    run_id = self._begin_run(f"{source}::{run or os.path.basename(source)}", "enrichment", source,
+                                             fingerprint, run_rows[0]["species"], run_rows[0]["region"])
+                    self.db.executemany(
+                        "INSERT INTO enrichment VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        [(run_id, self._motif_id(row["motif"]), row["kind"], row["consensus"], row["log10_p"],
+                          row["q_value"], row["n_target"], row["pct_target"], row["n_background"],
+                          row["pct_background"]) for row in run_rows])
+                    self.db.execute("UPDATE runs SET n_rows = ?, content = ? WHERE id = ?",
+                                    (len(run_rows), digests[run], run_id))
+                    runs += 1
+                    total += len(run_rows)
+            print(f"导入完成：{source}（{len(by_run)} 个运行，{sum(len(r) for r in by_run.values())} 行）")
+        return runs, total
+
+    def _motif_filter(self, motif: str) -> List[int]:
+        """motif标识或名称的子串（不区分大小写）→ motif编号；motif表很小，直接在Python中匹配"""
+        motif = motif.lower()
+        return [mid for name, mid in self._motif_ids.items()
+                if motif in name.lower() or motif in self._motif_labels[mid].lower()]
+
+    def query_hits(self, motif: str = "", genome: str = "", start: Optional[int] = None, end: Optional[int] = None,
+                   run: str = "", species: str = "", min_score: Optional[float] = None,
+                   limit: int = 0) -> List[Tuple]:
+        """
+        命中查询：motif名称子串、基因组、区域[start, end)（0-based，需给出genome）、运行名称子串、物种、得分下限；
+        返回[(运行, 基因组, 起点, 终点, motif标识, motif名称, 链, 得分, p值)]，按基因组、起点排序
+        """
+        conditions, params = [], []
+        if motif:
+            motif_ids = self._motif_filter(motif)
+            if not motif_ids:
+                return []
+            conditions.append(f"h.motif_id IN ({','.join('?' * len(motif_ids))})")
+            params.extend(motif_ids)
+        if genome:
+            if genome not in self._sequence_ids:
+                return []
+            conditions.append("h.seq_id = ?")
+            params.append(self._sequence_ids[genome])
+            if start is not None and end is not None:
+                # 起点下界取区域起点减去最长命中宽度，范围查询可以走(序列, 起点)索引
+                max_width = self.db.execute("SELECT value FROM meta WHERE key = 'max_width'").fetchone()
+                conditions.append("h.start >= ? AND h.start < ? AND h.end > ?")
+                params.extend([start - int(max_width[0] if max_width else 0), end, start])
+        if run:
+            # 运行表很小，先解析出运行编号，命中表按run_id索引过滤
+            run_ids = [row[0] for row in self.db.execute("SELECT id FROM runs WHERE kind = 'hits' AND name LIKE ?",
+                                                         (f"%{run}%",))]
+            if not run_ids:
+                return []
+            conditions.append(f"h.run_id IN ({','.join('?' * len(run_ids))})")
+            params.extend(run_ids)
+        if species:
+            conditions.append("(r.species LIKE ? OR s.species LIKE ?)")
+            params.extend([f"%{species}%", f"%{species}%"])
+        if min_score is not None:
+            conditions.append("h.score >= ?")
+            params.append(min_score)
+        sql = ("SELECT r.name, s.name, h.start, h.end, m.name, m.label, h.strand, h.score, h.p_value FROM hits h "
+               "JOIN runs r ON r.id = h.run_id JOIN sequences s ON s.id = h.seq_id JOIN motifs m ON m.id = h.motif_id"
+               + (" WHERE " + " AND ".join(conditions) if conditions else "") + " ORDER BY s.name, h.start, m.name")
+        if limit > 0:
+            sql += f" LIMIT {int(limit)}"
+        return self.db.execute(sql, params).fetchall()
+
+    def query_enrichment(self, motif: str = "", species: str = "", region: str = "",
+                         max_log10_p: float = 0.0) -> List[Tuple]:
+        """富集结果查询：返回[(运行, 物种, 区域, 类型, motif, 共识序列, log10 p, q值, 目标%, 背景%)]，按p值升序"""
+        conditions, params = ["e.log10_p <= ?"], [max_log10_p]
+        if motif:
+            motif_ids = self._motif_filter(motif)
+            if not motif_ids:
+                return []
+            conditions.append(f"e.motif_id IN ({','.join('?' * len(motif_ids))})")
+            params.extend(motif_ids)
+        if species:
+            conditions.append("r.species LIKE ?")
+            params.append(f"%{species}%")
+        if region:
+            conditions.append("r.region LIKE ?")
+            params.append(f"%{region}%")
+        sql = ("SELECT r.name, r.species, r.region, e.kind, m.name, e.consensus, e.log10_p, e.q_value, "
+               "e.pct_target, e.pct_background FROM enrichment e JOIN runs r ON r.id = e.run_id "
+               "JOIN motifs m ON m.id = e.motif_id WHERE " + " AND ".join(conditions) + " ORDER BY e.log10_p")
+        return self.db.execute(sql, params).fetchall()
+
+    def runs(self) -> List[Tuple]:
+        return self.db.execute("SELECT name, kind, species, region, n_rows, source FROM runs ORDER BY id").fetchall()
+
+
+def read_hit_rows(path: str) -> Iterator[Tuple[Hit, Optional[float], str]]:
+    """
+    读取统一命中表（seq_id start end motif strand score），有表头时按列名取列（hits查询的输出可直接再导入），
+    表头中有p_value、motif_name列时一并读取（p_value为空表示没有p值）；没有表头的文件按前六列解析
+    返回[(Hit, p值或None, motif名称或空串)]
+    """
+    columns = {"seq_id": 0, "start": 1, "end": 2, "motif": 3, "strand": 4, "score": 5}
+    with open(path, "r", encoding="utf-8") as f:
+        for line_num, line in enumerate(f, 1):
+            parts = line.rstrip("\n").split("\t")
+            if "seq_id" in parts and "start" in parts:
+                columns = {name: i for i, name in enumerate(parts)}
+                continue
+            if len(parts) < 6:
+                continue
+            try:
+                hit = Hit(parts[columns["seq_id"]], int(parts[columns["start"]]), int(parts[columns["end"]]),
+                          parts[columns["motif"]], parts[columns["strand"]], float(parts[columns["score"]]))
+                p_text = parts[columns["p_value"]].strip() if "p_value" in columns else ""
+                p_value = float(p_text) if p_text else None
+                label = parts[columns["motif_name"]] if "motif_name" in columns else ""
+            except (ValueError, IndexError):
+                print(f"跳过第{line_num}行：{line.strip()} → 格式错误")
+                continue
+            yield hit, p_value, label
+
+
+def lift_hit_rows(rows: Iterator[Tuple[Hit, Optional[float], str]], genome_lengths: Dict[str, int],
+                  window_lengths: Dict[str, int], upstream: int,
+                  downstream: int = 0) -> Iterator[Tuple[Hit, Optional[float], str]]:
+    """窗口坐标 → 基因组坐标（换算规则同liftover.lift_hits），p值和motif名称随命中一起传递"""
+    origins: Dict[str, Optional[Tuple[str, int]]] = {}
+    for hit, p_value, label in rows:
+        if hit.seq_id not in origins:
+            try:
+                origins[hit.seq_id] = window_origin(hit.seq_id, genome_lengths, window_lengths.get(hit.seq_id),
+                                                    upstream, downstream)
+            except ValueError as e:
+                print(f"跳过序列 {hit.seq_id} → {str(e)}")
+                origins[hit.seq_id] = None
+        origin = origins[hit.seq_id]
+        if origin is None:
+            continue
+        genome, window_start = origin
+        start = (window_start + hit.start) % genome_lengths[genome]
+        yield Hit(genome, start, start + (hit.end - hit.start), hit.motif, hit.strand, hit.score), p_value, label
+
+
+def main():
+    parser = argparse.ArgumentParser(description="跨运行的motif结果库（SQLite）：批量导入序列元数据、motif命中和HOMER富集结果，按motif/基因组/区域快速查询")
+    parser.add_argument("--store", required=True, help="结果库文件（如results.sqlite）")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    seq_parser = subparsers.add_parser("add-sequences", help="导入序列元数据")
+    seq_parser.add_argument("--fasta", nargs="+", required=True)
+    seq_parser.add_argument("--species", default="", help="物种（如cat、shrew、human）")
+
+    hits_parser = subparsers.add_parser("add-hits", help="导入统一命中表（一次运行）")
+    hits_parser.add_argument("--hits", required=True, help="统一命中表（seq_id start end motif strand score [p_value]）")
+    hits_parser.add_argument("--run", help="运行名称（默认取命中表文件名），同名运行重复导入时替换")
+    hits_parser.add_argument("--species", default="")
+    hits_parser.add_argument("--region", default="")
+    hits_parser.add_argument("--genomes", help="命中为启动子窗口坐标时，给出基因组FASTA换算为基因组坐标（同liftover.py）")
+    hits_parser.add_argument("--windows", help="启动子窗口FASTA（用于获得各窗口实际长度）")
+    hits_parser.add_argument("--upstream", type=int, default=100, help="未提供窗口FASTA时使用的上游长度（默认100bp）")
+    hits_parser.add_argument("--downstream", type=int,
+                             help="窗口中CDS起始位点之后的长度（默认从窗口文件名up*_down*推断，否则为0）")
+    hits_parser.add_argument("--motifs", help="扫描所用的motif库（MEME/JASPAR/HOMER格式），用于记录各motif ID对应的名称（如MA0114.5 → HNF4A）")
+
+    homer_parser = subparsers.add_parser("add-homer", help="导入HOMER富集结果")
+    homer_parser.add_argument("paths", nargs="+", help="ana_*.tar.gz压缩包、分析目录或包含它们的上级目录")
+
+    query_parser = subparsers.add_parser("hits", help="查询命中")
+    query_parser.add_argument("--motif", default="", help="motif ID或名称的子串（不区分大小写），如HNF4A或MA0114")
+    query_parser.add_argument("--genome", default="")
+    query_parser.add_argument("--start", type=int, help="区域起点（1-based，含；需同时给出--genome和--end）")
+    query_parser.add_argument("--end", type=int, help="区域终点（1-based，含）")
+    query_parser.add_argument("--run", default="", help="运行名称子串")
+    query_parser.add_argument("--species", default="")
+    query_parser.add_argument("--min-score", type=float)
+    query_parser.add_argument("--limit", type=int, default=0)
+    query_parser.add_argument("--output", default="-")
+
+    enrich_parser = subparsers.add_parser("enrichment", help="查询富集结果")
+    enrich_parser.add_argument("--motif", default="")
+    enrich_parser.add_argument("--species", default="")
+    enrich_parser.add_argument("--region", default="")
+    enrich_parser.add_argument("--max-p", type=float, default=1.0, help="p值上限（需大于0，默认1，不筛选）")
+    enrich_parser.add_argument("--output", default="-")
+
+    subparsers.add_parser("runs", help="列出已导入的运行")
+
+    args = parser.parse_args()
+    if args.command == "enrichment" and args.max_p <= 0:
+        parser.error("--max-p需大于0")
+    store = HitStore(args.store)
+    try:
+        t0 = time.time()
+        if args.command == "add-sequences":
+            count = sum(store.add_sequences(path, args.species) for path in args.fasta)
+            print(f"导入序列元数据 {count} 条 → {args.store}")
+        elif args.command == "add-hits":
+            run = args.run or os.path.splitext(os.path.basename(args.hits))[0]
+            rows = read_hit_rows(args.hits)
+            fingerprint = {"hits": source_fingerprint(args.hits)}
+            if args.genomes:
+                downstream = window_downstream(args.windows, args.downstream)
+                rows = lift_hit_rows(rows, genome_lengths_from_fasta(args.genomes),
+                                     {record.id: len(record) for record in iter_fasta(args.windows)}
+                                     if args.windows else {}, args.upstream, downstream)
+                fingerprint["genomes"] = source_fingerprint(args.genomes)
+                # 窗口参数不同，换算出的基因组坐标也不同，需重新导入
+                fingerprint["window"] = [args.upstream, downstream]
+            motif_names = {}
+            if args.motifs:
+                motif_names = {motif.id: motif.name for motif in read_motif_file(args.motifs)}
+                fingerprint["motifs"] = source_fingerprint(args.motifs)
+            count = store.add_hits(run, rows, os.path.abspath(args.hits), fingerprint, args.species, args.region,
+                                   motif_names)
+            if count < 0:
+                print(f"运行 {run} 已导入且命中表未变化，跳过")
+            else:
+                print(f"导入运行 {run}：{count} 个命中（{time.time() - t0:.1f} 秒）→ {args.store}")
+        elif args.command == "add-homer":
+            runs, rows = store.add_homer(args.paths)
+            print(f"导入HOMER结果：{runs} 个运行，{rows} 行（{time.time() - t0:.1f} 秒）→ {args.store}")
+        elif args.command == "runs":
+            for row in store.runs():
+                print("\t".join(str(v) for v in row))
+        else:
+            out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+            try:
+                if args.command == "hits":
+                    start = args.start - 1 if args.start is not None else None
+                    rows = store.query_hits(args.motif, args.genome, start, args.end, args.run, args.species,
+                                            args.min_score, args.limit)
+                    out.write("run\tseq_id\tstart\tend\tmotif\tmotif_name\tstrand\tscore\tp_value\n")
+                    for run, genome, s, e, motif, label, strand, score, p_value in rows:
+                        out.write(f"{run}\t{genome}\t{s}\t{e}\t{motif}\t{label}\t{'-' if strand < 0 else '+'}\t"
+                                  f"{score:.3f}\t{'' if p_value is None else f'{p_value:.3g}'}\n")
+                else:
+                    rows = store.query_enrichment(args.motif, args.species, args.region, math.log10(args.max_p))
+                    out.write("run\tspecies\tregion\tkind\tmotif\tconsensus\tlog10_p\tq_value\tpct_target\tpct_background\n")
+                    for row in rows:
+                        out.write("\t".join(f"{v:.4g}" if isinstance(v, float) else "" if v is None else str(v)
+                                             for v in row) + "\n")
+            finally:
+                if out is not sys.stdout:
+                    out.close()
+            print(f"查询完成：{len(rows)} 行（{(time.time() - t0) * 1000:.1f} 毫秒）", file=sys.stderr)
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,436 @@
+import argparse
+import hashlib
+import json
+import math
+import os
+import re
+import sys
+import tarfile
+from typing import Dict, Iterable, Iterator, List, Set, Tuple
+
+import numpy as np
+
+from motifs import parse_homer_header
+
+# 列式结果表的字段：字符串列以"编码+取值表"方式存储，数值列直接存float64
+STRING_COLUMNS = ("source", "run", "species", "region", "kind", "motif", "consensus")
+FLOAT_COLUMNS = ("log10_p", "q_value", "n_target", "pct_target", "n_background", "pct_background")
+
+TABLE_FILE = "table.npz"
+MEMBER_INDEX_FILE = "members.json"
+ARCHIVE_SUFFIXES = (".tar.gz", ".tgz", ".tar")
+
+RUN_NAME_PATTERN = re.compile(r"^ana(?:lysis)?_(?P<species>[A-Za-z]+)_(?P<region>.+)$")
+DENOVO_MOTIF_PATTERN = re.compile(r"(^|/)homerResults/motif\d+\.motif$")
+
+
+def split_run_name(run: str) -> Tuple[str, str]:
+    """
+    从结果目录名推断物种和区域：
+    ana_cat_EN2_Core_p → ("cat", "EN2_Core_p")；ana_shrew_1_polymerase_protein → ("shrew", "1_polymerase_protein")
+    无法识别物种时（如analysis_output1、ana_1）物种为空，区域为目录名本身
+    """
+    match = RUN_NAME_PATTERN.match(run)
+    if match:
+        return match.group("species"), match.group("region")
+    return "", run
+
+
+def member_kind(name: str) -> str:
+    """判断结果文件类型：known（knownResults.txt）、denovo（homerResults/motifN.motif），其余返回空串"""
+    if os.path.basename(name) == "knownResults.txt":
+        return "known"
+    if DENOVO_MOTIF_PATTERN.search(name):
+        return "denovo"
+    return ""
+
+
+def run_of_member(name: str) -> str:
+    """
+    结果文件所属的分析目录名（压缩包内第一层目录；
+    对于磁盘目录，调用方传入相对于分析目录父目录的路径）
+    """
+    parts = [p for p in name.split("/") if p and p != "."]
+    if member_kind(name) == "known":
+        return parts[-2] if len(parts) >= 2 else ""
+    # homerResults/motifN.motif → homerResults的上一级
+    return parts[-3] if len(parts) >= 3 else ""
+
+
+def parse_known_results(lines: Iterable[str]) -> Iterator[Dict[str, object]]:
+    """
+    解析knownResults.txt（制表符分隔，首行为表头）
+    Log P-value列为自然对数，这里换算为log10，避免1e-9之类的截断p值丢失精度
+    """
+    iterator = iter(lines)
+    try:
+        next(iterator)  # 表头
+    except StopIteration:
+        return
+    for line in iterator:
+        parts = line.rstrip("\n").split("\t")
+        if len(parts) < 9:
+            continue
+        try:
+            yield {
+                "motif": parts[0],
+                "consensus": parts[1],
+                "log10_p": float(parts[3]) / math.log(10),
+                "q_value": float(parts[4]),
+                "n_target": float(parts[5]),
+                "pct_target": float(parts[6].rstrip("%")),
+                "n_background": float(parts[7]),
+                "pct_background": float(parts[8].rstrip("%")),
+            }
+        except ValueError:
+            print(f"警告：无法解析knownResults行：{line.strip()}")
+
+
+def parse_denovo_motif(lines: Iterable[str]) -> Iterator[Dict[str, object]]:
+    """解析homerResults/motifN.motif，仅读取头部行的富集统计（矩阵部分跳过）"""
+    for line in lines:
+        if not line.startswith(">"):
+            continue
+        info = parse_homer_header(line)
+        yield {
+            "motif": info["name"],
+            "consensus": info["consensus"],
+            "log10_p": float(info["log_p"]) / math.log(10),
+            "q_value": math.nan,
+            "n_target": info["n_target"],
+            "pct_target": info["pct_target"],
+            "n_background": info["n_background"],
+            "pct_background": info["pct_background"],
+        }
+
+
+def _rows_from_member(source: str, name: str, kind: str, text: Iterable[str]) -> List[Dict[str, object]]:
+    run = run_of_member(name)
+    species, region = split_run_name(run)
+    parser = parse_known_results if kind == "known" else parse_denovo_motif
+    rows = []
+    for row in parser(text):
+        row.update(source=source, run=run, species=species, region=region, kind=kind)
+        rows.append(row)
+    return rows
+
+
+def scan_archive(path: str) -> Tuple[List[Dict[str, object]], List[Dict[str, object]]]:
+    """
+    以流模式（r|*）顺序读取压缩包，不解压到磁盘，直接解析需要的成员
+    返回：(结果行列表, 成员索引列表)
+    """
+    rows: List[Dict[str, object]] = []
+    members: List[Dict[str, object]] = []
+    with tarfile.open(path, "r|*") as tf:
+        for member in tf:
+            if not member.isfile():
+                continue
+            kind = member_kind(member.name)
+            members.append({"name": member.name, "size": member.size, "kind": kind})
+            if not kind:
+                continue
+            # 流模式下成员对象不可seek，直接读入内存（结果文件均较小）
+            text = tf.extractfile(member).read().decode("utf-8", errors="replace")
+            rows.extend(_rows_from_member(path, member.name, kind, text.splitlines()))
+    return rows, members
+
+
+def scan_directory(path: str) -> Tuple[List[Dict[str, object]], List[Dict[str, object]]]:
+    """递归扫描已解压的结果目录（如New/analysis_output1），解析方式与压缩包一致"""
+    rows: List[Dict[str, object]] = []
+    members: List[Dict[str, object]] = []
+    parent = os.path.dirname(os.path.abspath(path))
+    for dirpath, _, filenames in os.walk(path):
+        for filename in sorted(filenames):
+            full_path = os.path.join(dirpath, filename)
+            name = os.path.relpath(full_path, parent).replace(os.sep, "/")
+            kind = member_kind(name)
+            if not kind:
+                continue
+            members.append({"name": name, "size": os.path.getsize(full_path), "kind": kind})
+            with open(full_path, "r", encoding="utf-8", errors="replace") as f:
+                rows.extend(_rows_from_member(path, name, kind, f))
+    return rows, members
+
+
+def source_fingerprint(path: str) -> Dict[str, int]:
+    """
+    数据源指纹：压缩包取大小和修改时间；目录取其中结果文件的总大小和最大修改时间
+    指纹未变化的数据源在下次build时直接复用已解析的行，不再解压
+    """
+    if os.path.isfile(path):
+        stat = os.stat(path)
+        return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    total_size, max_mtime = 0, 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            name = os.path.join(dirpath, filename)
+            if member_kind(name.replace(os.sep, "/")):
+                stat = os.stat(name)
+                total_size += stat.st_size
+                max_mtime = max(max_mtime, stat.st_mtime_ns)
+    return {"size": total_size, "mtime_ns": max_mtime}
+
+
+def discover_sources(paths: List[str]) -> List[str]:
+    """
+    展开命令行给出的路径：压缩包直接作为数据源；
+    目录中含knownResults.txt的子目录各自作为一个数据源，目录中的压缩包也一并收集
+    返回时目录在前、压缩包在后：同一运行既有解压目录又有压缩包时，以目录为准（见duplicate_runs）
+    """
+    sources: List[str] = []
+    for path in paths:
+        if os.path.isfile(path):
+            if path.lower().endswith(ARCHIVE_SUFFIXES):
+                sources.append(path)
+            else:
+                print(f"警告：不支持的文件类型，跳过：{path}")
+            continue
+        if not os.path.isdir(path):
+            print(f"警告：路径不存在，跳过：{path}")
+            continue
+        for dirpath, dirnames, filenames in os.walk(path):
+            if "knownResults.txt" in filenames:
+                sources.append(dirpath)
+                dirnames[:] = []
+                continue
+            for filename in sorted(filenames):
+                if filename.lower().endswith(ARCHIVE_SUFFIXES):
+                    sources.append(os.path.join(dirpath, filename))
+            dirnames.sort()
+    return sorted(sources, key=lambda source: not os.path.isdir(source))
+
+
+class ResultTable:
+    """
+    列式结果表：字符串列以整数编码存储（codes + levels），数值列为float64数组
+    整表保存为一个npz文件，加载后按列做向量化筛选
+    """
+
+    def __init__(self, columns: Dict[str, np.ndarray]):
+        self.columns = columns
+
+    def __len__(self) -> int:
+        return len(self.columns["log10_p"])
+
+    @classmethod
+    def from_rows(cls, rows: List[Dict[str, object]]) -> "ResultTable":
+        columns: Dict[str, np.ndarray] = {}
+        for name in STRING_COLUMNS:
+            columns[name] = np.array([str(row[name]) for row in rows], dtype=str)
+        for name in FLOAT_COLUMNS:
+            columns[name] = np.array([float(row[name]) for row in rows], dtype=np.float64)
+        return cls(columns)
+
+    @classmethod
+    def concat(cls, tables: List["ResultTable"]) -> "ResultTable":
+        tables = [t for t in tables if len(t)]
+        if not tables:
+            return cls.from_rows([])
+        return cls({name: np.concatenate([t.columns[name] for t in tables]) for name in tables[0].columns})
+
+    def take(self, mask: np.ndarray) -> "ResultTable":
+        return ResultTable({name: values[mask] for name, values in self.columns.items()})
+
+    def save(self, path: str) -> None:
+        arrays: Dict[str, np.ndarray] = {}
+        for name in STRING_COLUMNS:
+            levels, codes = np.unique(self.columns[name], return_inverse=True)
+            arrays[f"{name}__levels"] = levels
+            arrays[f"{name}__codes"] = codes.astype(np.int32)
+        for name in FLOAT_COLUMNS:
+            arrays[name] = self.columns[name]
+        np.savez_compressed(path, **arrays)
+
+    @classmethod
+    def load(cls, path: str) -> "ResultTable":
+        columns: Dict[str, np.ndarray] = {}
+        with np.load(path, allow_pickle=False) as data:
+            for name in STRING_COLUMNS:
+                columns[name] = data[f"{name}__levels"][data[f"{name}__codes"]]
+            for name in FLOAT_COLUMNS:
+                columns[name] = data[name]
+        return cls(columns)
+
+
+def run_digests(table: ResultTable) -> Dict[str, str]:
+    """
+    各运行结果内容的摘要（不含数据源路径）：解压前的ana_*.tar.gz与解压后的目录摘要相同；
+    仅目录名相同（如不同批次的analysis_output1）而内容不同的运行摘要不同
+    """
+    digests: Dict[str, str] = {}
+    runs = table.columns["run"]
+    for run in np.unique(runs).tolist():
+        rows = np.flatnonzero(runs == run)
+        values = [table.columns[name][rows].tolist() for name in ("kind", "motif", "consensus") + FLOAT_COLUMNS]
+        lines = sorted("\t".join(map(str, row)) for row in zip(*values))
+        digests[run] = hashlib.sha1("\n".join(lines).encode("utf-8")).hexdigest()
+    return digests
+
+
+def duplicate_runs(table: ResultTable, seen: Dict[str, Tuple[str, str]]) -> Set[str]:
+    """
+    table为一个数据源的结果，返回其中内容与已登记运行相同的运行名；其余运行登记到seen（摘要 → (数据源, 运行)）
+    调用方按discover_sources的顺序处理各数据源，因此目录与其压缩包重复时保留目录
+    """
+    duplicates: Set[str] = set()
+    if not len(table):
+        return duplicates
+    source = str(table.columns["source"][0])
+    for run, digest in run_digests(table).items():
+        if digest in seen:
+            first_source, first_run = seen[digest]
+            print(f"跳过重复运行：{source} 中的 {run}（内容与 {first_source} 中的 {first_run} 相同）")
+            duplicates.add(run)
+        else:
+            seen[digest] = (source, run)
+    return duplicates
+
+
+def build_index(paths: List[str], index_dir: str) -> ResultTable:
+    """
+    构建/增量更新结果索引：
+        index_dir/members.json  每个数据源的指纹与成员清单（持久化成员索引）
+        index_dir/table.npz     所有运行合并后的列式结果表
+    指纹未变化的数据源直接沿用旧表中的行
+    内容相同的运行只保留一份（如New/analysis_output1与ana_1.tar.gz，保留目录），见duplicate_runs
+    """
+    os.makedirs(index_dir, exist_ok=True)
+    index_path = os.path.join(index_dir, MEMBER_INDEX_FILE)
+    table_path = os.path.join(index_dir, TABLE_FILE)
+
+    old_index: Dict[str, Dict[str, object]] = {}
+    old_table = ResultTable.from_rows([])
+    if os.path.exists(index_path) and os.path.exists(table_path):
+        with open(index_path, "r", encoding="utf-8") as f:
+            old_index = json.load(f)
+        old_table = ResultTable.load(table_path)
+
+    new_index: Dict[str, Dict[str, object]] = {}
+    parts: List[ResultTable] = []
+    reused, parsed = 0, 0
+    for source in discover_sources(paths):
+        fingerprint = source_fingerprint(source)
+        previous = old_index.get(source)
+        if previous and previous.get("fingerprint") == fingerprint:
+            parts.append(old_table.take(old_table.columns["source"] == source))
+            new_index[source] = previous
+            reused += 1
+            continue
+        try:
+            if os.path.isdir(source):
+                rows, members = scan_directory(source)
+            else:
+                rows, members = scan_archive(source)
+        except (tarfile.TarError, OSError) as e:
+            print(f"跳过数据源 {source} → 错误：{str(e)}")
+            continue
+        parts.append(ResultTable.from_rows(rows))
+        new_index[source] = {"fingerprint": fingerprint, "members": members, "rows": len(rows)}
+        parsed += 1
+        print(f"解析完成：{source}（{len(rows)} 行）")
+
+    seen: Dict[str, Tuple[str, str]] = {}
+    for i, part in enumerate(parts):
+        duplicates = duplicate_runs(part, seen)
+        if duplicates:
+            parts[i] = part.take(~np.isin(part.columns["run"], sorted(duplicates)))
+
+    table = ResultTable.concat(parts)
+    table.save(table_path)
+    with open(index_path, "w", encoding="utf-8") as f:
+        json.dump(new_index, f, ensure_ascii=False, indent=1)
+    print(f"索引更新完成：新解析 {parsed} 个数据源，复用 {reused} 个，共 {len(table)} 行 → {index_dir}")
+    return table
+
+
+def _contains(values: np.ndarray, pattern: str) -> np.ndarray:
+    """在取值表层面做不区分大小写的子串匹配，再映射回各行"""
+    levels, codes = np.unique(values, return_inverse=True)
+    hit_levels = np.array([pattern.lower() in level.lower() for level in levels], dtype=bool)
+    return hit_levels[codes] if len(levels) else np.zeros(len(values), dtype=bool)
+
+
+def query_table(table: ResultTable, motif: str = "", species: str = "", region: str = "",
+                kind: str = "", max_log10_p: float = 0.0) -> ResultTable:
+    """按motif名称、物种、区域（子串匹配）、结果类型和log10 p值上限筛选"""
+    mask = table.columns["log10_p"] <= max_log10_p
+    if motif:
+        mask &= _contains(table.columns["motif"], motif)
+    if species:
+        mask &= _contains(table.columns["species"], species)
+    if region:
+        mask &= _contains(table.columns["region"], region)
+    if kind:
+        mask &= table.columns["kind"] == kind
+    return table.take(mask)
+
+
+def write_long(table: ResultTable, out) -> None:
+    """逐行输出筛选结果（按p值升序）"""
+    names = ("run", "species", "region", "kind", "motif", "consensus") + FLOAT_COLUMNS
+    out.write("\t".join(names) + "\n")
+    order = np.argsort(table.columns["log10_p"], kind="stable")
+    for i in order:
+        out.write("\t".join(
+            str(table.columns[n][i]) if n in STRING_COLUMNS else f"{table.columns[n][i]:.4g}" for n in names
+        ) + "\n")
+
+
+def write_pivot(table: ResultTable, out) -> None:
+    """
+    输出motif × 运行的 -log10(p) 矩阵，便于跨物种/跨区域比较
+    同一运行中同名motif出现多次时取最显著的一条
+    """
+    motifs, motif_idx = np.unique(table.columns["motif"], return_inverse=True)
+    runs, run_idx = np.unique(table.columns["run"], return_inverse=True)
+    matrix = np.zeros((len(motifs), len(runs)), dtype=np.float64)
+    np.maximum.at(matrix, (motif_idx, run_idx), -table.columns["log10_p"])
+    matrix += 0.0  # 消除-0.0
+    order = np.argsort(-matrix.max(axis=1), kind="stable") if len(motifs) else []
+    out.write("motif\t" + "\t".join(runs) + "\n")
+    for i in order:
+        out.write(motifs[i] + "\t" + "\t".join(f"{v:.2f}" for v in matrix[i]) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="汇总HOMER结果（压缩包或目录）为列式索引表，并支持跨物种/区域查询")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="扫描结果压缩包/目录，构建或增量更新索引")
+    build_parser.add_argument("paths", nargs="+", help="ana_*.tar.gz压缩包、分析目录或包含它们的上级目录")
+    build_parser.add_argument("--index", required=True, help="索引目录")
+
+    query_parser = subparsers.add_parser("query", help="查询索引（不解压任何压缩包）")
+    query_parser.add_argument("--index", required=True, help="索引目录")
+    query_parser.add_argument("--motif", default="", help="motif名称子串（不区分大小写），如HNF4A")
+    query_parser.add_argument("--species", default="", help="物种子串，如cat、shrew")
+    query_parser.add_argument("--region", default="", help="区域子串，如EN2_Core_p")
+    query_parser.add_argument("--kind", default="", choices=["", "known", "denovo"], help="结果类型")
+    query_parser.add_argument("--max-p", type=float, default=1.0, help="p值上限（默认1，不筛选）")
+    query_parser.add_argument("--pivot", action="store_true", help="输出motif × 运行的-log10(p)矩阵")
+    query_parser.add_argument("--output", default="-", help="输出文件（默认标准输出）")
+
+    args = parser.parse_args()
+    if args.command == "query" and args.max_p <= 0:
+        parser.error("--max-p必须大于0")
+    if args.command == "build":
+        build_index(args.paths, args.index)
+        return
+
+    table = ResultTable.load(os.path.join(args.index, TABLE_FILE))
+    result = query_table(table, args.motif, args.species, args.region, args.kind, math.log10(args.max_p))
+    out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        if args.pivot:
+            write_pivot(result, out)
+        else:
+            write_long(result, out)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,559 @@
+import argparse
+import hashlib
+import json
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from fasta_io import encode_dna, read_fasta
+
+INDEX_VERSION = 1
+META_NAME = "meta.json"
+ARRAYS = ("packed", "n_positions", "kmers", "positions")
+
+# blastn（dc-megablast）默认打分：匹配+2、错配-3、空位罚分5+2×长度；对应的Karlin-Altschul参数
+REWARD, PENALTY = 2, -3
+AMBIGUOUS = -1                      # 任一方为N等简并碱基（仍计为错配）
+GAP_OPEN, GAP_EXTEND = 5, 2
+LAMBDA, KAPPA = 0.625, 0.41
+# 无空位片段达到该比特分才触发有空位比对（blastn的gap trigger）
+GAP_TRIGGER_BITS = 27.0
+NEG = -(1 << 28)
+
+# 与3_blast.txt中-outfmt "6 ..."相同的13列
+OUTFMT6_COLUMNS = ("qseqid", "sseqid", "pident", "length", "mismatch", "gapopen",
+                   "qstart", "qend", "sstart", "send", "evalue", "bitscore", "qcovs")
+
+# 工作进程的共享数据（由initializer在进程启动时设置一次，索引以内存映射打开，各进程经页缓存共享）
+_WORKER: Dict[str, object] = {}
+
+
+def source_fingerprint(path: str, with_hash: bool = True) -> dict:
+    stat = os.stat(path)
+    fingerprint = {"path": os.path.abspath(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    if with_hash:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        fingerprint["sha256"] = digest.hexdigest()
+    return fingerprint
+
+
+def source_name(path: str) -> str:
+    """参考元件集名称：FASTA文件名去掉扩展名（如EN2_Core_p）"""
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def pack_codes(codes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """碱基编码按每字节4个碱基（2 bit）打包；非ACGT位置单独记录（打包时按A存放）"""
+    n_positions = np.flatnonzero(codes > 3).astype(np.int64)
+    clean = np.where(codes > 3, 0, codes).astype(np.uint8)
+    clean = np.concatenate([clean, np.zeros((-len(clean)) % 4, dtype=np.uint8)]).reshape(-1, 4)
+    packed = (clean[:, 0] << 6) | (clean[:, 1] << 4) | (clean[:, 2] << 2) | clean[:, 3]
+    return packed.astype(np.uint8), n_positions
+
+
+def unpack_codes(packed: np.ndarray, n_positions: np.ndarray, start: int, end: int) -> np.ndarray:
+    """取出打包序列中[start, end)的碱基编码（0-3，非ACGT为4）"""
+    first, last = start // 4, (end + 3) // 4
+    block = np.asarray(packed[first:last])
+    codes = ((block[:, None] >> np.array([6, 4, 2, 0], dtype=np.uint8)) & 3).ravel()
+    codes = codes[start - first * 4:end - first * 4].copy()
+    lo, hi = np.searchsorted(n_positions, [start, end])
+    codes[np.asarray(n_positions[lo:hi]) - start] = 4
+    return codes
+
+
+def kmer_codes(codes: np.ndarray, k: int) -> np.ndarray:
+    """每个起点的k-mer编码（uint64，每碱基2 bit，k ≤ 31）；含N的k-mer为全1（无效）"""
+    if len(codes) < k:
+        return np.zeros(0, dtype=np.uint64)
+    windows = sliding_window_view(codes, k)
+    weights = np.uint64(1) << (np.uint64(2) * np.arange(k - 1, -1, -1, dtype=np.uint64))
+    packed = (np.minimum(windows, 3).astype(np.uint64) * weights).sum(axis=1, dtype=np.uint64)
+    packed[(windows > 3).any(axis=1)] = np.uint64(0xFFFFFFFFFFFFFFFF)
+    return packed
+
+
+class KmerIndex:
+    """
+    参考元件集的持久化k-mer索引（目录，各数组为.npy，以内存映射方式打开，启动几乎无开销）：
+        meta.json        版本、k、来源FASTA指纹（路径、大小、修改时间、sha256）、参考序列表
+                         （名称、来源集、在拼接序列中的起点、长度）
+        packed.npy       全部参考序列首尾拼接后的2 bit打包序列
+        n_positions.npy  非ACGT碱基的位置（升序）
+        kmers.npy        全部不含N、不跨参考序列边界的k-mer编码（升序）
+        positions.npy    与kmers一一对应的拼接序列位置
+    写入时每个文件先写临时文件再原子替换，meta.json最后写入，作为索引完整的标志
+    """
+
+    def __init__(self, index_dir: str):
+        self.index_dir = index_dir
+        with open(os.path.join(index_dir, META_NAME), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.k = self.meta["k"]
+        self.names = [ref[0] for ref in self.meta["references"]]
+        self.ref_sources = np.array([ref[1] for ref in self.meta["references"]], dtype=np.int64)
+        self.offsets = np.array([ref[2] for ref in self.meta["references"]], dtype=np.int64)
+        self.lengths = np.array([ref[3] for ref in self.meta["references"]], dtype=np.int64)
+        self.sources = [source_name(s["path"]) for s in self.meta["sources"]]
+        self.arrays = {name: np.load(os.path.join(index_dir, f"{name}.npy"), mmap_mode="r") for name in ARRAYS}
+        self._ref_cache: Dict[int, np.ndarray] = {}
+
+    @staticmethod
+    def build(fasta_paths: List[str], index_dir: str, k: int = 11) -> "KmerIndex":
+        if not 1 <= k <= 31:
+            raise ValueError(f"k必须在1-31之间：{k}")
+        os.makedirs(index_dir, exist_ok=True)
+        references, parts, kmer_parts, position_parts = [], [], [], []
+        offset = 0
+        for source_id, path in enumerate(fasta_paths):
+            for seq_id, seq in read_fasta(path):
+                codes = encode_dna(seq)
+                references.append([seq_id, source_id, offset, len(codes)])
+                kmers = kmer_codes(codes, k)
+                valid = np.flatnonzero(kmers != np.uint64(0xFFFFFFFFFFFFFFFF))
+                kmer_parts.append(kmers[valid])
+                position_parts.append(valid + offset)
+                parts.append(codes)
+                offset += len(codes)
+        codes = np.concatenate(parts) if parts else np.zeros(0, dtype=np.uint8)
+        kmers = np.concatenate(kmer_parts) if kmer_parts else np.zeros(0, dtype=np.uint64)
+        positions = np.concatenate(position_parts) if position_parts else np.zeros(0, dtype=np.int64)
+        order = np.argsort(kmers, kind="stable")
+        packed, n_positions = pack_codes(codes)
+        arrays = {"packed": packed, "n_positions": n_positions,
+                  "kmers": kmers[order], "positions": positions[order]}
+        for name, values in arrays.items():
+            path = os.path.join(index_dir, f"{name}.npy")
+            with open(path + ".tmp", "wb") as f:
+                np.save(f, values)
+            os.replace(path + ".tmp", path)
+        meta = {
+            "version": INDEX_VERSION,
+            "k": k,
+            "sources": [source_fingerprint(path) for path in fasta_paths],
+            "references": references,
+        }
+        meta_path = os.path.join(index_dir, META_NAME)
+        with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, indent=1)
+        os.replace(meta_path + ".tmp", meta_path)
+        return KmerIndex(index_dir)
+
+    @staticmethod
+    def stale_reason(index_dir: str, fasta_paths: Optional[List[str]] = None, k: Optional[int] = None) -> str:
+        """
+        判断索引是否需要重建，返回原因（空串表示可直接使用）：
+        索引缺失、版本或k不同、来源文件列表不同，或来源文件的大小/修改时间变化且内容哈希也不同
+        """
+        meta_path = os.path.join(index_dir, META_NAME)
+        if not os.path.exists(meta_path):
+            return "索引不存在"
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != INDEX_VERSION:
+            return "索引版本不同"
+        if k is not None and meta["k"] != k:
+            return f"k不同（索引为{meta['k']}）"
+        recorded = meta["sources"]
+        if fasta_paths is not None and [os.path.abspath(p) for p in fasta_paths] != [s["path"] for s in recorded]:
+            return "来源FASTA列表不同"
+        for source in recorded:
+            if not os.path.exists(source["path"]):
+                # 来源文件已移走时沿用现有索引
+                continue
+            current = source_fingerprint(source["path"], with_hash=False)
+            if current["size"] == source["size"] and current["mtime_ns"] == source["mtime_ns"]:
+                continue
+            if source_fingerprint(source["path"])["sha256"] != source["sha256"]:
+                return f"来源文件已变化：{source['path']}"
+        return ""
+
+    @staticmethod
+    def open(index_dir: str, fasta_paths: Optional[List[str]] = None, k: Optional[int] = None) -> "KmerIndex":
+        """打开索引；索引缺失或来源已变化时自动（重新）建立。fasta_paths为空时使用索引中记录的来源"""
+        reason = KmerIndex.stale_reason(index_dir, fasta_paths, k)
+        if not reason:
+            return KmerIndex(index_dir)
+        if fasta_paths is None:
+            if not os.path.exists(os.path.join(index_dir, META_NAME)):
+                raise FileNotFoundError(f"索引不存在且未提供参考FASTA：{index_dir}")
+            with open(os.path.join(index_dir, META_NAME), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            fasta_paths = [s["path"] for s in meta["sources"]]
+            k = k or meta["k"]
+        print(f"{reason}，重新建立索引：{index_dir}")
+        return KmerIndex.build(fasta_paths, index_dir, k or 11)
+
+    def reference_codes(self, ref: int) -> np.ndarray:
+        if ref not in self._ref_cache:
+            start = int(self.offsets[ref])
+            self._ref_cache[ref] = unpack_codes(self.arrays["packed"], self.arrays["n_positions"],
+                                                start, start + int(self.lengths[ref]))
+        return self._ref_cache[ref]
+
+    def seeds(self, codes: np.ndarray, max_occurrences: int = 1000) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        查询序列的全部k-mer种子：返回(查询位置, 参考序列下标, 参考序列内位置)
+        出现次数超过max_occurrences的k-mer（重复序列）不作为种子
+        """
+        query_kmers = kmer_codes(codes, self.k)
+        kmers = self.arrays["kmers"]
+        lo = np.searchsorted(kmers, query_kmers, side="left")
+        hi = np.searchsorted(kmers, query_kmers, side="right")
+        counts = hi - lo
+        counts[(query_kmers == np.uint64(0xFFFFFFFFFFFFFFFF)) | (counts > max_occurrences)] = 0
+        total = int(counts.sum())
+        if not total:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, empty
+        owner = np.repeat(np.arange(len(query_kmers)), counts)
+        within = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        positions = np.asarray(self.arrays["positions"][lo[owner] + within], dtype=np.int64)
+        ref = np.searchsorted(self.offsets, positions, side="right") - 1
+        return owner, ref, positions - self.offsets[ref]
+
+
+def substitution_scores(query: np.ndarray, reference: np.ndarray) -> np.ndarray:
+    return np.where((query > 3) | (reference > 3), AMBIGUOUS, np.where(query == reference, REWARD, PENALTY))
+
+
+class Diagonal:
+    """查询与参考序列在对角线diag = s - q上逐位置的打分（匹配+2/错配-3），q_lo为第一个有效查询位置"""
+    __slots__ = ("diag", "q_lo", "prefix")
+
+    def __init__(self, query: np.ndarray, reference: np.ndarray, diag: int):
+        self.diag = diag
+        self.q_lo = max(0, -diag)
+        q_hi = min(len(query), len(reference) - diag)
+        q = query[self.q_lo:q_hi]
+        s = reference[self.q_lo + diag:q_hi + diag]
+        self.prefix = np.concatenate([[0], np.cumsum(substitution_scores(q, s))])
+
+    def best_segment(self) -> Tuple[int, int, int]:
+        """对角线上得分最高的无空位连续片段：返回(q起点, q终点, 得分)"""
+        prefix = self.prefix
+        running_min = np.minimum.accumulate(prefix)
+        gain = prefix - running_min
+        end = int(np.argmax(gain))
+        start = int(np.flatnonzero(prefix[:end + 1] == running_min[end])[-1])
+        return start + self.q_lo, end + self.q_lo, int(gain[end])
+
+
+class Alignment:
+    """局部比对结果，坐标0-based半开区间（q为搜索所用链上的坐标）"""
+    __slots__ = ("score", "q_start", "q_end", "s_start", "s_end", "length", "matches", "mismatches", "gap_opens")
+
+    def __init__(self, score: int, q_start: int, q_end: int, s_start: int, s_end: int,
+                 length: int, matches: int, mismatches: int, gap_opens: int):
+        self.score = score
+        self.q_start, self.q_end = q_start, q_end
+        self.s_start, self.s_end = s_start, s_end
+        self.length = length
+        self.matches = matches
+        self.mismatches = mismatches
+        self.gap_opens = gap_opens
+
+
+def banded_align(query: np.ndarray, reference: np.ndarray, diag: int, band: int, matrix: Optional[np.ndarray] = None,
+                 gap_open: int = GAP_OPEN, gap_extend: int = GAP_EXTEND, pad: int = 4) -> Optional[Alignment]:
+    """
+    对角线diag ± band带内的仿射空位局部比对（Smith-Waterman/Gotoh，默认打分与blastn一致），带回溯。
+    matrix为替换得分矩阵（按编码下标取值，如蛋白的BLOSUM62），pad为不计入一致位点的编码（核酸为N）。
+    逐行（查询位置）向量化：第t列对应参考位置s = q + diag + t - band；
+    对角前驱在上一行同一列，竖直空位（消耗查询）来自上一行的t+1列，
+    水平空位（消耗参考）在行内用前缀最大值一次求出（从水平空位结束处再开新的水平空位不会更优）
+    """
+    width = 2 * band + 1
+    offsets = np.arange(-band, band + 1)
+    q_lo = max(0, -diag - band)
+    q_hi = min(len(query), len(reference) - diag + band)
+    if q_hi <= q_lo:
+        return None
+    rows = q_hi - q_lo
+    open_cost = gap_open + gap_extend
+    ramp = gap_extend * np.arange(width)
+    # 全部行的参考位置、有效性与替换得分一次算出
+    s_index = (np.arange(q_lo, q_hi) + diag)[:, None] + offsets[None, :]
+    valid = (s_index >= 0) & (s_index < len(reference))
+    padded = np.append(reference, pad)[np.where(valid, s_index, -1)]
+    if matrix is None:
+        scores = substitution_scores(query[q_lo:q_hi, None], padded)
+    else:
+        scores = matrix[query[q_lo:q_hi, None], padded].astype(np.int64)
+    h_all = np.empty((rows, width), dtype=np.int64)
+    h_src = np.zeros((rows, width), dtype=np.int8)     # 0：对角（比对从此开始），1：对角，2：水平空位，3：竖直空位
+    e_open = np.zeros((rows, width), dtype=bool)
+    f_open = np.zeros((rows, width), dtype=bool)
+    # 多留一列NEG，上一行的t+1列直接切片取得
+    h_prev = np.full(width + 1, NEG, dtype=np.int64)
+    f_prev = np.full(width + 1, NEG, dtype=np.int64)
+    e = np.full(width, NEG, dtype=np.int64)
+    for row in range(rows):
+        previous = np.maximum(h_prev[:width], 0)
+        diagonal = previous + scores[row]
+        open_f = h_prev[1:] - open_cost
+        extend_f = f_prev[1:] - gap_extend
+        f_open[row] = open_f >= extend_f
+        f = np.maximum(open_f, extend_f)
+        hd = np.maximum(np.maximum(diagonal, f), 0)
+        hd[~valid[row]] = NEG
+        # E[t] = max_{u<t}(hd[u] + extend·u) - open - extend·t
+        e[1:] = np.maximum.accumulate(hd[:-1] + ramp[:-1]) - open_cost - ramp[1:] + gap_extend
+        e[~valid[row]] = NEG
+        e_open[row, 1:] = hd[:-1] - open_cost >= e[:-1] - gap_extend
+        h = np.maximum(hd, e)
+        h_all[row] = h
+        h_src[row] = np.where(hd >= e, np.where(hd == diagonal, previous > 0, 3), 2)
+        h_prev[:width] = h
+        f_prev[:width] = np.where(valid[row], f, NEG)
+    best_flat = int(np.argmax(h_all))
+    best = int(h_all.flat[best_flat])
+    best_cell = divmod(best_flat, width)
+    if best <= 0:
+        return None
+
+    row, t = best_cell
+    q_end = q_lo + row + 1
+    s_end = q_end + diag + int(offsets[t])
+    q_start, s_start = q_end, s_end
+    state, length, aligned, matches, gap_opens = 1, 0, 0, 0, 0
+    while True:
+        length += 1
+        if state == 1:
+            source = h_src[row, t]
+            if source > 1:
+                state = source
+                gap_opens += 1
+                length -= 1
+                continue
+            q_start = q_lo + row
+            s_start = q_start + diag + int(offsets[t])
+            matches += int(query[q_start] == reference[s_start] and query[q_start] != pad)
+            aligned += 1
+            if source == 0:
+                break
+            row -= 1
+        elif state == 2:
+            state = 1 if e_open[row, t] else 2
+            t -= 1
+        else:
+            state = 1 if f_open[row, t] else 3
+            row -= 1
+            t += 1
+    return Alignment(best, q_start, q_end, s_start, s_end, length, matches, aligned - matches, gap_opens)
+
+
+def bit_score(raw: int) -> float:
+    return (LAMBDA * raw - math.log(KAPPA)) / math.log(2)
+
+
+def e_value(raw: int, query_length: int, db_length: int) -> float:
+    """搜索空间取查询长度×参考集总长（未做blastn的有效长度校正，E值比blastn略大几个百分点）"""
+    return KAPPA * query_length * db_length * math.exp(-LAMBDA * raw)
+
+
+def format_evalue(evalue: float) -> str:
+    """与BLAST表格输出一致的E值格式"""
+    if evalue < 1e-180:
+        return "0.0"
+    if evalue < 1e-3:
+        return f"{evalue:.2e}"
+    if evalue < 0.1:
+        return f"{evalue:.3f}"
+    if evalue < 1:
+        return f"{evalue:.2f}"
+    if evalue < 10:
+        return f"{evalue:.1f}"
+    return f"{evalue:.0f}"
+
+
+def format_bitscore(bits: float) -> str:
+    return str(int(bits)) if bits > 99.9 else f"{bits:.1f}"
+
+
+def search_codes(index: KmerIndex, codes: np.ndarray, refs: np.ndarray, max_evalue: float = 10.0,
+                 band: int = 30, min_seeds: int = 1) -> List[Tuple[int, str, Alignment]]:
+    """
+    对一条查询序列（两条链）做种子-延伸搜索：
+        1. 索引查出k-mer种子，按(链, 参考序列, 对角线)分组，种子数不少于min_seeds的对角线参与延伸；
+        2. 每条对角线取无空位得分最高的片段，达到GAP_TRIGGER_BITS的片段才触发有空位比对；
+        3. 按片段得分从高到低，在其对角线 ± band内做仿射空位局部比对，
+           被已有比对覆盖（对角线在带内且查询区间重叠过半）的片段不再触发；
+        4. 按refs限定的参考序列总长计算E值，保留E值 ≤ max_evalue的比对。
+    返回[(参考序列下标, 查询链"+"/"-", Alignment)]，按得分从高到低；负链比对的查询坐标位于反向互补序列上
+    """
+    db_length = int(index.lengths[refs].sum())
+    allowed = np.zeros(len(index.names), dtype=bool)
+    allowed[refs] = True
+    trigger = (GAP_TRIGGER_BITS * math.log(2) + math.log(KAPPA)) / LAMBDA
+    reverse = np.where(codes > 3, 4, 3 - np.minimum(codes, 3))[::-1].astype(np.uint8)
+    results = []
+    for strand, query in (("+", codes), ("-", reverse)):
+        q_pos, ref, s_pos = index.seeds(query)
+        keep = allowed[ref]
+        q_pos, ref, s_pos = q_pos[keep], ref[keep], s_pos[keep]
+        if not len(q_pos):
+            continue
+        keys, counts = np.unique(np.stack([ref, s_pos - q_pos]), axis=1, return_counts=True)
+        for r in np.unique(keys[0]).tolist():
+            reference = index.reference_codes(r)
+            segments = []
+            for diag in keys[1][(keys[0] == r) & (counts >= min_seeds)].tolist():
+                start, end, score = Diagonal(query, reference, diag).best_segment()
+                if score >= trigger:
+                    segments.append((score, diag, start, end))
+            segments.sort(key=lambda item: -item[0])
+            used = [False] * len(segments)
+            seen = set()
+            for i, (_, diag, _, _) in enumerate(segments):
+                if used[i]:
+                    continue
+                alignment = banded_align(query, reference, diag, band)
+                if alignment is None:
+                    continue
+                for j, (_, other_diag, start, end) in enumerate(segments):
+                    overlap = min(end, alignment.q_end) - max(start, alignment.q_start)
+                    if abs(other_diag - diag) <= band and overlap * 2 > end - start:
+                        used[j] = True
+                key = (alignment.q_start, alignment.q_end, alignment.s_start, alignment.s_end)
+                if key in seen or e_value(alignment.score, len(codes), db_length) > max_evalue:
+                    continue
+                seen.add(key)
+                results.append((r, strand, alignment))
+    results.sort(key=lambda item: -item[2].score)
+    return results
+
+
+def format_hits(index: KmerIndex, query_id: str, query_length: int, db_length: int,
+                hits: List[Tuple[int, str, Alignment]]) -> List[str]:
+    """将search_codes结果转为outfmt 6的13列文本行（坐标1-based；负链比对sstart > send）"""
+    covered: Dict[int, np.ndarray] = {}
+    rows = []
+    for ref, strand, alignment in hits:
+        if strand == "+":
+            q_start, q_end = alignment.q_start + 1, alignment.q_end
+            s_start, s_end = alignment.s_start + 1, alignment.s_end
+        else:
+            q_start, q_end = query_length - alignment.q_end + 1, query_length - alignment.q_start
+            s_start, s_end = alignment.s_end, alignment.s_start + 1
+        if ref not in covered:
+            covered[ref] = np.zeros(query_length, dtype=bool)
+        covered[ref][q_start - 1:q_end] = True
+        rows.append((ref, [query_id, index.names[ref], f"{100.0 * alignment.matches / alignment.length:.3f}",
+                           str(alignment.length), str(alignment.mismatches), str(alignment.gap_opens),
+                           str(q_start), str(q_end), str(s_start), str(s_end),
+                           format_evalue(e_value(alignment.score, query_length, db_length)),
+                           format_bitscore(bit_score(alignment.score))]))
+    # qcovs：该参考序列全部比对覆盖的查询位置占查询长度的百分比
+    coverage = {ref: str(int(round(100.0 * mask.sum() / max(query_length, 1)))) for ref, mask in covered.items()}
+    return ["\t".join(fields + [coverage[ref]]) for ref, fields in rows]
+
+
+def _init_worker(index_dir: str, params: Dict[str, object]) -> None:
+    _WORKER["index"] = KmerIndex(index_dir)
+    _WORKER["params"] = params
+
+
+def _search_batch(batch: List[Tuple[str, str]]) -> Dict[int, List[str]]:
+    """工作进程：对一批查询序列搜索各参考元件集，返回{来源集下标: 输出行}"""
+    index: KmerIndex = _WORKER["index"]
+    params = _WORKER["params"]
+    lines: Dict[int, List[str]] = {}
+    for source in params["sources"]:
+        refs = np.flatnonzero(index.ref_sources == source)
+        db_length = int(index.lengths[refs].sum())
+        for query_id, seq in batch:
+            codes = encode_dna(seq)
+            hits = search_codes(index, codes, refs, params["evalue"], params["band"], params["min_seeds"])
+            lines.setdefault(source, []).extend(format_hits(index, query_id, len(codes), db_length, hits))
+    return lines
+
+
+def search_file(index_dir: str, query_path: str, output: str, sources: List[int], evalue: float = 10.0,
+                band: int = 30, min_seeds: int = 1, workers: int = 1, batch_size: int = 8) -> Dict[str, int]:
+    """
+    用多个进程搜索查询FASTA（各进程以内存映射共享同一份索引），按查询顺序写出。
+    output含"{source}"占位符时每个参考元件集一个文件，否则全部写入同一文件；返回{输出文件: 行数}
+    """
+    index = KmerIndex(index_dir)
+    records = read_fasta(query_path)
+    batches = [records[i:i + batch_size] for i in range(0, len(records), batch_size)]
+    params = {"sources": sources, "evalue": evalue, "band": band, "min_seeds": min_seeds}
+    paths = {source: output.format(source=index.sources[source]) for source in sources}
+    handles = {path: open(path, "w", encoding="utf-8") for path in set(paths.values())}
+    counts = {path: 0 for path in handles}
+    try:
+        if workers > 1:
+            executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(index_dir, params))
+            results = executor.map(_search_batch, batches)
+        else:
+            executor = None
+            _init_worker(index_dir, params)
+            results = map(_search_batch, batches)
+        for lines in results:
+            for source in sources:
+                for line in lines.get(source, []):
+                    handles[paths[source]].write(line + "\n")
+                    counts[paths[source]] += 1
+        if executor:
+            executor.shutdown()
+    finally:
+        for handle in handles.values():
+            handle.close()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="参考调控元件集（EN2_Core_p、EnhI_XP_X、SP1_L、SP2_M）的持久化k-mer索引与种子-延伸搜索")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="建立（或在来源变化时重建）索引")
+    build_parser.add_argument("--index", required=True, help="索引目录（如New/HBV_regions.kidx）")
+    build_parser.add_argument("--references", nargs="+", required=True, help="参考元件FASTA（如EN2_Core_p.fasta EnhI_XP_X.fasta SP1_L.fasta SP2_M.fasta）")
+    build_parser.add_argument("-k", type=int, default=11, help="k-mer长度（默认11，最大31）")
+    build_parser.add_argument("--force", action="store_true", help="来源未变化也重建")
+
+    search_parser = subparsers.add_parser("search", help="搜索查询序列，输出与blastn -outfmt \"6 " + " ".join(OUTFMT6_COLUMNS) + "\"相同的13列")
+    search_parser.add_argument("--index", required=True, help="索引目录（来源FASTA变化时自动重建）")
+    search_parser.add_argument("--references", nargs="+", help="参考元件FASTA（索引不存在或来源列表不同时据此建立）")
+    search_parser.add_argument("--query", required=True, help="查询FASTA（如New/Human.fasta、\"New/Domestic cat.fasta\"）")
+    search_parser.add_argument("--output", required=True, help="输出文件；含{source}时每个参考元件集一个文件（如all_cat.{source}.blast）")
+    search_parser.add_argument("--sets", nargs="+", help="只搜索这些参考元件集（FASTA文件名去扩展名，默认全部）")
+    search_parser.add_argument("--evalue", type=float, default=10.0, help="E值阈值（默认10）")
+    search_parser.add_argument("--band", type=int, default=30, help="有空位比对的对角线带宽（默认30，即单侧累计空位不超过30bp）")
+    search_parser.add_argument("--min-seeds", type=int, default=1, help="对角线参与延伸所需的最少种子数（默认1）")
+    search_parser.add_argument("--workers", type=int, default=1, help="并行进程数（默认1）")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        reason = "强制重建" if args.force else KmerIndex.stale_reason(args.index, args.references, args.k)
+        if not reason:
+            print(f"索引已是最新：{args.index}")
+            return
+        index = KmerIndex.build(args.references, args.index, args.k)
+        print(f"{reason}，索引已建立：{len(index.names)} 条参考序列，{len(index.arrays['kmers'])} 个k-mer → {args.index}")
+        return
+
+    index = KmerIndex.open(args.index, args.references)
+    if args.sets:
+        unknown = set(args.sets) - set(index.sources)
+        if unknown:
+            raise SystemExit(f"索引中没有这些参考元件集：{', '.join(sorted(unknown))}（可用：{', '.join(index.sources)}）")
+        sources = [index.sources.index(name) for name in args.sets]
+    else:
+        sources = list(range(len(index.sources)))
+    counts = search_file(args.index, args.query, args.output, sources, args.evalue, args.band,
+                         args.min_seeds, args.workers)
+    for path, count in counts.items():
+        print(f"{count} 条比对已保存至：{path}")
+
+
+if __name__ == "__main__":
+    main()
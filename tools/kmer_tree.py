@@ -0,0 +1,232 @@
+import argparse
+import re
+from typing import List, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from fasta_io import encode_dna, read_fasta
+
+MASK64 = np.uint64(0xFFFFFFFFFFFFFFFF)
+
+
+def canonical_kmers(codes: np.ndarray, k: int) -> np.ndarray:
+    """
+    计算序列中所有不含N的k-mer的规范编码（正链与反向互补中较小者），去重后返回
+    k ≤ 31，编码为uint64（每个碱基2 bit）
+    """
+    if len(codes) < k:
+        return np.zeros(0, dtype=np.uint64)
+    windows = sliding_window_view(codes, k)
+    ok = (windows < 4).all(axis=1)
+    windows = windows[ok].astype(np.uint64)
+    weights = np.uint64(1) << (np.uint64(2) * np.arange(k - 1, -1, -1, dtype=np.uint64))
+    forward = (windows * weights).sum(axis=1, dtype=np.uint64)
+    reverse = ((np.uint64(3) - windows[:, ::-1]) * weights).sum(axis=1, dtype=np.uint64)
+    return np.unique(np.minimum(forward, reverse))
+
+
+def profile_jaccard(kmer_sets: List[np.ndarray], block: int = 1 << 16) -> np.ndarray:
+    """
+    精确k-mer集合Jaccard矩阵：将所有k-mer映射到全局词表的列号，构成稀疏的序列×k-mer关联矩阵，
+    按列分块转为稠密0/1块后做矩阵乘法累加交集大小（X·Xᵀ），内存只与块大小相关
+    """
+    n = len(kmer_sets)
+    sizes = np.array([len(s) for s in kmer_sets], dtype=np.float64)
+    all_kmers = np.concatenate(kmer_sets) if n else np.zeros(0, dtype=np.uint64)
+    row_of = np.repeat(np.arange(n), [len(s) for s in kmer_sets])
+    _, col_of = np.unique(all_kmers, return_inverse=True)
+    n_cols = int(col_of.max()) + 1 if len(col_of) else 0
+
+    order = np.argsort(col_of, kind="stable")
+    rows_sorted, cols_sorted = row_of[order], col_of[order]
+    bounds = np.searchsorted(cols_sorted, np.arange(0, n_cols + block, block))
+    inter = np.zeros((n, n), dtype=np.float64)
+    for b in range(len(bounds) - 1):
+        lo, hi = bounds[b], bounds[b + 1]
+        if lo == hi:
+            continue
+        dense = np.zeros((n, block), dtype=np.float32)
+        dense[rows_sorted[lo:hi], cols_sorted[lo:hi] - b * block] = 1.0
+        inter += dense @ dense.T
+    union = sizes[:, None] + sizes[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1), 0.0)
+
+
+def minhash_jaccard(kmer_sets: List[np.ndarray], sketch_size: int = 256, seed: int = 42) -> np.ndarray:
+    """
+    MinHash（单次哈希分桶，one-permutation hashing）估计Jaccard：
+    每条序列的k-mer哈希后按高位分到sketch_size个桶，每桶保留最小值；
+    两序列Jaccard ≈ 取值相同的非空桶数 / 至少一方非空的桶数，全矩阵一次广播比较得到
+    """
+    n = len(kmer_sets)
+    sketches = np.full((n, sketch_size), MASK64, dtype=np.uint64)
+    mult = np.uint64(0x9E3779B97F4A7C15)
+    for i, kmers in enumerate(kmer_sets):
+        if not len(kmers):
+            continue
+        h = (kmers ^ np.uint64(seed)) * mult
+        h ^= h >> np.uint64(29)
+        h *= np.uint64(0xBF58476D1CE4E5B9)
+        h ^= h >> np.uint64(32)
+        buckets = (h % np.uint64(sketch_size)).astype(np.int64)
+        np.minimum.at(sketches[i], buckets, h)
+    empty = sketches == MASK64
+    jaccard = np.zeros((n, n), dtype=np.float64)
+    for i in range(n):
+        same = (sketches == sketches[i]) & ~empty
+        either = ~(empty & empty[i])
+        jaccard[i] = same.sum(axis=1) / np.maximum(either.sum(axis=1), 1)
+    return jaccard
+
+
+def mash_distance(jaccard: np.ndarray, k: int) -> np.ndarray:
+    """Mash距离 D = -ln(2J / (1 + J)) / k；J = 0时取1"""
+    with np.errstate(divide="ignore"):
+        dist = -np.log(2 * jaccard / (1 + jaccard)) / k
+    dist = np.where(jaccard > 0, dist, 1.0)
+    np.fill_diagonal(dist, 0.0)
+    return np.clip(dist, 0.0, 1.0)
+
+
+def neighbor_joining(dist: np.ndarray, names: List[str], chunk: int = 8) -> str:
+    """
+    邻接法建树（RapidNJ式剪枝，全部向量化）：
+        每行按距离预排序（新节点建立时排序一次），节点间距离合并后不再改变，排序始终有效；
+        Q(i, j) = (n-2)·d(i, j) - r_i - r_j，行i从排序位置h起的下界为 (n-2)·d(i, S[i, h]) - r_i - max(r)；
+        先用各行最近邻给出初始最优值，下界不小于最优值的行整体剪掉，
+        其余行每次取chunk个候选一起计算，直到所有行的下界都不优于当前最优值。
+    每轮只有r的更新和新节点的一行距离是O(n)，不再每轮重算完整的Q矩阵。
+    返回Newick字符串
+    """
+    n = len(names)
+    if n == 1:
+        return f"{names[0]};"
+    if n == 2:
+        return f"({names[0]}:{dist[0, 1] / 2:.6f},{names[1]}:{dist[0, 1] / 2:.6f});"
+
+    size = 2 * n - 1
+    D = np.zeros((size, size), dtype=np.float64)
+    D[:n, :n] = dist
+    active = np.zeros(size + 1, dtype=bool)  # 最后一位对应填充值-1，恒为False
+    active[:n] = True
+    labels = list(names) + [""] * (n - 1)
+    r = np.zeros(size, dtype=np.float64)
+    r[:n] = dist.sum(axis=1)
+    # S[i]为行i按距离排序的候选节点（-1填充），L[i]为有效长度，heads[i]为第一个可能仍活跃的位置
+    S = np.full((size, n + chunk), -1, dtype=np.int32)
+    S[:n, :n] = np.argsort(dist, axis=1, kind="stable")
+    L = np.zeros(size, dtype=np.int64)
+    L[:n] = n
+    heads = np.zeros(size, dtype=np.int64)
+    steps = np.arange(chunk)
+    remaining = n
+
+    for u in range(n, size):
+        ids = np.flatnonzero(active[:size])
+        # 跳过各行开头已失活（或为自身）的候选
+        while True:
+            head_node = S[ids, heads[ids]]
+            stale = (heads[ids] < L[ids]) & (~active[head_node] | (head_node == ids))
+            if not stale.any():
+                break
+            heads[ids[stale]] += 1
+
+        factor = remaining - 2
+        r_max = r[ids].max()
+        has_head = heads[ids] < L[ids]
+        head_node = np.where(has_head, S[ids, heads[ids]], ids)
+        d_head = np.where(has_head, D[ids, head_node], np.inf)
+        q_head = np.where(has_head, factor * d_head - r[ids] - r[head_node], np.inf)
+        best_pos = int(q_head.argmin())
+        best_q, best_pair = q_head[best_pos], (ids[best_pos], head_node[best_pos])
+
+        bounds = factor * d_head - r[ids] - r_max
+        rows = ids[bounds < best_q]
+        offsets = heads[rows]
+        while len(rows):
+            cols = offsets[:, None] + steps[None, :]
+            in_row = cols < L[rows][:, None]
+            cand = S[rows[:, None], cols]
+            ds = D[rows[:, None], cand]
+            ok = in_row & active[cand] & (cand != rows[:, None])
+            q = np.where(ok, factor * ds - r[rows][:, None] - r[cand], np.inf)
+            flat = int(q.argmin())
+            if q.flat[flat] < best_q:
+                row_pos, col_pos = divmod(flat, chunk)
+                best_q, best_pair = q.flat[flat], (rows[row_pos], cand[row_pos, col_pos])
+            more = in_row[:, -1] & (factor * ds[:, -1] - r[rows] - r_max < best_q)
+            rows, offsets = rows[more], offsets[more] + chunk
+
+        i, j = int(best_pair[0]), int(best_pair[1])
+        dij = D[i, j]
+        li = max(0.0, 0.5 * dij + (r[i] - r[j]) / (2 * factor))
+        lj = max(0.0, dij - li)
+        labels[u] = f"({labels[i]}:{li:.6f},{labels[j]}:{lj:.6f})"
+
+        active[i] = active[j] = False
+        others = np.flatnonzero(active[:size])
+        D[u, others] = D[others, u] = 0.5 * (D[i, others] + D[j, others] - dij)
+        r[others] += D[others, u] - D[others, i] - D[others, j]
+        r[u] = D[u, others].sum()
+        active[u] = True
+        S[u, :len(others)] = others[np.argsort(D[u, others], kind="stable")]
+        L[u] = len(others)
+        remaining -= 1
+        if remaining == 2:
+            break
+
+    i, j = np.flatnonzero(active[:size])
+    return f"({labels[i]}:{D[i, j] / 2:.6f},{labels[j]}:{D[i, j] / 2:.6f});"
+
+
+def newick_label(name: str) -> str:
+    """将序列名中Newick保留字符替换为下划线"""
+    return re.sub(r"[\s(),:;\[\]']", "_", name)
+
+
+def build_tree(fasta_path: str, k: int = 16, method: str = "profile", sketch_size: int = 256) -> Tuple[List[str], np.ndarray, str]:
+    records = read_fasta(fasta_path)
+    if not records:
+        raise ValueError(f"FASTA文件为空：{fasta_path}")
+    names = [newick_label(seq_id) for seq_id, _ in records]
+    kmer_sets = [canonical_kmers(encode_dna(seq), k) for _, seq in records]
+    print(f"读取 {len(records)} 条序列，k = {k}，距离方法：{method}")
+    if method == "minhash":
+        jaccard = minhash_jaccard(kmer_sets, sketch_size)
+    else:
+        jaccard = profile_jaccard(kmer_sets)
+    dist = mash_distance(jaccard, k)
+    return names, dist, neighbor_joining(dist, names)
+
+
+def write_phylip(names: List[str], dist: np.ndarray, path: str) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"{len(names)}\n")
+        for name, row in zip(names, dist):
+            f.write(name + " " + " ".join(f"{v:.6f}" for v in row) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="免比对的快速探索建树：k-mer（或MinHash）距离 + 邻接法，输出Newick")
+    parser.add_argument("--fasta", required=True, help="输入FASTA文件（如sequences.fasta）")
+    parser.add_argument("--output", required=True, help="输出Newick文件")
+    parser.add_argument("-k", type=int, default=16, help="k-mer长度（默认16，最大31）")
+    parser.add_argument("--method", choices=["profile", "minhash"], default="profile",
+                        help="profile：精确k-mer集合Jaccard；minhash：MinHash估计（序列很多时更快）")
+    parser.add_argument("--sketch-size", type=int, default=256, help="MinHash桶数（默认256）")
+    parser.add_argument("--matrix", help="同时输出PHYLIP格式距离矩阵")
+    args = parser.parse_args()
+
+    if not 1 <= args.k <= 31:
+        parser.error("k需在1~31之间")
+    names, dist, newick = build_tree(args.fasta, args.k, args.method, args.sketch_size)
+    with open(args.output, "w", encoding="utf-8") as f:
+        f.write(newick + "\n")
+    if args.matrix:
+        write_phylip(names, dist, args.matrix)
+    print(f"建树完成，结果保存至：{args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+import argparse
+import json
+import os
+import re
+import sys
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from fasta_io import read_fasta
+from promoter_windows import window_from_path
+
+# 统一的motif命中表（制表符分隔，坐标0-based半开区间，相对于所在序列）：
+#   seq_id  start  end  motif  strand  score
+HIT_COLUMNS = ("seq_id", "start", "end", "motif", "strand", "score")
+
+# 启动子窗口的FASTA头格式
+BLAST_HEADER = re.compile(r"^(?P<genome>.+)_from_(?P<start>\d+)_to_(?P<end>\d+)$")        # extract_blast_sequences.py
+PROMOTER_HEADER = re.compile(r"^(?P<genome>[^:]+):(?P<cds_start>\d+)_(?P<cds_end>\d+)$")    # tiqu_promoter.py
+PRODIGAL_HEADER = re.compile(r"^(?P<genome>[^_]+)_\d+_(?P<cds_start>\d+)_")                 # homer.py（Homer_1.txt）
+
+
+class Hit:
+    """一条命中（窗口坐标或基因组坐标，0-based半开区间）"""
+    __slots__ = ("seq_id", "start", "end", "motif", "strand", "score")
+
+    def __init__(self, seq_id: str, start: int, end: int, motif: str, strand: str, score: float):
+        self.seq_id = seq_id
+        self.start = start
+        self.end = end
+        self.motif = motif
+        self.strand = strand
+        self.score = score
+
+
+def read_hit_table(path: str) -> Iterator[Hit]:
+    """读取统一命中表（首行可为表头）"""
+    with open(path, "r", encoding="utf-8") as f:
+        for line_num, line in enumerate(f, 1):
+            parts = line.rstrip("\n").split("\t")
+            if len(parts) < 6 or parts[0] == "seq_id":
+                continue
+            try:
+                yield Hit(parts[0], int(parts[1]), int(parts[2]), parts[3], parts[4], float(parts[5]))
+            except ValueError:
+                print(f"跳过第{line_num}行：{line.strip()} → 格式错误")
+
+
+def read_homer_find(path: str, offset_origin: str = "center",
+                    window_lengths: Optional[Dict[str, int]] = None) -> Iterator[Hit]:
+    """
+    读取HOMER -find输出（FASTA ID, Offset, Sequence, Motif Name, Strand, MotifScore）
+    offset_origin: "center"表示Offset相对于序列中心（HOMER默认），需要window_lengths给出各序列长度；
+                   "start"表示Offset为相对序列起点的0-based位置
+    负链命中的Offset指向motif在负链上的5'端（即正链坐标的最右端）
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        for line_num, line in enumerate(f, 1):
+            parts = line.rstrip("\n").split("\t")
+            if len(parts) < 6 or parts[0] == "FASTA ID":
+                continue
+            try:
+                seq_id, offset, site, motif, strand = parts[0], int(parts[1]), parts[2], parts[3], parts[4]
+                score = float(parts[5])
+            except ValueError:
+                print(f"跳过第{line_num}行：{line.strip()} → 格式错误")
+                continue
+            if offset_origin == "center":
+                if not window_lengths or seq_id not in window_lengths:
+                    print(f"跳过第{line_num}行：未知序列{seq_id}的长度，无法换算中心坐标")
+                    continue
+                offset += window_lengths[seq_id] // 2
+            width = len(site)
+            start = offset - width + 1 if strand == "-" else offset
+            yield Hit(seq_id, start, start + width, motif, strand, score)
+
+
+def window_origin(header: str, genome_lengths: Dict[str, int], window_len: Optional[int],
+                  default_upstream: int, downstream: int = 0) -> Tuple[str, int]:
+    """
+    由启动子窗口的FASTA头求 (基因组名称, 窗口第一个碱基在基因组上的0-based位置)
+    支持：
+        >{基因组}_from_{起}_to_{止}         窗口即[起, 止]（1-based）
+        >{基因组}:{CDS起始}_{CDS终止}        CDS起始上游(window_len - downstream) bp（tiqu_promoter.py）
+        >{基因组}_{序号}_{CDS起始}_...      同上（homer.py，基因组名为第一个_之前）
+    downstream为窗口中CDS起始位点（含）之后的长度（homer.py --windows的"上游:下游"窗口），
+    FASTA头中不含这一信息，需由调用方给出；window_len为None时上游长度使用default_upstream
+    """
+    upstream = window_len - downstream if window_len else default_upstream
+    match = BLAST_HEADER.match(header)
+    if match and match.group("genome") in genome_lengths:
+        return match.group("genome"), int(match.group("start")) - 1
+    for pattern in (PROMOTER_HEADER, PRODIGAL_HEADER):
+        match = pattern.match(header)
+        if match and match.group("genome") in genome_lengths:
+            genome = match.group("genome")
+            return genome, (int(match.group("cds_start")) - 1 - upstream) % genome_lengths[genome]
+    raise ValueError(f"无法从序列名{header}解析出已知基因组和窗口位置")
+
+
+def genome_lengths_from_fasta(fasta_path: str) -> Dict[str, int]:
+    """
+    基因组长度表；同时登记完整ID和第一个_之前的名称（与homer.py的load_genome_database一致）
+    """
+    lengths: Dict[str, int] = {}
+    for seq_id, seq in read_fasta(fasta_path):
+        lengths[seq_id] = len(seq)
+        short_name = seq_id.split("_", 1)[0]
+        lengths.setdefault(short_name, len(seq))
+    return lengths
+
+
+def window_downstream(windows_path: Optional[str], downstream: Optional[int]) -> int:
+    """
+    窗口的下游长度：命令行给出时直接使用，否则从窗口FASTA文件名推断
+    （homer.py --windows输出的promoters_up1000_down100.fasta → 100），都没有时为0
+    """
+    if downstream is not None:
+        return downstream
+    window = window_from_path(windows_path) if windows_path else None
+    if window and window[1]:
+        print(f"由文件名推断窗口为上游{window[0]}bp + 下游{window[1]}bp：{windows_path}")
+    return window[1] if window else 0
+
+
+def lift_hits(hits: Iterator[Hit], genome_lengths: Dict[str, int], window_lengths: Dict[str, int],
+              default_upstream: int, downstream: int = 0) -> Iterator[Hit]:
+    """
+    把窗口坐标的命中换算为环状基因组坐标：start取模到[0, L)，end = start + 宽度（跨原点时end > L）
+    """
+    origins: Dict[str, Optional[Tuple[str, int]]] = {}
+    for hit in hits:
+        if hit.seq_id not in origins:
+            try:
+                origins[hit.seq_id] = window_origin(hit.seq_id, genome_lengths, window_lengths.get(hit.seq_id),
+                                                    default_upstream, downstream)
+            except ValueError as e:
+                print(f"跳过序列 {hit.seq_id} → {str(e)}")
+                origins[hit.seq_id] = None
+        origin = origins[hit.seq_id]
+        if origin is None:
+            continue
+        genome, window_start = origin
+        length = genome_lengths[genome]
+        start = (window_start + hit.start) % length
+        yield Hit(genome, start, start + (hit.end - hit.start), hit.motif, hit.strand, hit.score)
+
+
+class IntervalIndex:
+    """
+    按基因组分组、按起点排序的命中区间索引，各列保存为.npy并以内存映射方式打开：
+        genomes.json  {基因组: [长度, 起始行, 行数, 最长命中]}
+        motifs.txt    motif名称表（motif.npy中保存行号）
+        start/end/motif/strand/score.npy
+    查询时在对应基因组的start列上二分查找，代价为O(log n + 结果数)
+    """
+    ARRAYS = ("start", "end", "motif", "strand", "score")
+
+    def __init__(self, index_dir: str):
+        with open(os.path.join(index_dir, "genomes.json"), "r", encoding="utf-8") as f:
+            self.genomes: Dict[str, List[int]] = json.load(f)
+        with open(os.path.join(index_dir, "motifs.txt"), "r", encoding="utf-8") as f:
+            self.motifs = [line.rstrip("\n") for line in f]
+        self.columns = {
+            name: np.load(os.path.join(index_dir, f"{name}.npy"), mmap_mode="r") for name in self.ARRAYS
+        }
+
+    @staticmethod
+    def build(hits: Iterator[Hit], genome_lengths: Dict[str, int], index_dir: str) -> int:
+        hit_list = list(hits)
+        os.makedirs(index_dir, exist_ok=True)
+        motif_names = sorted({h.motif for h in hit_list})
+        motif_ids = {name: i for i, name in enumerate(motif_names)}
+        genome_names = sorted({h.seq_id for h in hit_list})
+        genome_ids = {name: i for i, name in enumerate(genome_names)}
+
+        genome_col = np.array([genome_ids[h.seq_id] for h in hit_list], dtype=np.int32)
+        columns = {
+            "start": np.array([h.start for h in hit_list], dtype=np.int32),
+            "end": np.array([h.end for h in hit_list], dtype=np.int32),
+            "motif": np.array([motif_ids[h.motif] for h in hit_list], dtype=np.int32),
+            "strand": np.array([1 if h.strand != "-" else -1 for h in hit_list], dtype=np.int8),
+            "score": np.array([h.score for h in hit_list], dtype=np.float32),
+        }
+        order = np.lexsort((columns["start"], genome_col))
+        genome_col = genome_col[order]
+        for name, values in columns.items():
+            np.save(os.path.join(index_dir, f"{name}.npy"), values[order])
+
+        bounds = np.searchsorted(genome_col, np.arange(len(genome_names) + 1))
+        widths = columns["end"][order] - columns["start"][order]
+        genomes = {}
+        for gid, name in enumerate(genome_names):
+            lo, hi = int(bounds[gid]), int(bounds[gid + 1])
+            genomes[name] = [genome_lengths[name], lo, hi - lo, int(widths[lo:hi].max()) if hi > lo else 0]
+        with open(os.path.join(index_dir, "genomes.json"), "w", encoding="utf-8") as f:
+            json.dump(genomes, f, ensure_ascii=False, indent=1)
+        with open(os.path.join(index_dir, "motifs.txt"), "w", encoding="utf-8") as f:
+            f.write("".join(name + "\n" for name in motif_names))
+        return len(hit_list)
+
+    def _linear_query(self, genome: str, lo: int, hi: int) -> np.ndarray:
+        """返回与线性区间[lo, hi)相交的行号（区间可超出[0, L)，用于处理跨原点）"""
+        length, first, count, max_width = self.genomes[genome]
+        starts = self.columns["start"][first:first + count]
+        ends = self.columns["end"][first:first + count]
+        rows = []
+        # 命中本身可能跨原点（end > L），等价于平移-L后的区间
+        for shift in (0, length, -length):
+            a = np.searchsorted(starts, lo - shift - max_width, side="left")
+            b = np.searchsorted(starts, hi - shift, side="left")
+            sel = np.arange(a, b)
+            sel = sel[(ends[a:b] + shift > lo) & (starts[a:b] + shift < hi)]
+            rows.append(sel)
+        return np.unique(np.concatenate(rows)) + first
+
+    def query(self, genome: str, start: int, end: int, motif: str = "") -> List[Tuple[int, int, str, str, float]]:
+        """
+        查询环状基因组区间[start, end)（0-based；start > end表示跨原点，start == end为空区间）内的命中
+        返回[(起点, 终点, motif, 链, 得分)]，坐标0-based，终点可能大于基因组长度（跨原点命中）
+        """
+        if genome not in self.genomes or start == end:
+            return []
+        length = self.genomes[genome][0]
+        if start <= end:
+            rows = self._linear_query(genome, start, end)
+        else:
+            rows = np.union1d(self._linear_query(genome, start, length), self._linear_query(genome, 0, end))
+        results = []
+        for row in rows:
+            name = self.motifs[self.columns["motif"][row]]
+            if motif and motif.lower() not in name.lower():
+                continue
+            results.append((int(self.columns["start"][row]), int(self.columns["end"][row]), name,
+                            "+" if self.columns["strand"][row] > 0 else "-", float(self.columns["score"][row])))
+        return results
+
+    def write_bed(self, out) -> None:
+        """导出BED6；跨原点的命中拆成末端和起始两条记录"""
+        for genome, (length, first, count, _) in self.genomes.items():
+            for row in range(first, first + count):
+                start, end = int(self.columns["start"][row]), int(self.columns["end"][row])
+                name = self.motifs[self.columns["motif"][row]]
+                strand = "+" if self.columns["strand"][row] > 0 else "-"
+                score = float(self.columns["score"][row])
+                pieces = [(start, min(end, length))] + ([(0, end - length)] if end > length else [])
+                for a, b in pieces:
+                    out.write(f"{genome}\t{a}\t{b}\t{name}\t{score:.3f}\t{strand}\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="将启动子窗口上的motif命中换算回环状基因组坐标，建立区间索引并支持区域查询/BED导出")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="换算坐标并建立索引")
+    build_parser.add_argument("--hits", nargs="+", required=True, help="命中文件（统一命中表或HOMER -find输出）")
+    build_parser.add_argument("--format", choices=["table", "homer"], default="table", help="命中文件格式（默认统一命中表）")
+    build_parser.add_argument("--offset-origin", choices=["center", "start"], default="center",
+                              help="HOMER Offset的参考点（默认序列中心）")
+    build_parser.add_argument("--genomes", required=True, help="基因组FASTA（如DATA.fasta、Domestic_cat.fasta）")
+    build_parser.add_argument("--windows", help="启动子窗口FASTA（用于获得各窗口实际长度）")
+    build_parser.add_argument("--upstream", type=int, default=100, help="未提供窗口FASTA时使用的上游长度（默认100bp）")
+    build_parser.add_argument("--downstream", type=int,
+                              help="窗口中CDS起始位点之后的长度（默认从窗口文件名up*_down*推断，否则为0）")
+    build_parser.add_argument("--index", required=True, help="索引目录")
+
+    query_parser = subparsers.add_parser("query", help="区域查询")
+    query_parser.add_argument("--index", required=True)
+    query_parser.add_argument("--genome", required=True)
+    query_parser.add_argument("--start", type=int, required=True, help="起点（1-based，含）")
+    query_parser.add_argument("--end", type=int, required=True, help="终点（1-based，含；小于起点表示跨原点）")
+    query_parser.add_argument("--motif", default="", help="motif名称子串")
+
+    bed_parser = subparsers.add_parser("bed", help="导出BED")
+    bed_parser.add_argument("--index", required=True)
+    bed_parser.add_argument("--output", default="-")
+
+    args = parser.parse_args()
+    if args.command == "build":
+        genome_lengths = genome_lengths_from_fasta(args.genomes)
+        window_lengths = {seq_id: len(seq) for seq_id, seq in read_fasta(args.windows)} if args.windows else {}
+        hits = []
+        for path in args.hits:
+            if args.format == "homer":
+                hits.extend(read_homer_find(path, args.offset_origin, window_lengths))
+            else:
+                hits.extend(read_hit_table(path))
+        downstream = window_downstream(args.windows, args.downstream)
+        count = IntervalIndex.build(lift_hits(iter(hits), genome_lengths, window_lengths, args.upstream, downstream),
+                                    genome_lengths, args.index)
+        print(f"索引建立完成：{count} 条命中 → {args.index}")
+    elif args.command == "query":
+        index = IntervalIndex(args.index)
+        for start, end, motif, strand, score in index.query(args.genome, args.start - 1, args.end, args.motif):
+            print(f"{args.genome}\t{start + 1}\t{end}\t{motif}\t{strand}\t{score:.3f}")
+    else:
+        out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+        try:
+            IntervalIndex(args.index).write_bed(out)
+        finally:
+            if out is not sys.stdout:
+                out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
+
+import numpy as np
+
+from motifs import Motif, information_content, read_motif_file, write_meme_motifs
+
+METRICS = ("pearson", "allr")
+
+
+class ColumnFeatures:
+    """
+    将一组motif的列编码为可做点积的特征，补齐为(M, W, d)：两列的相似度 = left[a, i] · right[b, j]
+        pearson：列内标准化后的4维向量，点积/4即Pearson相关系数
+        allr：left = [p, log(p/bg)]，right = [log(q/bg), q]，点积/2即平均对数似然比（等权计数时的ALLR）
+    补齐列全为0，不贡献得分；rc_right为反向互补后的right特征（同样从第0列开始）
+    """
+
+    def __init__(self, motifs: List[Motif], metric: str = "pearson", pseudocount: float = 0.01, background: float = 0.25):
+        if metric not in METRICS:
+            raise ValueError(f"未知的相似度度量：{metric}")
+        self.metric = metric
+        self.widths = np.array([m.width for m in motifs], dtype=np.int64)
+        self.max_width = int(self.widths.max()) if len(motifs) else 0
+        dim = 4 if metric == "pearson" else 8
+        self.left = np.zeros((len(motifs), self.max_width, dim), dtype=np.float32)
+        self.right = np.zeros_like(self.left)
+        self.rc_right = np.zeros_like(self.left)
+        for i, motif in enumerate(motifs):
+            probs = np.asarray(motif.matrix, dtype=np.float64)
+            probs = (probs + pseudocount) / (probs.sum(axis=1, keepdims=True) + 4 * pseudocount)
+            w = motif.width
+            if metric == "pearson":
+                centered = probs - probs.mean(axis=1, keepdims=True)
+                std = centered.std(axis=1, keepdims=True)
+                z = centered / np.where(std > 0, std, 1.0) / 2.0
+                left = right = z
+                rc = z[::-1, ::-1]
+            else:
+                log_odds = np.log(probs / background)
+                left = np.hstack([probs, log_odds]) / np.sqrt(2.0)
+                right = np.hstack([log_odds, probs]) / np.sqrt(2.0)
+                rc = np.hstack([log_odds[::-1, ::-1], probs[::-1, ::-1]]) / np.sqrt(2.0)
+            self.left[i, :w] = left
+            self.right[i, :w] = right
+            self.rc_right[i, :w] = rc
+
+    def save(self, path: str, **extra: np.ndarray) -> None:
+        np.savez(path, metric=np.array(self.metric), widths=self.widths,
+                 left=self.left, right=self.right, rc_right=self.rc_right, **extra)
+
+    @classmethod
+    def load(cls, path: str) -> "ColumnFeatures":
+        features = cls.__new__(cls)
+        with np.load(path, allow_pickle=False) as data:
+            features.metric = str(data["metric"])
+            features.widths = data["widths"]
+            features.left = data["left"]
+            features.right = data["right"]
+            features.rc_right = data["rc_right"]
+        features.max_width = int(features.widths.max()) if len(features.widths) else 0
+        return features
+
+
+def _offset_scores(query: ColumnFeatures, target: ColumnFeatures, offset: int, strand: int) -> np.ndarray:
+    """
+    目标motif相对查询motif平移offset列（offset > 0时目标从查询第offset列开始），
+    对全部查询×目标一次矩阵乘法求重叠列相似度之和，返回(Mq, Mt)
+    """
+    right = target.rc_right if strand else target.right
+    if offset >= 0:
+        length = min(query.max_width - offset, target.max_width)
+        a = query.left[:, offset:offset + length]
+        b = right[:, :length]
+    else:
+        length = min(query.max_width, target.max_width + offset)
+        a = query.left[:, :length]
+        b = right[:, -offset:-offset + length]
+    if length <= 0:
+        return np.zeros((len(query.widths), len(target.widths)), dtype=np.float32)
+    return a.reshape(len(a), -1) @ b.reshape(len(b), -1).T
+
+
+def compare_motifs(query: ColumnFeatures, target: ColumnFeatures, min_overlap: int = 5, threads: int = 4) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    全部查询motif × 全部目标motif，在所有平移和两种方向下比较，取最优：
+        相似度 = 重叠列得分之和 / max(两motif宽度)（未重叠部分按0计，避免短重叠得分虚高），
+        重叠列数少于min(min_overlap, 较短motif宽度)的对齐不计。
+    每个(平移, 方向)是一次独立的矩阵乘法，分给线程池并行（numpy矩阵乘法期间释放GIL）。
+    返回(相似度, 最优平移, 最优方向(0正/1反向互补))，均为(Mq, Mt)
+    """
+    wq = query.widths[:, None]
+    wt = target.widths[None, :]
+    required = np.minimum(np.minimum(wq, wt), min_overlap)
+    norm = np.maximum(wq, wt).astype(np.float32)
+    offsets = range(-(target.max_width - 1), query.max_width)
+    jobs = [(offset, strand) for strand in (0, 1) for offset in offsets]
+
+    best = np.full((len(query.widths), len(target.widths)), -np.inf, dtype=np.float32)
+    best_offset = np.zeros(best.shape, dtype=np.int32)
+    best_strand = np.zeros(best.shape, dtype=np.int8)
+
+    def run(job):
+        offset, strand = job
+        scores = _offset_scores(query, target, offset, strand)
+        overlap = np.minimum(wq, offset + wt) - np.maximum(0, offset)
+        return job, np.where(overlap >= required, scores / norm, -np.inf)
+
+    with ThreadPoolExecutor(max_workers=max(1, threads)) as executor:
+        for (offset, strand), sim in executor.map(run, jobs):
+            better = sim > best
+            best[better] = sim[better]
+            best_offset[better] = offset
+            best_strand[better] = strand
+    return best, best_offset, best_strand
+
+
+def greedy_clusters(similarity: np.ndarray, order: np.ndarray, cutoff: float) -> np.ndarray:
+    """
+    贪心聚类：按order（信息量从高到低）依次取尚未归类的motif作为代表，
+    把与它相似度 ≥ cutoff且尚未归类的motif并入同一簇。代表始终是库中原有的矩阵，便于解释。
+    返回每个motif的代表下标
+    """
+    representative = np.full(len(order), -1, dtype=np.int64)
+    for idx in order:
+        if representative[idx] >= 0:
+            continue
+        members = (similarity[idx] >= cutoff) & (representative < 0)
+        members[idx] = True
+        representative[members] = idx
+    return representative
+
+
+def cluster_library(motifs: List[Motif], metric: str, cutoff: float, min_overlap: int, threads: int):
+    features = ColumnFeatures(motifs, metric)
+    similarity, offsets, strands = compare_motifs(features, features, min_overlap, threads)
+    # 两个方向比较的结果取对称（a对b与b对a的最优对齐得分应一致，数值误差取较大者）
+    similarity = np.maximum(similarity, similarity.T)
+    ic = np.array([information_content(m) for m in motifs])
+    order = np.argsort(-ic, kind="stable")
+    representative = greedy_clusters(similarity, order, cutoff)
+    return similarity, offsets, strands, representative
+
+
+def main():
+    parser = argparse.ArgumentParser(description="motif两两相似度比较与聚类：合并冗余的JASPAR矩阵，输出非冗余motif库和簇对照表")
+    parser.add_argument("--motifs", required=True, help="motif库（MEME/JASPAR/HOMER格式，自动识别）")
+    parser.add_argument("--output", required=True, help="输出的非冗余motif库（MEME格式）")
+    parser.add_argument("--cluster-map", required=True, help="输出的簇对照表（TSV）")
+    parser.add_argument("--metric", choices=METRICS, default="pearson", help="列相似度：pearson（默认）或allr")
+    parser.add_argument("--cutoff", type=float, default=None,
+                        help="并入同一簇的相似度阈值（默认pearson 0.75，allr 0.5）")
+    parser.add_argument("--min-overlap", type=int, default=5, help="最少重叠列数（默认5，短motif取其宽度）")
+    parser.add_argument("--threads", type=int, default=4, help="并行线程数（默认4）")
+    parser.add_argument("--matrix", help="同时保存完整相似度矩阵（npz）")
+    args = parser.parse_args()
+
+    cutoff = args.cutoff if args.cutoff is not None else (0.75 if args.metric == "pearson" else 0.5)
+    motifs = read_motif_file(args.motifs)
+    if not motifs:
+        raise ValueError(f"motif库为空：{args.motifs}")
+    print(f"读取 {len(motifs)} 个motif，度量：{args.metric}，阈值：{cutoff}")
+    similarity, offsets, strands, representative = cluster_library(
+        motifs, args.metric, cutoff, args.min_overlap, args.threads)
+
+    reps = [i for i in range(len(motifs)) if representative[i] == i]
+    cluster_of = {rep: n + 1 for n, rep in enumerate(reps)}
+    write_meme_motifs([motifs[i] for i in reps], args.output)
+    with open(args.cluster_map, "w", encoding="utf-8") as f:
+        f.write("cluster\trepresentative_id\trepresentative_name\tmember_id\tmember_name\tsimilarity\toffset\tstrand\n")
+        for rep in reps:
+            for i in np.flatnonzero(representative == rep):
+                f.write(f"{cluster_of[rep]}\t{motifs[rep].id}\t{motifs[rep].name}\t{motifs[i].id}\t{motifs[i].name}\t"
+                        f"{similarity[rep, i]:.4f}\t{offsets[rep, i]}\t{'-' if strands[rep, i] else '+'}\n")
+    if args.matrix:
+        np.savez_compressed(args.matrix, similarity=similarity, offset=offsets, strand=strands,
+                            ids=np.array([m.id for m in motifs]), names=np.array([m.name for m in motifs]))
+    print(f"{len(motifs)} 个motif合并为 {len(reps)} 个簇，非冗余库保存至：{args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from fasta_io import read_fasta
+from liftover import Hit, read_hit_table, read_homer_find
+
+# 工作进程的共享数据（由initializer在进程启动时设置一次）
+_WORKER: Dict[str, object] = {}
+
+
+def load_hits(paths: List[str], fmt: str, offset_origin: str = "center",
+              window_lengths: Optional[Dict[str, int]] = None) -> List[Hit]:
+    """读取命中文件；HOMER格式的Offset相对序列中心时，需要window_lengths（由序列FASTA得到）换算坐标"""
+    hits: List[Hit] = []
+    for path in paths:
+        hits.extend(read_homer_find(path, offset_origin, window_lengths) if fmt == "homer" else read_hit_table(path))
+    return hits
+
+
+def build_presence(groups: List[Tuple[List[Hit], List[str]]]) -> Tuple[List[str], List[str], np.ndarray, np.ndarray, Dict[str, np.ndarray]]:
+    """
+    将各组（前景/背景）的命中整理为序列×motif的存在矩阵：
+        groups: [(命中列表, 该组全部序列ID)]，序列ID列表用于包含没有任何命中的序列
+    序列ID加组号前缀，避免前景和背景中的同名序列混在一起
+    返回(序列名, motif名, 存在矩阵X (n, M) float32, 标签 (n,) float32, 命中数组)
+    """
+    motif_names = sorted({hit.motif for hits, _ in groups for hit in hits})
+    motif_index = {name: i for i, name in enumerate(motif_names)}
+    seq_names: List[str] = []
+    seq_index: Dict[Tuple[int, str], int] = {}
+    labels: List[float] = []
+    for g, (hits, seq_ids) in enumerate(groups):
+        for seq_id in list(seq_ids) + [hit.seq_id for hit in hits]:
+            if (g, seq_id) not in seq_index:
+                seq_index[(g, seq_id)] = len(seq_names)
+                seq_names.append(seq_id)
+                labels.append(1.0 if g == 0 else 0.0)
+
+    rows, cols, starts, strands = [], [], [], []
+    for g, (hits, _) in enumerate(groups):
+        for hit in hits:
+            rows.append(seq_index[(g, hit.seq_id)])
+            cols.append(motif_index[hit.motif])
+            starts.append(hit.start)
+            strands.append(0 if hit.strand == "+" else 1)
+    presence = np.zeros((len(seq_names), len(motif_names)), dtype=np.float32)
+    presence[rows, cols] = 1.0
+    hit_arrays = {
+        "seq": np.array(rows, dtype=np.int64),
+        "motif": np.array(cols, dtype=np.int64),
+        "start": np.array(starts, dtype=np.int64),
+        "strand": np.array(strands, dtype=np.int8),
+    }
+    return seq_names, motif_names, presence, np.array(labels, dtype=np.float32), hit_arrays
+
+
+def _init_worker(presence: np.ndarray, labels: np.ndarray, params: Dict[str, int]) -> None:
+    _WORKER["presence"] = presence
+    _WORKER["labels"] = labels
+    _WORKER["params"] = params
+
+
+def _permutation_chunk(task: Tuple[np.ndarray, np.ndarray, np.ndarray]) -> np.ndarray:
+    """
+    一批motif对的置换检验：Z为(n, p)的共现指示矩阵（两motif同时出现在序列中为1），
+    每块置换标签L为(n, B)，Zᵀ·L一次矩阵乘法得到全部对在B次置换下的前景共现数，
+    统计不小于观测值的次数。置换块按块号设定随机种子，各进程生成的置换完全一致。
+    """
+    a, b, observed = task
+    presence, labels, params = _WORKER["presence"], _WORKER["labels"], _WORKER["params"]
+    z_t = (presence[:, a] * presence[:, b]).T.copy()
+    exceed = np.zeros(len(a), dtype=np.int64)
+    block = params["block"]
+    for start in range(0, params["permutations"], block):
+        size = min(block, params["permutations"] - start)
+        rng = np.random.default_rng(params["seed"] + start)
+        permuted = rng.permuted(np.repeat(labels[:, None], size, axis=1), axis=0)
+        exceed += (z_t @ permuted >= observed[:, None] - 0.5).sum(axis=1)
+    return exceed
+
+
+def permutation_pvalues(presence: np.ndarray, labels: np.ndarray, pair_a: np.ndarray, pair_b: np.ndarray,
+                        observed: np.ndarray, permutations: int, workers: int, seed: int = 1,
+                        chunk: int = 4096, block: int = 256) -> np.ndarray:
+    """前景共现数的单侧置换p值：(1 + 置换中 ≥ 观测值的次数) / (1 + 置换次数)；motif对分块后分给多个进程"""
+    params = {"permutations": permutations, "seed": seed, "block": block}
+    tasks = [(pair_a[i:i + chunk], pair_b[i:i + chunk], observed[i:i + chunk]) for i in range(0, len(pair_a), chunk)]
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=_init_worker,
+                             initargs=(presence, labels, params)) as executor:
+        exceed = np.concatenate(list(executor.map(_permutation_chunk, tasks))) if tasks else np.zeros(0, dtype=np.int64)
+    return (1.0 + exceed) / (1.0 + permutations)
+
+
+def benjamini_hochberg(pvalues: np.ndarray) -> np.ndarray:
+    n = len(pvalues)
+    if not n:
+        return pvalues
+    order = np.argsort(pvalues)
+    ranked = pvalues[order] * n / np.arange(1, n + 1)
+    ranked = np.minimum.accumulate(ranked[::-1])[::-1]
+    qvalues = np.empty(n)
+    qvalues[order] = np.minimum(ranked, 1.0)
+    return qvalues
+
+
+def spacing_histogram(hit_arrays: Dict[str, np.ndarray], keep: np.ndarray, n_motifs: int, max_spacing: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    统计同一序列上两个不同motif命中之间的间距：按(序列, 起点)排序后，按"相隔j个命中"逐轮向量化配对，
+    直到所有配对的间距都超过max_spacing。间距 = 编号较大motif的起点 - 编号较小motif的起点，
+    方向区分同链/反链。只统计keep中的序列（通常为前景）。
+    返回稀疏直方图：(键, 计数)，键 = ((a·M + b)·2 + 方向)·(2S+1) + 间距 + S
+    """
+    mask = keep[hit_arrays["seq"]]
+    seq, motif = hit_arrays["seq"][mask], hit_arrays["motif"][mask]
+    start, strand = hit_arrays["start"][mask], hit_arrays["strand"][mask]
+    order = np.lexsort((start, seq))
+    seq, motif, start, strand = seq[order], motif[order], start[order], strand[order]
+
+    span = 2 * max_spacing + 1
+    keys: List[np.ndarray] = []
+    lag = 1
+    while lag < len(seq):
+        same_seq = seq[lag:] == seq[:-lag]
+        close = same_seq & (start[lag:] - start[:-lag] <= max_spacing)
+        if not close.any():
+            break
+        i = np.flatnonzero(close)
+        j = i + lag
+        ma, mb = motif[i], motif[j]
+        hetero = ma != mb
+        i, j, ma, mb = i[hetero], j[hetero], ma[hetero], mb[hetero]
+        swap = ma > mb
+        low = np.where(swap, mb, ma)
+        high = np.where(swap, ma, mb)
+        distance = np.where(swap, start[i] - start[j], start[j] - start[i])
+        orientation = (strand[i] != strand[j]).astype(np.int64)
+        keys.append(((low * n_motifs + high) * 2 + orientation) * span + distance + max_spacing)
+        lag += 1
+    if not keys:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    return np.unique(np.concatenate(keys), return_counts=True)
+
+
+def spacing_peaks(keys: np.ndarray, counts: np.ndarray, n_motifs: int, max_spacing: int) -> Dict[int, Tuple[int, int, int, int]]:
+    """每个motif对（a·M + b）的最常见间距：返回{对编号: (间距, 方向, 该间距计数, 该对配对总数)}"""
+    span = 2 * max_spacing + 1
+    pair = keys // (2 * span)
+    order = np.lexsort((-counts, pair))
+    pair, keys, counts = pair[order], keys[order], counts[order]
+    unique_pairs, first = np.unique(pair, return_index=True)
+    totals = np.add.reduceat(counts, first) if len(first) else np.zeros(0, dtype=np.int64)
+    peaks = {}
+    for p, idx, total in zip(unique_pairs, first, totals):
+        key = keys[idx]
+        peaks[int(p)] = (int(key % span - max_spacing), int(key // span % 2), int(counts[idx]), int(total))
+    return peaks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="motif两两共现与间距分析：前景/背景标签置换检验（矩阵乘法向量化、多进程）")
+    parser.add_argument("--foreground", nargs="+", required=True, help="前景命中文件（统一命中表或HOMER find输出）")
+    parser.add_argument("--background", nargs="+", required=True, help="背景命中文件")
+    parser.add_argument("--format", choices=["table", "homer"], default="table",
+                        help="命中文件格式：table（seq_id start end motif strand score，默认）或homer（find输出）")
+    parser.add_argument("--offset-origin", choices=["center", "start"], default="center",
+                        help="HOMER find输出中Offset的参照点：center（HOMER默认，需给出--foreground-fasta/--background-fasta以得到序列长度）或start")
+    parser.add_argument("--foreground-fasta", help="前景序列FASTA（使没有命中的序列也计入总数）")
+    parser.add_argument("--background-fasta", help="背景序列FASTA")
+    parser.add_argument("--output", required=True, help="输出TSV")
+    parser.add_argument("--min-count", type=int, default=3, help="参与检验的motif对最少共现序列数（默认3）")
+    parser.add_argument("--permutations", type=int, default=1000, help="置换次数（默认1000）")
+    parser.add_argument("--max-spacing", type=int, default=50, help="间距统计的最大距离（bp，默认50）")
+    parser.add_argument("--workers", type=int, default=0, help="进程数（默认CPU核数）")
+    parser.add_argument("--seed", type=int, default=1, help="随机种子（默认1）")
+    args = parser.parse_args()
+
+    t0 = time.time()
+    fg_records = read_fasta(args.foreground_fasta) if args.foreground_fasta else []
+    bg_records = read_fasta(args.background_fasta) if args.background_fasta else []
+    if args.format == "homer" and args.offset_origin == "center" and not (fg_records and bg_records):
+        parser.error("HOMER格式且--offset-origin center时需要--foreground-fasta和--background-fasta（用于换算中心坐标）")
+    fg_lengths = {seq_id: len(seq) for seq_id, seq in fg_records}
+    bg_lengths = {seq_id: len(seq) for seq_id, seq in bg_records}
+    seq_names, motif_names, presence, labels, hit_arrays = build_presence([
+        (load_hits(args.foreground, args.format, args.offset_origin, fg_lengths), [seq_id for seq_id, _ in fg_records]),
+        (load_hits(args.background, args.format, args.offset_origin, bg_lengths), [seq_id for seq_id, _ in bg_records]),
+    ])
+    n_fg, n_bg = int(labels.sum()), int(len(labels) - labels.sum())
+    n_motifs = len(motif_names)
+    if not n_fg or not n_bg:
+        raise ValueError("前景和背景都需要至少一条序列")
+    print(f"前景 {n_fg} 条序列，背景 {n_bg} 条序列，{n_motifs} 个motif，{len(hit_arrays['seq'])} 个命中")
+
+    cooccur = presence.T @ presence
+    pair_a, pair_b = np.nonzero(np.triu(cooccur >= args.min_count, 1))
+    fg_cooccur = presence.T @ (presence * labels[:, None])
+    observed = fg_cooccur[pair_a, pair_b]
+    total = cooccur[pair_a, pair_b]
+    print(f"检验 {len(pair_a)} 个motif对，置换 {args.permutations} 次")
+    pvalues = permutation_pvalues(presence, labels, pair_a, pair_b, observed, args.permutations, args.workers, args.seed)
+    qvalues = benjamini_hochberg(pvalues)
+
+    keys, counts = spacing_histogram(hit_arrays, labels > 0, n_motifs, args.max_spacing)
+    peaks = spacing_peaks(keys, counts, n_motifs, args.max_spacing)
+
+    order = np.lexsort((-observed, pvalues))
+    with open(args.output, "w", encoding="utf-8") as f:
+        f.write("motif_a\tmotif_b\tfg_sequences\tbg_sequences\tfg_fraction\tbg_fraction\tlog2_ratio\t"
+                "perm_p\tq_value\tpeak_spacing\tpeak_orientation\tpeak_count\tspacing_pairs\n")
+        for k in order:
+            a, b = int(pair_a[k]), int(pair_b[k])
+            fg = int(observed[k])
+            bg = int(total[k] - observed[k])
+            fg_frac, bg_frac = fg / n_fg, bg / n_bg
+            ratio = np.log2((fg_frac + 1.0 / n_fg) / (bg_frac + 1.0 / n_bg))
+            spacing, orientation, peak_count, pairs = peaks.get(a * n_motifs + b, (0, 0, 0, 0))
+            peak = f"{spacing}\t{'opposite' if orientation else 'same'}" if pairs else "\t"
+            f.write(f"{motif_names[a]}\t{motif_names[b]}\t{fg}\t{bg}\t{fg_frac:.4f}\t{bg_frac:.4f}\t{ratio:.3f}\t"
+                    f"{pvalues[k]:.4g}\t{qvalues[k]:.4g}\t{peak}\t{peak_count}\t{pairs}\n")
+    print(f"分析完成（{time.time() - t0:.1f} 秒），结果保存至：{args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+import argparse
+import hashlib
+import json
+import os
+import tarfile
+import time
+from typing import Iterator, List, Tuple
+
+import numpy as np
+
+from homer_results import ARCHIVE_SUFFIXES, DENOVO_MOTIF_PATTERN, split_run_name
+from motif_cluster import METRICS, ColumnFeatures, compare_motifs
+from motifs import Motif, parse_homer_motifs, read_motif_file
+
+ALL_MOTIFS_FILE = "homerMotifs.all.motifs"
+
+
+def is_query_member(name: str, members: str) -> bool:
+    """是否为需要注释的de novo motif文件：homerMotifs.all.motifs和/或homerResults/motifN.motif"""
+    if members in ("all", "both") and os.path.basename(name) == ALL_MOTIFS_FILE:
+        return True
+    return members in ("results", "both") and DENOVO_MOTIF_PATTERN.search(name) is not None
+
+
+def run_of_query(name: str) -> str:
+    """motif文件所属的分析目录名：homerMotifs.all.motifs的上一级，homerResults/motifN.motif的上两级"""
+    parts = [p for p in name.split("/") if p and p != "."]
+    depth = 2 if os.path.basename(name) == ALL_MOTIFS_FILE else 3
+    return parts[-depth] if len(parts) >= depth else ""
+
+
+def iter_query_files(paths: List[str], members: str) -> Iterator[Tuple[str, str, List[Motif]]]:
+    """
+    遍历待注释的motif：单个motif文件直接读取；目录递归查找；压缩包以流模式读取成员，不解压到磁盘
+    逐个产出(分析目录名, 文件名, motif列表)
+    """
+    for path in paths:
+        if os.path.isfile(path) and path.lower().endswith(ARCHIVE_SUFFIXES):
+            try:
+                with tarfile.open(path, "r|*") as tf:
+                    for member in tf:
+                        if member.isfile() and is_query_member(member.name, members):
+                            text = tf.extractfile(member).read().decode("utf-8", errors="replace")
+                            yield run_of_query(member.name), member.name, parse_homer_motifs(text.splitlines())
+            except (tarfile.TarError, OSError) as e:
+                print(f"跳过压缩包 {path} → 错误：{str(e)}")
+        elif os.path.isfile(path):
+            name = os.path.abspath(path).replace(os.sep, "/")
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                yield run_of_query(name), path, parse_homer_motifs(f)
+        elif os.path.isdir(path):
+            parent = os.path.dirname(os.path.abspath(path))
+            for dirpath, dirnames, filenames in os.walk(path):
+                dirnames.sort()
+                for filename in sorted(filenames):
+                    full_path = os.path.join(dirpath, filename)
+                    if filename.lower().endswith(ARCHIVE_SUFFIXES):
+                        yield from iter_query_files([full_path], members)
+                        continue
+                    name = os.path.relpath(full_path, parent).replace(os.sep, "/")
+                    if is_query_member(name, members):
+                        with open(full_path, "r", encoding="utf-8", errors="replace") as f:
+                            yield run_of_query(name), full_path, parse_homer_motifs(f)
+        else:
+            print(f"警告：路径不存在，跳过：{path}")
+
+
+def default_cache_dir() -> str:
+    """库特征缓存的默认目录：用户缓存目录（$XDG_CACHE_HOME或~/.cache）下的motif_match，不在库文件旁留下文件"""
+    return os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "motif_match")
+
+
+def load_library(path: str, metric: str, cache_dir: str = "") -> Tuple[List[str], List[str], ColumnFeatures]:
+    """
+    读取JASPAR库的列特征，带缓存：缓存文件记录库文件的大小、修改时间和度量，
+    三者一致时直接加载缓存（不再解析MEME文本），否则重建并覆盖缓存
+    缓存文件名含库文件绝对路径的摘要，不同目录下的同名库互不覆盖
+    """
+    stat = os.stat(path)
+    fingerprint = json.dumps({"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "metric": metric})
+    cache_dir = cache_dir or default_cache_dir()
+    path_digest = hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest()[:12]
+    cache_path = os.path.join(cache_dir, f"{os.path.basename(path)}.{path_digest}.{metric}.features.npz")
+    if os.path.exists(cache_path):
+        try:
+            with np.load(cache_path, allow_pickle=False) as data:
+                cached = str(data["fingerprint"]) == fingerprint
+                ids, names = data["ids"].tolist(), data["names"].tolist()
+            if cached:
+                return ids, names, ColumnFeatures.load(cache_path)
+        except (OSError, KeyError, ValueError) as e:
+            print(f"警告：缓存不可用，重新构建：{cache_path}（{str(e)}）")
+
+    motifs = read_motif_file(path)
+    if not motifs:
+        raise ValueError(f"motif库为空：{path}")
+    features = ColumnFeatures(motifs, metric)
+    ids, names = [m.id for m in motifs], [m.name for m in motifs]
+    os.makedirs(cache_dir, exist_ok=True)
+    features.save(cache_path, fingerprint=np.array(fingerprint), ids=np.array(ids), names=np.array(names))
+    print(f"已缓存motif库特征：{cache_path}")
+    return ids, names, features
+
+
+def top_matches(similarity: np.ndarray, top: int, min_similarity: float) -> List[List[int]]:
+    """每个查询motif按相似度从高到低取前top个且不低于min_similarity的库motif下标"""
+    top = min(top, similarity.shape[1])
+    candidates = np.argpartition(-similarity, top - 1, axis=1)[:, :top]
+    order = np.take_along_axis(-similarity, candidates, axis=1).argsort(axis=1, kind="stable")
+    ranked = np.take_along_axis(candidates, order, axis=1)
+    return [[int(j) for j in row if similarity[i, j] >= min_similarity] for i, row in enumerate(ranked)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HOMER de novo motif与JASPAR库比对注释（替代compareMotifs.pl），输出TSV")
+    parser.add_argument("paths", nargs="+", help="HOMER结果目录、结果压缩包或.motif文件")
+    parser.add_argument("--library", required=True, help="JASPAR motif库（MEME/JASPAR格式）")
+    parser.add_argument("--output", required=True, help="输出TSV")
+    parser.add_argument("--members", choices=["all", "results", "both"], default="both",
+                        help="注释哪些文件：all=homerMotifs.all.motifs，results=homerResults/motifN.motif，both（默认）")
+    parser.add_argument("--metric", choices=METRICS, default="pearson", help="列相似度（默认pearson）")
+    parser.add_argument("--top", type=int, default=3, help="每个motif输出的最佳匹配数（默认3）")
+    parser.add_argument("--min-similarity", type=float, default=0.5, help="最低相似度（默认0.5）")
+    parser.add_argument("--min-overlap", type=int, default=5, help="最少重叠列数（默认5）")
+    parser.add_argument("--threads", type=int, default=4, help="并行线程数（默认4）")
+    parser.add_argument("--cache-dir", default="", help="库特征缓存目录（默认~/.cache/motif_match）")
+    args = parser.parse_args()
+
+    t0 = time.time()
+    lib_ids, lib_names, library = load_library(args.library, args.metric, args.cache_dir)
+
+    # 所有查询motif合并为一批，与库只做一次比较
+    sources: List[Tuple[str, str]] = []
+    queries: List[Motif] = []
+    for run, name, motifs in iter_query_files(args.paths, args.members):
+        for motif in motifs:
+            if motif.width:
+                sources.append((run, name))
+                queries.append(motif)
+    if not queries:
+        print("未找到需要注释的motif")
+        return
+    print(f"读取 {len(queries)} 个查询motif，库中 {len(lib_ids)} 个motif")
+
+    similarity, offsets, strands = compare_motifs(ColumnFeatures(queries, args.metric), library,
+                                                  args.min_overlap, args.threads)
+    matches = top_matches(similarity, args.top, args.min_similarity)
+    with open(args.output, "w", encoding="utf-8") as f:
+        f.write("run\tspecies\tregion\tfile\tconsensus\tname\tlog_p\trank\tmatch_id\tmatch_name\tsimilarity\toffset\tstrand\n")
+        for i, ((run, name), motif) in enumerate(zip(sources, queries)):
+            species, region = split_run_name(run)
+            prefix = f"{run}\t{species}\t{region}\t{name}\t{motif.id}\t{motif.name}\t{motif.header.get('log_p', '')}"
+            if not matches[i]:
+                f.write(f"{prefix}\t0\t\t\t\t\t\n")
+            for rank, j in enumerate(matches[i], start=1):
+                f.write(f"{prefix}\t{rank}\t{lib_ids[j]}\t{lib_names[j]}\t{similarity[i, j]:.4f}\t"
+                        f"{offsets[i, j]}\t{'-' if strands[i, j] else '+'}\n")
+    print(f"注释完成（{time.time() - t0:.2f} 秒），结果保存至：{args.output}")
+
+
+if __name__ == "__main__":
+    main()
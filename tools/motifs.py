@@ -0,0 +1,270 @@
+import math
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# 含N（或其他简并碱基）的窗口不计为命中：N列取极小值，窗口得分必然低于任何阈值
+N_SCORE = -1e6
+
+
+class Motif:
+    """
+    单个motif：名称、描述和概率矩阵（每行一个位置，列顺序为A C G T）
+    header保存HOMER motif头部中的附加字段（共识序列、阈值、log p值、T/B统计等）
+    """
+    __slots__ = ("id", "name", "matrix", "header")
+
+    def __init__(self, motif_id: str, name: str, matrix: List[List[float]], header: Optional[Dict[str, str]] = None):
+        self.id = motif_id
+        self.name = name
+        self.matrix = matrix
+        self.header = header or {}
+
+    @property
+    def width(self) -> int:
+        return len(self.matrix)
+
+    def __repr__(self) -> str:
+        return f"Motif({self.id!r}, {self.name!r}, w={self.width})"
+
+
+def _parse_count_field(field: str):
+    """
+    解析HOMER统计字段，如"T:13.0(100.00%)" → (13.0, 100.0)
+    """
+    try:
+        count_str, pct_str = field.split(":", 1)[1].split("(", 1)
+        return float(count_str), float(pct_str.rstrip(")%"))
+    except (IndexError, ValueError):
+        return math.nan, math.nan
+
+
+def parse_homer_header(header_line: str) -> Dict[str, object]:
+    """
+    解析HOMER motif头部行（以">"开头，制表符分隔）：
+    >共识序列  名称  log-odds阈值  log p值(自然对数)  0  T:..(..%),B:..(..%),P:1e-13  [附加统计]
+    返回字段字典，缺失的数值字段为nan
+    """
+    parts = header_line.rstrip("\n").lstrip(">").split("\t")
+    if len(parts) < 2:
+        raise ValueError(f"HOMER motif头部格式错误：{header_line.strip()}")
+
+    info: Dict[str, object] = {
+        "consensus": parts[0],
+        "name": parts[1],
+        "threshold": math.nan,
+        "log_p": math.nan,
+        "n_target": math.nan,
+        "pct_target": math.nan,
+        "n_background": math.nan,
+        "pct_background": math.nan,
+    }
+    try:
+        info["threshold"] = float(parts[2])
+        info["log_p"] = float(parts[3])
+    except (IndexError, ValueError):
+        pass
+    if len(parts) > 5:
+        for field in parts[5].split(","):
+            if field.startswith("T:"):
+                info["n_target"], info["pct_target"] = _parse_count_field(field)
+            elif field.startswith("B:"):
+                info["n_background"], info["pct_background"] = _parse_count_field(field)
+    return info
+
+
+def parse_homer_motifs(lines: Iterable[str]) -> List[Motif]:
+    """
+    解析HOMER格式的motif文件内容（*.motif、homerMotifs.all.motifs、knownN.motif等）
+    参数：
+        lines: 文件的文本行（可来自磁盘文件，也可来自压缩包中的成员）
+    返回：Motif列表，id为共识序列，name为第二列名称
+    """
+    motifs: List[Motif] = []
+    current: Optional[Motif] = None
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith(">"):
+            info = parse_homer_header(line)
+            current = Motif(str(info["consensus"]), str(info["name"]), [], {k: str(v) for k, v in info.items()})
+            motifs.append(current)
+        elif current is not None:
+            try:
+                row = [float(x) for x in line.split()]
+            except ValueError:
+                print(f"警告：无法解析motif {current.id} 的矩阵行：{line}")
+                continue
+            if len(row) != 4:
+                print(f"警告：motif {current.id} 的矩阵行不是4列：{line}")
+                continue
+            current.matrix.append(row)
+    return motifs
+
+
+def parse_meme_motifs(lines: Iterable[str]) -> List[Motif]:
+    """
+    解析MEME格式（JASPAR导出的*_meme.txt）：
+    MOTIF MA0004.1 Arnt → id为MA0004.1，name为Arnt；矩阵取letter-probability matrix之后的数值行
+    """
+    motifs: List[Motif] = []
+    current: Optional[Motif] = None
+    reading_matrix = False
+    for line in lines:
+        line = line.strip()
+        if line.startswith("MOTIF"):
+            parts = line.split()
+            motif_id = parts[1] if len(parts) > 1 else f"motif{len(motifs) + 1}"
+            current = Motif(motif_id, parts[2] if len(parts) > 2 else motif_id, [])
+            motifs.append(current)
+            reading_matrix = False
+        elif current is not None and "letter-probability matrix" in line:
+            reading_matrix = True
+            fields = line.split("=")
+            for key, value in zip(fields[:-1], fields[1:]):
+                if key.split()[-1] == "nsites":
+                    current.header["nsites"] = value.split()[0]
+        elif current is not None and line.startswith("URL"):
+            current.header["url"] = line[3:].strip()
+            reading_matrix = False
+        elif reading_matrix and line and not line.startswith("URL"):
+            try:
+                row = [float(x) for x in line.split()]
+            except ValueError:
+                reading_matrix = False
+                continue
+            if len(row) == 4:
+                current.matrix.append(row)
+        elif reading_matrix and current is not None and current.matrix:
+            reading_matrix = False
+    return [m for m in motifs if m.matrix]
+
+
+def parse_jaspar_motifs(lines: Iterable[str]) -> List[Motif]:
+    """
+    解析JASPAR计数矩阵格式（*_pfms_jaspar.txt）：
+    >MA0004.1\tArnt，随后A/C/G/T四行"A  [ 4 19 ... ]"，计数按列归一化为概率
+    """
+    motifs: List[Motif] = []
+    header = None
+    rows: Dict[str, List[float]] = {}
+
+    def flush():
+        if header is not None and len(rows) == 4:
+            counts = np.array([rows[b] for b in "ACGT"], dtype=np.float64).T
+            totals = counts.sum(axis=1, keepdims=True)
+            probs = counts / np.where(totals > 0, totals, 1)
+            motifs.append(Motif(header[0], header[1] if len(header) > 1 else header[0], probs.tolist()))
+
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith(">"):
+            flush()
+            header = line[1:].split(None, 1)
+            rows = {}
+        elif header is not None and line[0] in "ACGT":
+            values = line[1:].replace("[", " ").replace("]", " ").split()
+            rows[line[0]] = [float(v) for v in values]
+    flush()
+    return motifs
+
+
+def read_motif_file(path: str) -> List[Motif]:
+    """
+    按内容自动识别并读取motif库：MEME（含"MEME version"或MOTIF行）、JASPAR计数矩阵、HOMER motif
+    """
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        lines = f.readlines()
+    head = "".join(lines[:50])
+    if "MEME version" in head or any(line.startswith("MOTIF") for line in lines[:50]):
+        return parse_meme_motifs(lines)
+    if any(line.lstrip().startswith(("A  [", "A [", "A\t[")) for line in lines[:50]):
+        return parse_jaspar_motifs(lines)
+    return parse_homer_motifs(lines)
+
+
+def write_meme_motifs(motifs: List[Motif], path: str) -> None:
+    """按JASPAR导出的MEME格式写出motif（保留nsites与URL行）"""
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("MEME version 4\n\nALPHABET= ACGT\n\nstrands: + -\n\n"
+                "Background letter frequencies\nA 0.25 C 0.25 G 0.25 T 0.25\n\n")
+        for motif in motifs:
+            f.write(f"MOTIF {motif.id} {motif.name}\n")
+            f.write(f"letter-probability matrix: alength= 4 w= {motif.width} "
+                    f"nsites= {motif.header.get('nsites', 20)} E= 0\n")
+            for row in motif.matrix:
+                f.write("".join(f" {v:.6f} " for v in row).rstrip() + "\n")
+            if motif.header.get("url"):
+                f.write(f"URL {motif.header['url']}\n")
+            f.write("\n")
+
+
+def information_content(motif: Motif) -> float:
+    """motif总信息量（bits），背景为均匀分布"""
+    probs = np.asarray(motif.matrix, dtype=np.float64)
+    probs = probs / np.maximum(probs.sum(axis=1, keepdims=True), 1e-12)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        entropy = -np.where(probs > 0, probs * np.log2(probs), 0.0).sum(axis=1)
+    return float((2.0 - entropy).sum())
+
+
+class MotifBank:
+    """
+    一组motif的对数优势（log-odds）PWM，按最大宽度补齐后存为(M, W, 5)数组，便于对全部motif批量打分：
+        第三维0-3为A/C/G/T，4为N（取N_SCORE）；超出motif宽度的补齐列全为0
+    rc为反向互补矩阵，widths为各motif宽度，max_scores/min_scores为各motif可能的最高/最低得分
+    """
+
+    def __init__(self, motifs: List[Motif], background: float = 0.25, pseudocount: float = 0.01):
+        if not motifs:
+            raise ValueError("motif库为空")
+        self.ids = [m.id for m in motifs]
+        self.names = [m.name for m in motifs]
+        self.widths = np.array([m.width for m in motifs], dtype=np.int64)
+        self.max_width = int(self.widths.max())
+        n_motifs = len(motifs)
+        self.pwm = np.zeros((n_motifs, self.max_width, 5), dtype=np.float32)
+        self.rc = np.zeros((n_motifs, self.max_width, 5), dtype=np.float32)
+        for i, motif in enumerate(motifs):
+            probs = np.asarray(motif.matrix, dtype=np.float64)
+            probs = (probs + pseudocount) / (probs.sum(axis=1, keepdims=True) + 4 * pseudocount)
+            log_odds = np.log2(probs / background).astype(np.float32)
+            w = motif.width
+            self.pwm[i, :w, :4] = log_odds
+            self.pwm[i, :w, 4] = N_SCORE
+            self.rc[i, :w, :4] = log_odds[::-1, ::-1]
+            self.rc[i, :w, 4] = N_SCORE
+        real = self.pwm[:, :, :4]
+        self.max_scores = real.max(axis=2).sum(axis=1).astype(np.float64)
+        self.min_scores = real.min(axis=2).sum(axis=1).astype(np.float64)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def thresholds(self, relative: float) -> np.ndarray:
+        """相对得分阈值（JASPAR习惯）：min + relative × (max - min)"""
+        return self.min_scores + relative * (self.max_scores - self.min_scores)
+
+    def score_windows(self, codes: np.ndarray, dtype=np.float32) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        对序列的每个起点计算全部motif在正、负链上的得分，返回两个(M, n)数组（n = 序列长度）
+        每个起点的窗口展开为W×5的one-hot向量，全部motif的PWM展平为(M, W×5)，一次矩阵乘法得到全部得分
+        motif超出序列末端的窗口得分为-inf
+        dtype=np.float64时各列得分的累加是精确的，结果与累加顺序无关（用于与其他打分路径逐一核对）
+        """
+        n = len(codes)
+        padded = np.concatenate([codes, np.full(self.max_width, 4, dtype=np.uint8)])
+        windows = sliding_window_view(padded, self.max_width)[:n]
+        onehot = np.zeros((n, self.max_width, 5), dtype=dtype)
+        np.put_along_axis(onehot, windows[:, :, None].astype(np.intp), 1.0, axis=2)
+        onehot = onehot.reshape(n, -1).T
+        forward = self.pwm.reshape(len(self), -1).astype(dtype, copy=False) @ onehot
+        reverse = self.rc.reshape(len(self), -1).astype(dtype, copy=False) @ onehot
+        invalid = np.arange(n)[None, :] > (n - self.widths)[:, None]
+        forward[invalid] = -np.inf
+        reverse[invalid] = -np.inf
+        return forward, reverse
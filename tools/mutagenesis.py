@@ -0,0 +1,160 @@
+import argparse
+import os
+import re
+import time
+from collections import Counter
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from fasta_io import encode_dna, read_fasta
+from motifs import MotifBank, read_motif_file
+from scan_cache import deduplicate
+
+BASES = "ACGT"
+
+
+def covering_best(bank: MotifBank, forward: np.ndarray, reverse: np.ndarray, codes: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    增量打分（delta scoring）：位置p突变为碱基b只影响起点落在[p-W+1, p]的窗口，
+    对motif内偏移k = p - s，新得分 = 原窗口得分 + pwm[m, k, b] - pwm[m, k, ref[p]]。
+    按偏移k循环（共W次），每次对全部位置×4种碱基×全部motif一次性向量化计算，
+    取覆盖p的窗口（两条链）中的最高分。
+    返回：
+        ref_best: (n, M) 参考序列中覆盖各位置的窗口最高分
+        alt_best: (n, 4, M) 突变为A/C/G/T后覆盖该位置的窗口最高分
+        alt_strand: (n, 4, M) 最高分所在链（0正链，1负链）
+    """
+    n = len(codes)
+    n_motifs = len(bank)
+    ref = np.minimum(codes, 4).astype(np.int64)
+    ref_best = np.full((n, n_motifs), -np.inf, dtype=np.float32)
+    alt_best = np.full((n, 4, n_motifs), -np.inf, dtype=np.float32)
+    alt_strand = np.zeros((n, 4, n_motifs), dtype=np.int8)
+
+    for k in range(min(bank.max_width, n)):
+        p = slice(k, n)  # 受影响的位置p，窗口起点s = p - k
+        s = slice(0, n - k)
+        covers = k < bank.widths  # 偏移k超出motif宽度的窗口不覆盖该位置
+        for strand, (scores, matrix) in enumerate(((forward, bank.pwm), (reverse, bank.rc))):
+            window = np.where(covers[None, :], scores[:, s].T, -np.inf)  # (n - k, M)
+            column = matrix[:, k, :4].T  # (4, M)
+            ref_column = matrix[:, k, ref[p]].T  # (n - k, M)
+            mutated = window[:, None, :] + (column[None, :, :] - ref_column[:, None, :])
+            np.maximum(ref_best[p], window, out=ref_best[p])
+            better = mutated > alt_best[p]
+            alt_strand[p][better] = strand
+            alt_best[p][better] = mutated[better]
+    return ref_best, alt_best, alt_strand
+
+
+def saturation_mutagenesis(bank: MotifBank, seq: str) -> Dict[str, np.ndarray]:
+    """
+    对单条序列做饱和突变扫描，返回效应张量等结果：
+        delta: (n, 4, M) 位置×等位碱基×motif的得分变化（突变后 - 突变前的覆盖窗口最高分），参考碱基处为0
+        含N的位置不做突变，delta为nan
+    """
+    codes = encode_dna(seq)
+    forward, reverse = bank.score_windows(codes)
+    ref_best, alt_best, alt_strand = covering_best(bank, forward, reverse, codes)
+    with np.errstate(invalid="ignore"):
+        delta = alt_best - ref_best[:, None, :]
+    delta[~np.isfinite(delta)] = 0.0
+    ambiguous = codes > 3
+    delta[ambiguous] = np.nan
+    rows = np.flatnonzero(~ambiguous)
+    delta[rows, codes[rows].astype(np.int64), :] = 0.0
+    return {
+        "delta": delta.astype(np.float32),
+        "ref_best": ref_best,
+        "alt_best": alt_best,
+        "alt_strand": alt_strand,
+        "codes": codes,
+    }
+
+
+def call_effects(bank: MotifBank, result: Dict[str, np.ndarray], thresholds: np.ndarray, min_delta: float) -> List[Tuple]:
+    """
+    从效应张量中挑出跨越阈值的突变：
+        gain：突变前覆盖窗口最高分低于阈值，突变后达到阈值
+        loss：突变前达到阈值，突变后低于阈值
+    并要求|delta| ≥ min_delta。返回(位置, 参考碱基, 突变碱基, motif下标, 突变前得分, 突变后得分, delta, 效应, 链)列表
+    """
+    ref_best, alt_best, delta = result["ref_best"], result["alt_best"], result["delta"]
+    ref_hit = ref_best >= thresholds[None, :]
+    alt_hit = alt_best >= thresholds[None, None, :]
+    with np.errstate(invalid="ignore"):
+        large = np.abs(delta) >= min_delta
+    gain = ~ref_hit[:, None, :] & alt_hit & large
+    loss = ref_hit[:, None, :] & ~alt_hit & large
+    effects = []
+    codes = result["codes"]
+    for label, mask in (("gain", gain), ("loss", loss)):
+        for pos, allele, motif in zip(*np.nonzero(mask)):
+            effects.append((int(pos), BASES[codes[pos]], BASES[allele], int(motif),
+                            float(ref_best[pos, motif]), float(alt_best[pos, allele, motif]),
+                            float(delta[pos, allele, motif]), label,
+                            "-" if result["alt_strand"][pos, allele, motif] else "+"))
+    effects.sort(key=lambda e: (e[0], e[2], -abs(e[6])))
+    return effects
+
+
+def safe_name(seq_id: str) -> str:
+    return re.sub(r"[^\w.-]", "_", seq_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="启动子/调控元件的计算机饱和突变：逐位点×3种替换碱基，对全部JASPAR motif增量打分")
+    parser.add_argument("--fasta", required=True, help="输入FASTA文件（如EN2_Core_p.fasta，可含多条序列）")
+    parser.add_argument("--motifs", required=True, help="motif库（JASPAR MEME/JASPAR计数矩阵/HOMER motif格式，自动识别）")
+    parser.add_argument("--output", required=True, help="输出目录：每条序列一个<序列ID>.effects.npz，以及汇总的mutations.tsv")
+    parser.add_argument("--threshold", type=float, default=0.8, help="相对得分阈值（默认0.8，即min + 0.8×(max - min)）")
+    parser.add_argument("--min-delta", type=float, default=1.0, help="gain/loss表中要求的最小得分变化（log2，默认1.0）")
+    parser.add_argument("--pseudocount", type=float, default=0.01, help="PWM伪计数（默认0.01）")
+    args = parser.parse_args()
+
+    motifs = read_motif_file(args.motifs)
+    bank = MotifBank(motifs, pseudocount=args.pseudocount)
+    thresholds = bank.thresholds(args.threshold)
+    records = read_fasta(args.fasta)
+    if not records:
+        raise ValueError(f"FASTA文件为空：{args.fasta}")
+    unique, owners = deduplicate(records)
+    print(f"读取 {len(bank)} 个motif（最大宽度 {bank.max_width}），{len(records)} 条序列（{len(unique)} 条不同）")
+    # 相同序列只做一次突变扫描：结果保留到该序列最后一次出现为止
+    remaining = Counter(owners)
+    memo: Dict[str, Dict[str, np.ndarray]] = {}
+    os.makedirs(args.output, exist_ok=True)
+
+    table_path = os.path.join(args.output, "mutations.tsv")
+    with open(table_path, "w", encoding="utf-8") as table:
+        table.write("seq_id\tposition\tref\talt\tmotif_id\tmotif_name\tref_score\talt_score\tdelta\teffect\tstrand\n")
+        for (seq_id, seq), digest in zip(records, owners):
+            t0 = time.time()
+            result = memo.pop(digest, None)
+            if result is None:
+                result = saturation_mutagenesis(bank, seq)
+            remaining[digest] -= 1
+            if remaining[digest]:
+                memo[digest] = result
+            np.savez_compressed(
+                os.path.join(args.output, f"{safe_name(seq_id)}.effects.npz"),
+                delta=result["delta"],
+                ref_best=result["ref_best"],
+                sequence=np.array(seq),
+                motif_ids=np.array(bank.ids),
+                motif_names=np.array(bank.names),
+                thresholds=thresholds,
+            )
+            effects = call_effects(bank, result, thresholds, args.min_delta)
+            for pos, ref, alt, motif, ref_score, alt_score, delta, label, strand in effects:
+                table.write(f"{seq_id}\t{pos + 1}\t{ref}\t{alt}\t{bank.ids[motif]}\t{bank.names[motif]}\t"
+                            f"{ref_score:.3f}\t{alt_score:.3f}\t{delta:.3f}\t{label}\t{strand}\n")
+            print(f"{seq_id}：{len(seq)} bp × 3 × {len(bank)} 个motif，"
+                  f"gain {sum(e[7] == 'gain' for e in effects)}，loss {sum(e[7] == 'loss' for e in effects)}，"
+                  f"用时 {time.time() - t0:.2f} 秒")
+    print(f"突变效应表保存至：{table_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+import argparse
+import hashlib
+import io
+import json
+import os
+import struct
+import sys
+import tarfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# 打包格式说明：
+#   输出仍是标准的.tar.gz（多个gzip成员首尾相接），tar -zxvf可直接解压；
+#   tar流按约BLOCK_SIZE切分成独立压缩的块，各块在线程池中并行压缩（zlib压缩时释放GIL）；
+#   最后一块之前写入tar成员<目录名>/.pack_index.json，记录每个块的压缩偏移和每个文件所在块；
+#   文件末尾追加一个空的gzip成员，其FEXTRA字段（子字段ID "PI"）保存索引块的偏移，
+#   读取单个文件时只需解压索引块和该文件所在的块。
+BLOCK_SIZE = 4 * 1024 * 1024
+INDEX_NAME = ".pack_index.json"
+MANIFEST_NAME = ".pack_manifest.json"
+TRAILER_ID = b"PI"
+TRAILER_SIZE = 38
+
+
+def _trailer(index_offset: int, index_length: int) -> bytes:
+    """构造末尾的空gzip成员：FEXTRA中保存索引块的(偏移, 压缩长度)"""
+    extra = TRAILER_ID + struct.pack("<H", 12) + struct.pack("<QI", index_offset, index_length)
+    header = b"\x1f\x8b\x08\x04" + b"\x00\x00\x00\x00" + b"\x00\xff" + struct.pack("<H", len(extra)) + extra
+    # 空的deflate数据块 + CRC32(0) + ISIZE(0)
+    return header + b"\x03\x00" + b"\x00" * 8
+
+
+def _read_trailer(f) -> Tuple[int, int]:
+    f.seek(-TRAILER_SIZE, os.SEEK_END)
+    data = f.read(TRAILER_SIZE)
+    if data[:4] != b"\x1f\x8b\x08\x04" or data[12:14] != TRAILER_ID:
+        raise ValueError("不是pack_results生成的压缩包（缺少内嵌索引）")
+    return struct.unpack("<QI", data[16:28])
+
+
+def _gzip_block(data: bytes, level: int) -> bytes:
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    return compressor.compress(data) + compressor.flush()
+
+
+def _gunzip(data: bytes) -> bytes:
+    """解压一个或多个首尾相接的gzip成员"""
+    out = []
+    while data:
+        decompressor = zlib.decompressobj(31)
+        out.append(decompressor.decompress(data))
+        data = decompressor.unused_data
+    return b"".join(out)
+
+
+def directory_manifest(path: str, checksum: bool = False) -> str:
+    """
+    目录内容清单的摘要：每个文件的相对路径、大小、修改时间（checksum=True时改用文件内容哈希）
+    清单摘要不变的目录在重复打包时直接跳过；顶层的内嵌索引（解压旧压缩包时带出的INDEX_NAME）不计入
+    """
+    digest = hashlib.sha1()
+    for dirpath, dirnames, filenames in os.walk(path):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if filename == INDEX_NAME and os.path.samefile(dirpath, path):
+                continue
+            full_path = os.path.join(dirpath, filename)
+            rel_path = os.path.relpath(full_path, path)
+            stat = os.stat(full_path)
+            digest.update(f"{rel_path}\0{stat.st_size}\0".encode("utf-8", "surrogateescape"))
+            if checksum:
+                with open(full_path, "rb") as f:
+                    for chunk in iter(lambda: f.read(1 << 20), b""):
+                        digest.update(chunk)
+            else:
+                digest.update(str(stat.st_mtime_ns).encode())
+    return digest.hexdigest()
+
+
+def _tar_entries(path: str) -> Iterator[Tuple[tarfile.TarInfo, Optional[str]]]:
+    """
+    按固定顺序遍历目录，生成(TarInfo, 文件路径)；目录项的文件路径为None
+    顶层的INDEX_NAME是tar -xzf解压旧压缩包时带出的内嵌索引，跳过（新索引在打包末尾重新生成）
+    """
+    arc_root = os.path.basename(os.path.normpath(path))
+    for dirpath, dirnames, filenames in os.walk(path):
+        dirnames.sort()
+        rel_dir = os.path.relpath(dirpath, path)
+        arc_dir = arc_root if rel_dir == "." else f"{arc_root}/{rel_dir.replace(os.sep, '/')}"
+        info = tarfile.TarInfo(arc_dir)
+        stat = os.stat(dirpath)
+        info.type, info.mode, info.mtime = tarfile.DIRTYPE, stat.st_mode & 0o7777, int(stat.st_mtime)
+        yield info, None
+        for filename in sorted(filenames):
+            full_path = os.path.join(dirpath, filename)
+            if not os.path.isfile(full_path) or (rel_dir == "." and filename == INDEX_NAME):
+                continue
+            stat = os.stat(full_path)
+            info = tarfile.TarInfo(f"{arc_dir}/{filename}")
+            info.size, info.mode, info.mtime = stat.st_size, stat.st_mode & 0o7777, int(stat.st_mtime)
+            yield info, full_path
+
+
+def _tar_header(info: tarfile.TarInfo) -> bytes:
+    return info.tobuf(tarfile.GNU_FORMAT, "utf-8", "surrogateescape")
+
+
+def _padding(size: int) -> bytes:
+    return b"\0" * (-size % tarfile.BLOCKSIZE)
+
+
+def _raw_blocks(path: str, files: Dict[str, List[int]], block_size: int) -> Iterator[bytes]:
+    """
+    将目录序列化为tar流并切块；同时在files中记录 文件名 → [块序号, 块内数据偏移, 大小]
+    """
+    buffer = bytearray()
+    block_no = 0
+    for info, full_path in _tar_entries(path):
+        buffer += _tar_header(info)
+        if full_path is None:
+            continue
+        files[info.name] = [block_no, len(buffer), info.size]
+        with open(full_path, "rb") as f:
+            while True:
+                chunk = f.read(block_size)
+                if not chunk:
+                    break
+                buffer += chunk
+                while len(buffer) >= block_size:
+                    yield bytes(buffer[:block_size])
+                    del buffer[:block_size]
+                    block_no += 1
+        buffer += _padding(info.size)
+    if buffer:
+        yield bytes(buffer)
+
+
+def pack_directory(path: str, archive_path: str, executor: ThreadPoolExecutor, window: int,
+                   level: int = 6, block_size: int = BLOCK_SIZE) -> int:
+    """
+    打包单个结果目录：块的压缩任务提交到共享线程池，保持有限的在途任务数以控制内存，
+    按顺序写出压缩块，最后写入索引块、tar结束标记和末尾索引指针
+    返回压缩包字节数
+    """
+    files: Dict[str, List[int]] = {}
+    blocks: List[List[int]] = []
+    pending = []
+    tmp_path = archive_path + ".tmp"
+    offset = 0
+
+    with open(tmp_path, "wb") as out:
+        def drain(limit: int) -> None:
+            nonlocal offset
+            while len(pending) > limit:
+                raw_len, future = pending.pop(0)
+                data = future.result()
+                out.write(data)
+                blocks.append([offset, len(data), raw_len])
+                offset += len(data)
+
+        for raw in _raw_blocks(path, files, block_size):
+            pending.append((len(raw), executor.submit(_gzip_block, raw, level)))
+            drain(window)
+        drain(0)
+
+        # 索引块：tar成员.pack_index.json
+        arc_root = os.path.basename(os.path.normpath(path))
+        payload = json.dumps({"blocks": blocks, "files": files}, ensure_ascii=False).encode("utf-8")
+        info = tarfile.TarInfo(f"{arc_root}/{INDEX_NAME}")
+        info.size, info.mode, info.mtime = len(payload), 0o644, int(os.stat(path).st_mtime)
+        index_block = _gzip_block(_tar_header(info) + payload + _padding(len(payload)), level)
+        index_offset = offset
+        out.write(index_block)
+        out.write(_gzip_block(b"\0" * (2 * tarfile.BLOCKSIZE), level))
+        out.write(_trailer(index_offset, len(index_block)))
+        size = out.tell()
+
+    os.replace(tmp_path, archive_path)
+    return size
+
+
+def read_index(archive_path: str) -> Dict[str, object]:
+    """读取压缩包内嵌索引（只解压索引块）"""
+    with open(archive_path, "rb") as f:
+        index_offset, index_length = _read_trailer(f)
+        f.seek(index_offset)
+        raw = _gunzip(f.read(index_length))
+    with tarfile.open(fileobj=io.BytesIO(raw), mode="r:", encoding="utf-8") as tf:
+        member = tf.next()
+        return json.loads(tf.extractfile(member).read())
+
+
+def extract_member(archive_path: str, name: str) -> bytes:
+    """按内嵌索引读取单个文件内容，只解压该文件覆盖的块"""
+    index = read_index(archive_path)
+    if name not in index["files"]:
+        raise KeyError(f"压缩包 {archive_path} 中不存在文件：{name}")
+    block_no, start, size = index["files"][name]
+    chunks = []
+    remaining = start + size
+    with open(archive_path, "rb") as f:
+        while remaining > 0:
+            comp_offset, comp_length, raw_length = index["blocks"][block_no]
+            f.seek(comp_offset)
+            chunks.append(_gunzip(f.read(comp_length)))
+            remaining -= raw_length
+            block_no += 1
+    return b"".join(chunks)[start:start + size]
+
+
+def pack_directories(paths: List[str], out_dir: str, jobs: int, threads: int, level: int,
+                     checksum: bool = False, force: bool = False) -> None:
+    """
+    并行增量打包多个结果目录：
+        jobs个目录同时打包，所有目录共享threads个压缩线程；
+        out_dir/.pack_manifest.json记录每个目录的清单摘要，未变化的目录跳过
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    manifest_path = os.path.join(out_dir, MANIFEST_NAME)
+    manifest: Dict[str, str] = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+
+    todo = []
+    for path in paths:
+        if not os.path.isdir(path):
+            print(f"跳过 {path} → 不是目录")
+            continue
+        name = os.path.basename(os.path.normpath(path))
+        archive_path = os.path.join(out_dir, f"{name}.tar.gz")
+        digest = directory_manifest(path, checksum)
+        if not force and manifest.get(name) == digest and os.path.exists(archive_path):
+            print(f"未变化，跳过：{path}")
+            continue
+        todo.append((path, archive_path, name, digest))
+
+    with ThreadPoolExecutor(max_workers=threads) as block_pool, \
+         ThreadPoolExecutor(max_workers=jobs) as dir_pool:
+        futures = {
+            dir_pool.submit(pack_directory, path, archive_path, block_pool, max(2, threads * 2), level): (path, archive_path, name, digest)
+            for path, archive_path, name, digest in todo
+        }
+        for future, (path, archive_path, name, digest) in futures.items():
+            try:
+                size = future.result()
+            except Exception as e:
+                # 任何一个目录失败都只记录并继续，保证清单照常写出（失败的目录不写入清单，下次重新打包）
+                print(f"打包失败：{path} → 错误：{type(e).__name__}: {str(e)}")
+                continue
+            manifest[name] = digest
+            print(f"打包完成：{path} → {archive_path}（{size} 字节）")
+
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    print(f"\n处理完成！本次打包 {len(todo)}/{len(paths)} 个目录")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="并行、增量地打包HOMER结果目录（替代逐个tar -zcvf），支持按内嵌索引提取单个文件")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    pack_parser = subparsers.add_parser("pack", help="打包结果目录")
+    pack_parser.add_argument("dirs", nargs="+", help="结果目录，如ana_cat_EN2_Core_p ana_shrew_*")
+    pack_parser.add_argument("--out-dir", default=".", help="压缩包输出目录（默认当前目录）")
+    pack_parser.add_argument("-j", "--jobs", type=int, default=4, help="同时打包的目录数（默认4）")
+    pack_parser.add_argument("--threads", type=int, default=os.cpu_count() or 1, help="压缩线程数（默认CPU核数）")
+    pack_parser.add_argument("--level", type=int, default=6, help="gzip压缩级别（默认6）")
+    pack_parser.add_argument("--checksum", action="store_true", help="按文件内容（而非大小和修改时间）判断目录是否变化")
+    pack_parser.add_argument("--force", action="store_true", help="忽略清单，全部重新打包")
+
+    list_parser = subparsers.add_parser("list", help="列出压缩包中的文件（只读内嵌索引）")
+    list_parser.add_argument("archive")
+
+    extract_parser = subparsers.add_parser("extract", help="提取单个文件（不解压整个压缩包）")
+    extract_parser.add_argument("archive")
+    extract_parser.add_argument("member", help="压缩包内路径，如ana_cat_EN2_Core_p/knownResults.txt")
+    extract_parser.add_argument("--output", default="-", help="输出文件（默认标准输出）")
+
+    args = parser.parse_args()
+    if args.command == "pack":
+        pack_directories(args.dirs, args.out_dir, args.jobs, args.threads, args.level, args.checksum, args.force)
+    elif args.command == "list":
+        for name, (_, _, size) in read_index(args.archive)["files"].items():
+            print(f"{size}\t{name}")
+    else:
+        data = extract_member(args.archive, args.member)
+        if args.output == "-":
+            sys.stdout.buffer.write(data)
+        else:
+            with open(args.output, "wb") as f:
+                f.write(data)
+
+
+if __name__ == "__main__":
+    main()
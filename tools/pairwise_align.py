@@ -0,0 +1,251 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from fasta_io import encode_dna, read_fasta
+
+# 得分与一致性统计打包在一个int64中：得分 << 40 | 匹配数 << 20 | 比对列数。
+# 一次np.maximum即同时完成选择得分与传递统计，得分相同的路径取匹配数多者（再取列数多者）
+SCORE_SHIFT = 40
+STAT_BITS = 20
+STAT_MASK = (1 << STAT_BITS) - 1
+NEG = -(1 << 61)
+PAD_A, PAD_B = 5, 6  # 填充编码，与任何碱基都不匹配；b中的N也编码为PAD_B，因此只需比较编码是否相等
+BATCH_SIZE = 512     # 分块内每批比对的序列对数
+
+# 工作进程的共享数据（由initializer在进程启动时设置一次，避免每个任务重复传输序列）
+_WORKER: Dict[str, object] = {}
+
+
+def align_batch(a_codes: List[np.ndarray], b_codes: List[np.ndarray], band: int, local: bool,
+                match: int, mismatch: int, gap_open: int, gap_extend: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    对一批序列对同时做带状仿射空位比对（Gotoh），沿反对角线向量化：
+    第d条反对角线上的所有单元只依赖第d-1、d-2条反对角线，因此一次numpy运算即可更新整批序列对的整条带。
+    带宽按对角线k=j-i计，包含两条序列的长度差，保证全局比对的终点(la, lb)总在带内。
+    参数：
+        gap_open: 打开一个空位的总罚分（含第一个碱基），gap_extend: 每延伸一个碱基的罚分（均为负数）
+        local: True为局部比对（Smith-Waterman），False为全局比对（Needleman-Wunsch）
+    返回：(比对得分, 一致性=匹配数/比对列数)，长度均为序列对数；得分相同的比对中取匹配数最多的计算一致性
+    """
+    n_pairs = len(a_codes)
+    la = np.array([len(a) for a in a_codes], dtype=np.int64)
+    lb = np.array([len(b) for b in b_codes], dtype=np.int64)
+    final_d = la + lb
+    n_diag = int(final_d.max())
+    # 统计字段（列数、匹配数）不能溢出；带外单元的值每条反对角线最多下降一个罚分，不能越过int64下限
+    max_penalty = max(abs(match), abs(mismatch), abs(gap_open), abs(gap_extend), 1)
+    if n_diag * max_penalty >= 1 << STAT_BITS:
+        raise ValueError(f"序列过长：两条序列长度之和（{n_diag}）× 最大罚分（{max_penalty}）须小于{1 << STAT_BITS}")
+
+    # 带内的对角线范围[k_lo, k_hi]
+    k_lo = np.minimum(0, lb - la) - band
+    k_hi = np.maximum(0, lb - la) + band
+    # 存放位置按k_top排布：统一k_hi的奇偶性，使相邻反对角线的错位对整批序列对相同，可直接切片。
+    # 多出的一条对角线只占存放位置，不参与计算（见下方的带外屏蔽）
+    k_top = k_hi + (k_hi - band) % 2
+    width = int((k_top - k_lo).max()) // 2 + 2
+    k_max = int(k_top.max())
+    # 反对角线d上第t个位置对应行号i = base(d) + t，base(d) = ceil((d - k_top) / 2)；
+    # 各序列对的base(d)与参考base_ref(d)相差固定的c_p，序列按c_p预先错位存放后，
+    # 每条反对角线上的碱基可以对整批序列对用同一个切片取出（b倒序存放，切片连续）
+    shift_c = (k_max - k_top) // 2
+
+    def base_ref(d: int) -> int:
+        return -((k_max - d) // 2)
+
+    off_a = k_max + 2
+    off_b = width + k_max + 2
+    a_big = np.full((n_pairs, off_a + int(la.max()) + width + 2), PAD_A, dtype=np.uint8)
+    b_big = np.full((n_pairs, off_b + n_diag + k_max + int(shift_c.max()) + 2), PAD_B, dtype=np.uint8)
+    for p in range(n_pairs):
+        a_big[p, off_a - shift_c[p]:off_a - shift_c[p] + la[p]] = a_codes[p]
+        b_big[p, off_b + shift_c[p]:off_b + shift_c[p] + lb[p]] = np.where(b_codes[p] < 4, b_codes[p], PAD_B)
+    b_rev = np.ascontiguousarray(b_big[:, ::-1])
+    b_end = b_big.shape[1] - 1
+
+    # 每条反对角线上带内且在矩阵范围内的位置区间[t_min, t_max]（各序列对、各反对角线一次算好）。
+    # 远离矩阵四角时区间只随d的奇偶变化，上限数组cap可以预先算好；已结束的序列对不再屏蔽
+    d_all = np.arange(n_diag + 1, dtype=np.int64)[None, :]
+    base_all = -((k_top[:, None] - d_all) // 2)
+    band_min = -((k_hi[:, None] - d_all) // 2) - base_all
+    band_max = (d_all - k_lo[:, None]) // 2 - base_all
+    t_min = np.maximum(np.maximum(0, d_all - lb[:, None]) - base_all, band_min)
+    t_max = np.minimum(np.minimum(la[:, None], d_all) - base_all, band_max)
+    finished = d_all > final_d[:, None]
+    t_min[finished], t_max[finished] = band_min[finished], band_max[finished]
+    at_edge = ((t_min != band_min) | (t_max != band_max)).any(axis=0)
+
+    t = np.arange(width, dtype=np.int64)[None, :]
+    top = np.iinfo(np.int64).max
+
+    def make_cap(lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+        return np.where((t < lo[:, None]) | (t > hi[:, None]), NEG, top)
+
+    band_cap = [make_cap(band_min[:, parity], band_max[:, parity]) for parity in (0, 1)]
+
+    unit = 1 << SCORE_SHIFT
+    mismatch_step = mismatch * unit + 1
+    match_delta = (match - mismatch) * unit + (1 << STAT_BITS)
+    open_step = gap_open * unit + 1
+    extend_step = gap_extend * unit + 1
+
+    # 每个数组两端各留一列NEG，方便用切片取相邻反对角线上的邻居；H保留三条反对角线，E/F保留两条，轮换使用
+    shape = (n_pairs, width + 2)
+    h_prev2, h_prev, h_cur = (np.full(shape, NEG, np.int64) for _ in range(3))
+    e_prev, e_cur = np.full(shape, NEG, np.int64), np.full(shape, NEG, np.int64)
+    f_prev, f_cur = np.full(shape, NEG, np.int64), np.full(shape, NEG, np.int64)
+    tmp = np.empty((n_pairs, width), np.int64)
+    eq = np.empty((n_pairs, width), bool)
+
+    # d = 0：单元(0, 0)
+    rows = np.arange(n_pairs)
+    h_prev[rows, 1 + (0 - base_ref(0) - shift_c)] = 0
+    best = np.full(n_pairs, 0 if local else NEG, dtype=np.int64)
+
+    for d in range(1, n_diag + 1):
+        shift = base_ref(d) - base_ref(d - 1)  # 0或1，整批相同
+        a_start = off_a + base_ref(d) - 1
+        b_start = b_end - (off_b + d - base_ref(d) - 1)
+        np.equal(a_big[:, a_start:a_start + width], b_rev[:, b_start:b_start + width], out=eq)
+
+        h = h_cur[:, 1:width + 1]
+        e = e_cur[:, 1:width + 1]
+        f = f_cur[:, 1:width + 1]
+        # E：(i, j-1)，位于d-1；F：(i-1, j)，位于d-1
+        np.add(h_prev[:, 1 + shift:width + 1 + shift], open_step, out=e)
+        np.add(e_prev[:, 1 + shift:width + 1 + shift], extend_step, out=tmp)
+        np.maximum(e, tmp, out=e)
+        np.add(h_prev[:, shift:width + shift], open_step, out=f)
+        np.add(f_prev[:, shift:width + shift], extend_step, out=tmp)
+        np.maximum(f, tmp, out=f)
+        # H：(i-1, j-1)，位于d-2
+        np.multiply(eq, match_delta, out=tmp)
+        tmp += mismatch_step
+        np.add(h_prev2[:, 1:width + 1], tmp, out=h)
+        np.maximum(h, e, out=h)
+        np.maximum(h, f, out=h)
+        if local:
+            np.maximum(h, 0, out=h)
+        # 带外单元的H压到NEG以下；E/F不必屏蔽：带外的E/F只会传向更远离带的单元
+        np.minimum(h, make_cap(t_min[:, d], t_max[:, d]) if at_edge[d] else band_cap[d % 2], out=h)
+
+        if local:
+            row_best = h.max(axis=1)
+            np.maximum(best, np.where(d <= final_d, row_best, NEG), out=best)
+        else:
+            done = np.flatnonzero(final_d == d)
+            if len(done):
+                best[done] = h[done, la[done] - base_all[done, d]]
+
+        h_prev2, h_prev, h_cur = h_prev, h_cur, h_prev2
+        e_prev, e_cur = e_cur, e_prev
+        f_prev, f_cur = f_cur, f_prev
+
+    score = best >> SCORE_SHIFT
+    matches = (best >> STAT_BITS) & STAT_MASK
+    columns = best & STAT_MASK
+    identity = np.where(columns > 0, matches / np.maximum(columns, 1), 0.0)
+    return score.astype(np.float32), identity.astype(np.float32)
+
+
+def _init_worker(codes: List[np.ndarray], score_path: str, identity_path: str, params: Dict[str, object]) -> None:
+    _WORKER["codes"] = codes
+    _WORKER["lengths"] = np.array([len(c) for c in codes], dtype=np.int64)
+    _WORKER["score"] = np.load(score_path, mmap_mode="r+")
+    _WORKER["identity"] = np.load(identity_path, mmap_mode="r+")
+    _WORKER["params"] = params
+
+
+def _align_tile(tile: Tuple[int, int, int, int]) -> int:
+    """
+    比对矩阵中的一个分块（行区间×列区间，只算上三角），结果直接写入内存映射的输出矩阵
+    分块内的序列对按长度差和长度和排序后分批，使每批的带宽和反对角线数接近，减少填充的无效单元
+    """
+    r0, r1, c0, c1 = tile
+    codes = _WORKER["codes"]
+    pairs = np.array([(r, c) for r in range(r0, r1) for c in range(max(c0, r), c1)], dtype=np.int64)
+    if not len(pairs):
+        return 0
+    params = _WORKER["params"]
+    len_r, len_c = _WORKER["lengths"][pairs[:, 0]], _WORKER["lengths"][pairs[:, 1]]
+    pairs = pairs[np.lexsort((len_r + len_c, np.abs(len_r - len_c) // 16))]
+    for lo in range(0, len(pairs), BATCH_SIZE):
+        batch = pairs[lo:lo + BATCH_SIZE]
+        score, identity = align_batch(
+            [codes[r] for r in batch[:, 0]], [codes[c] for c in batch[:, 1]], params["band"], params["local"],
+            params["match"], params["mismatch"], params["gap_open"], params["gap_extend"],
+        )
+        for matrix, values in ((_WORKER["score"], score), (_WORKER["identity"], identity)):
+            matrix[batch[:, 0], batch[:, 1]] = values
+            matrix[batch[:, 1], batch[:, 0]] = values
+    for matrix in (_WORKER["score"], _WORKER["identity"]):
+        matrix.flush()
+    return len(pairs)
+
+
+def all_vs_all(fasta_path: str, out_prefix: str, band: int = 32, local: bool = False, tile_size: int = 64,
+               workers: int = 0, match: int = 2, mismatch: int = -3, gap_open: int = -7, gap_extend: int = -2) -> None:
+    """
+    全部序列两两比对，输出：
+        <前缀>.ids.txt        序列ID（与矩阵行列顺序一致）
+        <前缀>.score.npy      比对得分矩阵（float32，可用np.load(..., mmap_mode="r")直接映射）
+        <前缀>.identity.npy   一致性矩阵（float32，0~1）
+    序列对矩阵按tile_size切成分块，分配给进程池并行计算
+    速度参考（单核，band=32）：500bp的序列对约1毫秒/对，n条序列需要约n² / 2000秒 / 核数
+    """
+    records = read_fasta(fasta_path)
+    if not records:
+        raise ValueError(f"FASTA文件为空：{fasta_path}")
+    ids = [seq_id for seq_id, _ in records]
+    codes = [encode_dna(seq) for _, seq in records]
+    n = len(codes)
+    print(f"读取 {n} 条序列，共 {n * (n + 1) // 2} 个序列对")
+
+    with open(f"{out_prefix}.ids.txt", "w", encoding="utf-8") as f:
+        f.write("\n".join(ids) + "\n")
+    score_path, identity_path = f"{out_prefix}.score.npy", f"{out_prefix}.identity.npy"
+    for path in (score_path, identity_path):
+        np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=(n, n)).flush()
+
+    tiles = [
+        (r0, min(r0 + tile_size, n), c0, min(c0 + tile_size, n))
+        for r0 in range(0, n, tile_size) for c0 in range(r0, n, tile_size)
+    ]
+    params = {"band": band, "local": local, "match": match, "mismatch": mismatch,
+              "gap_open": gap_open, "gap_extend": gap_extend}
+    done = 0
+    t0 = time.time()
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=_init_worker,
+                             initargs=(codes, score_path, identity_path, params)) as pool:
+        for count in pool.map(_align_tile, tiles):
+            done += count
+    elapsed = time.time() - t0
+    print(f"比对完成：{done} 个序列对（{elapsed:.1f} 秒，{done / max(elapsed, 1e-9):.0f} 对/秒），"
+          f"结果保存至 {score_path}、{identity_path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="短序列（100~500bp启动子窗口）全对全带状比对，输出得分与一致性矩阵")
+    parser.add_argument("--fasta", required=True, help="输入FASTA文件")
+    parser.add_argument("--output", required=True, help="输出前缀（生成.ids.txt/.score.npy/.identity.npy）")
+    parser.add_argument("--band", type=int, default=32, help="带宽（在长度差之外允许偏离对角线的碱基数，默认32）")
+    parser.add_argument("--local", action="store_true", help="局部比对（默认全局比对）")
+    parser.add_argument("--tile", type=int, default=64, help="分块大小（默认64×64个序列对）")
+    parser.add_argument("--workers", type=int, default=0, help="进程数（默认CPU核数）")
+    parser.add_argument("--match", type=int, default=2, help="匹配得分（默认2）")
+    parser.add_argument("--mismatch", type=int, default=-3, help="错配罚分（默认-3）")
+    parser.add_argument("--gap-open", type=int, default=-7, help="空位打开罚分，含第一个碱基（默认-7）")
+    parser.add_argument("--gap-extend", type=int, default=-2, help="空位延伸罚分（默认-2）")
+    args = parser.parse_args()
+
+    all_vs_all(args.fasta, args.output, args.band, args.local, args.tile, args.workers,
+               args.match, args.mismatch, args.gap_open, args.gap_extend)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+import argparse
+import itertools
+import time
+from typing import Dict, List, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from fasta_io import encode_dna, read_fasta
+from motifs import MotifBank, read_motif_file
+from scan_cache import ScanCache, deduplicate, library_digest, pack_hits
+
+# 浮点累加顺序不同带来的误差余量：核心k-mer的下界放宽该值，候选集合只会更大，不会漏掉命中
+BOUND_SLACK = 1e-3
+
+
+def all_kmers(k: int) -> np.ndarray:
+    """全部4^k个k-mer的碱基编码（按2 bit打包编码的顺序排列），形状(4^k, k)"""
+    return np.array(list(itertools.product(range(4), repeat=k)), dtype=np.int64).reshape(-1, k)
+
+
+def packed_kmers(codes: np.ndarray, k: int) -> np.ndarray:
+    """
+    序列每个起点的k-mer打包编码（每碱基2 bit，与all_kmers的顺序一致）；含N的k-mer编码为-1
+    返回长度为n - k + 1的int64数组
+    """
+    if len(codes) < k:
+        return np.zeros(0, dtype=np.int64)
+    windows = sliding_window_view(codes, k)
+    weights = 4 ** np.arange(k - 1, -1, -1, dtype=np.int64)
+    packed = windows.astype(np.int64) @ weights
+    packed[(windows > 3).any(axis=1)] = -1
+    return packed
+
+
+class CorePrefilter:
+    """
+    PWM扫描的精确预筛选：
+        对每个motif（及其反向互补矩阵），在长度为k的每个连续核心位置上，
+        核心得分必须 ≥ 阈值 - 其余列最高分之和，窗口才可能达到阈值；
+        枚举全部4^k个k-mer，选出通过该下界的k-mer最少的核心位置作为主核心，
+        再在与主核心不重叠的位置中同样选出副核心（motif宽度不足2k时没有副核心）。
+    全部motif主核心的k-mer编入一张按打包编码直接寻址的多模式查找表（CSR：每个k-mer → (motif, 链)列表），
+    序列打包后每个位置一次查表即得到全部候选窗口（定长模式下等价于Aho–Corasick自动机）；
+    候选窗口再用"主核心得分 + 副核心得分 + 其余列最高分 ≥ 阈值"查表过滤，最后只在剩余窗口上做完整PWM打分。
+    两级过滤都是必要条件，因此结果与逐位置全量打分完全一致。
+    宽度小于k的motif以其全宽作为核心，按核心长度分组建表。
+    阈值较低（如0.7）时候选窗口过多，预筛选反而慢于bank.score_windows的全量矩阵乘法。
+    """
+
+    def __init__(self, bank: MotifBank, thresholds: np.ndarray, k: int = 6):
+        self.bank = bank
+        self.thresholds = np.asarray(thresholds, dtype=np.float64)
+        # 正链与反向互补矩阵按(链, motif, 列, 碱基)展平，候选窗口一次取数即可打分
+        # float32的PWM值在float64中累加是精确的：得分与累加顺序无关，恰好落在阈值上的窗口与全量扫描判定一致
+        self.flat_matrices = np.stack([bank.pwm, bank.rc]).ravel().astype(np.float64)
+        self.tables: Dict[int, Dict[str, np.ndarray]] = {}
+        self.core_kmers = 0
+        groups: Dict[int, List[Tuple[int, int, int, np.ndarray, int, np.ndarray, float, np.ndarray]]] = {}
+        kmer_cache: Dict[int, np.ndarray] = {}
+
+        for strand, matrices in ((0, bank.pwm), (1, bank.rc)):
+            real = matrices[:, :, :4].astype(np.float64)
+            for m in range(len(bank)):
+                width = int(bank.widths[m])
+                core_len = min(k, width)
+                if core_len not in kmer_cache:
+                    kmer_cache[core_len] = all_kmers(core_len)
+                kmers = kmer_cache[core_len]
+                column_max = real[m, :width].max(axis=1)
+                total_max = column_max.sum()
+                cores = []
+                for offset in range(width - core_len + 1):
+                    core_max = column_max[offset:offset + core_len].sum()
+                    scores = real[m, offset:offset + core_len][np.arange(core_len)[None, :], kmers].sum(axis=1)
+                    passing = int((scores >= self.thresholds[m] - (total_max - core_max) - BOUND_SLACK).sum())
+                    cores.append((passing, offset, scores, core_max))
+                first = min(cores, key=lambda c: c[0])
+                disjoint = [c for c in cores if abs(c[1] - first[1]) >= core_len]
+                second = min(disjoint, key=lambda c: c[0]) if disjoint else None
+                rest = total_max - first[3] - (second[3] if second else 0.0)
+                groups.setdefault(core_len, []).append((
+                    m, strand, first[1], first[2],
+                    second[1] if second else first[1],
+                    second[2] if second else np.zeros_like(first[2]),
+                    rest, np.flatnonzero(first[2] >= self.thresholds[m] - (total_max - first[3]) - BOUND_SLACK)))
+
+        for core_len, items in groups.items():
+            passing = [item[7] for item in items]
+            self.core_kmers += sum(len(p) for p in passing)
+            codes = np.concatenate(passing)
+            row = np.repeat(np.arange(len(items)), [len(p) for p in passing])
+            order = np.argsort(codes, kind="stable")
+            self.tables[core_len] = {
+                "starts": np.searchsorted(codes[order], np.arange(4 ** core_len + 1)),
+                "rows": row[order],
+                "motif": np.array([item[0] for item in items], dtype=np.int64),
+                "strand": np.array([item[1] for item in items], dtype=np.int8),
+                "offset1": np.array([item[2] for item in items], dtype=np.int64),
+                "offset2": np.array([item[4] for item in items], dtype=np.int64),
+                "scores": np.stack([np.stack([item[3], item[5]]) for item in items]).astype(np.float32),
+                "bound": np.array([self.thresholds[item[0]] - item[6] - BOUND_SLACK for item in items]),
+            }
+
+    def candidates(self, codes: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """查表得到全部候选窗口，并用主、副核心得分之和过滤：返回(motif下标, 窗口起点, 链)"""
+        n = len(codes)
+        motifs, starts, strands = [], [], []
+        for core_len, table in self.tables.items():
+            packed = packed_kmers(codes, core_len)
+            positions = np.flatnonzero(packed >= 0)
+            lo = table["starts"][packed[positions]]
+            counts = table["starts"][packed[positions] + 1] - lo
+            total = int(counts.sum())
+            if not total:
+                continue
+            # 展开每个位置命中的表项区间[lo, lo + count)
+            owner = np.repeat(np.arange(len(positions)), counts)
+            within = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+            row = table["rows"][lo[owner] + within]
+            start = positions[owner] - table["offset1"][row]
+            m = table["motif"][row]
+            valid = (start >= 0) & (start + self.bank.widths[m] <= n)
+            row, start, m = row[valid], start[valid], m[valid]
+            second = packed[start + table["offset2"][row]]
+            core_scores = (table["scores"][row, 0, packed[start + table["offset1"][row]]]
+                           + np.where(second >= 0, table["scores"][row, 1, second], -np.inf))
+            keep = core_scores >= table["bound"][row]
+            motifs.append(m[keep])
+            starts.append(start[keep])
+            strands.append(table["strand"][row[keep]])
+        if not motifs:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, np.zeros(0, dtype=np.int8)
+        return np.concatenate(motifs), np.concatenate(starts), np.concatenate(strands)
+
+    def scan(self, codes: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, int]:
+        """
+        预筛选扫描：返回达到阈值的命中(motif下标, 起点, 链, 得分)，按(起点, motif, 链)排序，以及候选窗口数
+        """
+        motif, start, strand = self.candidates(codes)
+        padded = np.concatenate([codes, np.full(self.bank.max_width, 4, dtype=np.uint8)])
+        widths = self.bank.widths[motif]
+        scores = np.zeros(len(motif), dtype=np.float64)
+        # 按motif宽度分组打分，每组只取实际宽度内的列
+        for width in np.unique(widths):
+            group = np.flatnonzero(widths == width)
+            windows = sliding_window_view(padded, width)[start[group]]
+            rows = (strand[group].astype(np.int64) * len(self.bank) + motif[group]) * self.bank.max_width
+            index = (rows[:, None] + np.arange(width)[None, :]) * 5 + windows
+            scores[group] = self.flat_matrices[index].sum(axis=1)
+        hit = scores >= self.thresholds[motif]
+        motif, start, strand, scores = motif[hit], start[hit], strand[hit], scores[hit].astype(np.float32)
+        order = np.lexsort((strand, motif, start))
+        return motif[order], start[order], strand[order], scores[order], len(hit)
+
+
+def brute_force_hits(bank: MotifBank, thresholds: np.ndarray, codes: np.ndarray):
+    """全量打分（逐位置、全部motif）的命中，用于校验预筛选结果"""
+    forward, reverse = bank.score_windows(codes, np.float64)
+    hits = set()
+    for strand, scores in ((0, forward), (1, reverse)):
+        motif, start = np.nonzero(scores >= thresholds[:, None])
+        hits.update(zip(motif.tolist(), start.tolist(), [strand] * len(motif)))
+    return hits
+
+
+def main():
+    parser = argparse.ArgumentParser(description="核心k-mer预筛选加速的PWM扫描（与全量扫描结果完全一致），逐条序列输出命中表")
+    parser.add_argument("--fasta", required=True, help="输入FASTA（启动子/调控区序列）")
+    parser.add_argument("--motifs", required=True, help="motif库（MEME/JASPAR/HOMER格式，自动识别）")
+    parser.add_argument("--output", required=True, help="输出命中表（seq_id start end motif strand score，0-based半开区间）")
+    parser.add_argument("--threshold", type=float, default=0.85, help="相对得分阈值（默认0.85）")
+    parser.add_argument("-k", type=int, default=6, help="核心k-mer长度（默认6，查表大小4^k）")
+    parser.add_argument("--verify", action="store_true", help="同时做全量扫描并核对命中是否完全一致（只核对本次实际扫描的序列）")
+    parser.add_argument("--cache", help="扫描结果缓存文件（SQLite，按序列摘要 + motif库与阈值摘要存取，跨运行复用）")
+    parser.add_argument("--cache-mb", type=int, default=256, help="缓存大小上限（MB，超出时淘汰最久未用的条目，默认256）")
+    args = parser.parse_args()
+
+    bank = MotifBank(read_motif_file(args.motifs))
+    thresholds = bank.thresholds(args.threshold)
+    records = read_fasta(args.fasta)
+    # 相同序列只扫描一次：先按序列摘要去重，再查缓存，只扫描缓存中没有的唯一序列
+    unique, owners = deduplicate(records)
+    library = library_digest(bank, thresholds)
+    cache = ScanCache(args.cache, args.cache_mb << 20) if args.cache else None
+    results = cache.get_many(library, [digest for digest, _ in unique]) if cache else {}
+    pending = [(digest, seq) for digest, seq in unique if digest not in results]
+    print(f"{len(records)} 条序列，去重后 {len(unique)} 条，"
+          f"{'缓存命中 ' + str(len(unique) - len(pending)) + ' 条，' if cache else ''}需扫描 {len(pending)} 条")
+
+    total_windows, total_candidates = 0, 0
+    t0 = time.time()
+    if pending:
+        prefilter = CorePrefilter(bank, thresholds, args.k)
+        print(f"{len(bank)} 个motif，核心k-mer表 {prefilter.core_kmers} 项（建表 {time.time() - t0:.1f} 秒）")
+        t0 = time.time()
+        scanned = {}
+        for digest, seq in pending:
+            codes = encode_dna(seq)
+            motif, start, strand, scores, n_candidates = prefilter.scan(codes)
+            total_windows += 2 * len(bank) * len(codes)
+            total_candidates += n_candidates
+            scanned[digest] = pack_hits(motif, start, strand, scores)
+            if args.verify:
+                expected = brute_force_hits(bank, thresholds, codes)
+                got = set(zip(motif.tolist(), start.tolist(), strand.tolist()))
+                if got != expected:
+                    seq_ids = [seq_id for (seq_id, _), owner in zip(records, owners) if owner == digest]
+                    print(f"警告：{seq_ids[0]} 预筛选结果与全量扫描不一致（多 {len(got - expected)}，少 {len(expected - got)}）")
+        results.update(scanned)
+        if cache:
+            cache.put_many(library, scanned)
+    if cache:
+        cache.close()
+
+    total_hits = 0
+    with open(args.output, "w", encoding="utf-8") as f:
+        f.write("seq_id\tstart\tend\tmotif\tstrand\tscore\n")
+        for (seq_id, _), digest in zip(records, owners):
+            hits = results[digest]
+            total_hits += len(hits)
+            for m, s, d, score in zip(hits["motif"].tolist(), hits["start"].tolist(), hits["strand"].tolist(),
+                                      hits["score"].tolist()):
+                f.write(f"{seq_id}\t{s}\t{s + bank.widths[m]}\t{bank.ids[m]}\t{'-' if d else '+'}\t{score:.3f}\n")
+    print(f"扫描完成（{time.time() - t0:.2f} 秒）：{total_hits} 个命中，"
+          f"完整打分的候选窗口占 {total_candidates / max(total_windows, 1):.2%}，结果保存至：{args.output}")
+
+
+if __name__ == "__main__":
+    main()
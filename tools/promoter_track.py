@@ -0,0 +1,183 @@
+import argparse
+import time
+from collections import Counter
+from typing import List, Tuple
+
+import numpy as np
+
+from fasta_io import read_fasta, encode_dna
+from motifs import MotifBank, read_motif_file
+from prefilter import CorePrefilter
+from scan_cache import deduplicate
+
+PEAK_COLUMNS = ("seq_id", "start", "end", "length", "summit", "max_z", "mean_density", "n_hits", "top_motifs")
+
+
+def concatenate_circular(genomes: List[Tuple[str, str]], wrap: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    全部基因组拼成一条编码序列一次扫描：每条基因组末尾接上其开头的wrap个碱基（跨原点的窗口），
+    基因组之间以wrap + 1个N隔开（N的得分为N_SCORE，任何motif窗口都不会跨越两条基因组）
+    返回(拼接编码, 各基因组在拼接序列中的起点, 各基因组长度)
+    """
+    parts, starts, lengths = [], [], []
+    position = 0
+    for _, seq in genomes:
+        codes = encode_dna(seq.upper())
+        block = np.concatenate([codes, np.resize(codes, wrap) if len(codes) else codes,
+                                np.full(wrap + 1, 4, dtype=np.uint8)])
+        parts.append(block)
+        starts.append(position)
+        lengths.append(len(codes))
+        position += len(block)
+    return np.concatenate(parts), np.array(starts, dtype=np.int64), np.array(lengths, dtype=np.int64)
+
+
+def circular_window_sum(values: np.ndarray, window: int) -> np.ndarray:
+    """以每个位置为中心、宽window的环状滑动窗口求和：按环取下标展开后做一次累加和"""
+    n = len(values)
+    half = window // 2
+    extended = values[np.arange(-half, n + window - half - 1) % n]
+    cumulative = np.concatenate([[0.0], np.cumsum(extended)])
+    return cumulative[window:window + n] - cumulative[:n]
+
+
+def circular_smooth(values: np.ndarray, sigma: float) -> np.ndarray:
+    """环状高斯平滑：核按环上距离定义，FFT做循环卷积"""
+    n = len(values)
+    distance = np.minimum(np.arange(n), n - np.arange(n))
+    kernel = np.exp(-0.5 * (distance / sigma) ** 2)
+    kernel /= kernel.sum()
+    return np.fft.irfft(np.fft.rfft(values) * np.fft.rfft(kernel), n)
+
+
+def zscore(values: np.ndarray) -> np.ndarray:
+    std = values.std()
+    return (values - values.mean()) / std if std > 0 else np.zeros_like(values)
+
+
+def circular_runs(mask: np.ndarray, merge_gap: int) -> List[Tuple[int, int]]:
+    """
+    环上mask为True的连续区段，间隔不超过merge_gap的相邻区段合并（含跨原点的首尾区段）
+    返回[(起点, 终点)]，0-based半开，跨原点的区段终点大于长度
+    """
+    n = len(mask)
+    if mask.all():
+        return [(0, n)]
+    if not mask.any():
+        return []
+    # 旋转到一个False位置开头，区段不再跨越数组两端
+    shift = int(np.argmin(mask))
+    rolled = np.concatenate([[False], np.roll(mask, -shift), [False]]).astype(np.int8)
+    edges = np.diff(rolled)
+    runs = [[int(s), int(e)] for s, e in zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1))]
+    merged = [runs[0]]
+    for start, end in runs[1:]:
+        if start - merged[-1][1] <= merge_gap:
+            merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    if len(merged) > 1 and n - merged[-1][1] + merged[0][0] <= merge_gap:
+        last = merged.pop()
+        merged[0] = [last[0], merged[0][1] + n]
+    out = []
+    for start, end in merged:
+        origin = (start + shift) % n
+        out.append((origin, origin + end - start))
+    return sorted(out)
+
+
+def profile_genome(centers: np.ndarray, weights: np.ndarray, length: int, window: int,
+                   sigma: float) -> Tuple[np.ndarray, np.ndarray]:
+    """单条基因组的motif密度（每kb命中数/得分和）与其基因组内z分数"""
+    counts = np.bincount(centers, weights=weights, minlength=length).astype(np.float64)
+    density = circular_window_sum(counts, window) * (1000.0 / window)
+    if sigma > 0:
+        density = circular_smooth(density, sigma)
+    return density, zscore(density)
+
+
+def write_bedgraph(out, seq_id: str, values: np.ndarray, digits: int = 3) -> int:
+    """相邻值相同（按digits位小数）的位置合并为一行，返回写出的行数"""
+    rounded = np.round(values, digits)
+    change = np.flatnonzero(np.diff(rounded)) + 1
+    starts = np.concatenate([[0], change])
+    ends = np.concatenate([change, [len(values)]])
+    for start, end, value in zip(starts.tolist(), ends.tolist(), rounded[starts].tolist()):
+        out.write(f"{seq_id}\t{start}\t{end}\t{value:.{digits}f}\n")
+    return len(starts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="全基因组启动子样信号轨迹：JASPAR PWM命中的环状滑动窗口密度（累加和 + FFT循环卷积平滑），输出bedGraph与环状感知的峰表")
+    parser.add_argument("--fasta", required=True, help="环状基因组FASTA（如sequences.fasta）")
+    parser.add_argument("--motifs", required=True, help="motif库（MEME/JASPAR/HOMER格式，如JASPAR2024_CORE_vertebrates_non-redundant_pfms_meme.txt）")
+    parser.add_argument("--bedgraph", required=True, help="输出bedGraph（每个位置的值，相同值的相邻位置合并）")
+    parser.add_argument("--peaks", required=True, help="输出峰表（0-based半开区间，跨原点的峰终点大于基因组长度）")
+    parser.add_argument("--threshold", type=float, default=0.9, help="motif命中的相对得分阈值（默认0.9）")
+    parser.add_argument("--window", type=int, default=100, help="密度窗口宽度（默认100bp）")
+    parser.add_argument("--smooth", type=float, default=0.0, help="高斯平滑的sigma（bp，默认0不平滑）")
+    parser.add_argument("--weight", choices=("count", "score"), default="count",
+                        help="命中计数方式：count每个命中计1，score按相对得分超出阈值的部分加权")
+    parser.add_argument("--value", choices=("zscore", "density"), default="zscore", help="bedGraph的取值（默认zscore）")
+    parser.add_argument("--peak-z", type=float, default=2.0, help="峰的z分数阈值（默认2.0）")
+    parser.add_argument("--merge-gap", type=int, default=20, help="间隔不超过该值的峰合并（默认20bp）")
+    parser.add_argument("--min-length", type=int, default=20, help="峰的最小长度（默认20bp）")
+    parser.add_argument("-k", type=int, default=6, help="预筛选核心k-mer长度（默认6）")
+    args = parser.parse_args()
+
+    bank = MotifBank(read_motif_file(args.motifs))
+    thresholds = bank.thresholds(args.threshold)
+    genomes = read_fasta(args.fasta)
+    # 序列完全相同的基因组只扫描一次，genome_slot为每条记录对应的去重后下标
+    unique, owners = deduplicate(genomes)
+    slots = {digest: u for u, (digest, _) in enumerate(unique)}
+    genome_slot = [slots[digest] for digest in owners]
+    t0 = time.time()
+    prefilter = CorePrefilter(bank, thresholds, args.k)
+    print(f"{len(bank)} 个motif，{len(genomes)} 条基因组（{len(unique)} 条序列不同，建表 {time.time() - t0:.1f} 秒）")
+
+    t0 = time.time()
+    codes, offsets, lengths = concatenate_circular(unique, bank.max_width - 1)
+    motif, start, strand, scores, _ = prefilter.scan(codes)
+    # 命中归属到基因组，起点折回[0, L)（跨原点窗口的重复命中只保留起点在基因组内的一份），以motif中心计位置
+    genome = np.searchsorted(offsets, start, side="right") - 1
+    local = start - offsets[genome]
+    keep = local < lengths[genome]
+    motif, genome, local, scores = motif[keep], genome[keep], local[keep], scores[keep]
+    centers = (local + bank.widths[motif] // 2) % lengths[genome]
+    if args.weight == "score":
+        weights = (scores - thresholds[motif]) / np.maximum(bank.max_scores[motif] - thresholds[motif], 1e-9)
+    else:
+        weights = np.ones(len(motif))
+    print(f"扫描完成（{time.time() - t0:.2f} 秒）：{len(motif)} 个命中")
+
+    order = np.argsort(genome, kind="stable")
+    bounds = np.searchsorted(genome[order], np.arange(len(unique) + 1))
+    n_peaks = 0
+    with open(args.bedgraph, "w", encoding="utf-8") as bedgraph, open(args.peaks, "w", encoding="utf-8") as peaks:
+        bedgraph.write(f'track type=bedGraph name="motif_density" description="{args.value} of motif density '
+                       f'(window {args.window}bp, threshold {args.threshold})"\n')
+        peaks.write("\t".join(PEAK_COLUMNS) + "\n")
+        for (seq_id, _), g in zip(genomes, genome_slot):
+            length = int(lengths[g])
+            if length == 0:
+                continue
+            rows = order[bounds[g]:bounds[g + 1]]
+            density, z = profile_genome(centers[rows], weights[rows], length, args.window, args.smooth)
+            write_bedgraph(bedgraph, seq_id, z if args.value == "zscore" else density)
+            for peak_start, peak_end in circular_runs(z >= args.peak_z, args.merge_gap):
+                if peak_end - peak_start < args.min_length:
+                    continue
+                positions = np.arange(peak_start, peak_end) % length
+                summit = int(positions[np.argmax(z[positions])])
+                inside = rows[(centers[rows] - peak_start) % length < peak_end - peak_start]
+                top = Counter(bank.names[m] for m in motif[inside].tolist()).most_common(3)
+                peaks.write(f"{seq_id}\t{peak_start}\t{peak_end}\t{peak_end - peak_start}\t{summit}\t"
+                            f"{z[summit]:.3f}\t{density[positions].mean():.3f}\t{len(inside)}\t"
+                            f"{','.join(f'{name}({count})' for name, count in top)}\n")
+                n_peaks += 1
+    print(f"轨迹完成（{time.time() - t0:.2f} 秒）：{n_peaks} 个峰，bedGraph保存至：{args.bedgraph}，峰表保存至：{args.peaks}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+import os
+import re
+from contextlib import ExitStack
+from typing import Iterable, List, Optional, Tuple
+
+WINDOW_LABEL_PATTERN = re.compile(r"_up(\d+)_down(\d+)$")
+
+
+def parse_windows(spec: str) -> List[Tuple[int, int]]:
+    """
+    解析窗口列表，如"100,250,500:0,1000:100" → [(100, 0), (250, 0), (500, 0), (1000, 100)]
+    每项为"上游[:下游]"，上游为CDS起始位点之前的长度，下游为从CDS起始位点（含）开始向下游的长度
+    """
+    windows: List[Tuple[int, int]] = []
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        up_str, _, down_str = item.partition(":")
+        try:
+            window = (int(up_str), int(down_str or 0))
+        except ValueError:
+            raise ValueError(f"窗口格式错误：{item}（应为'上游[:下游]'，如500:100）")
+        if window[0] < 0 or window[1] < 0 or sum(window) == 0:
+            raise ValueError(f"窗口长度必须为非负整数且不能全为0：{item}")
+        if window not in windows:
+            windows.append(window)
+    if not windows:
+        raise ValueError("窗口列表为空")
+    return windows
+
+
+def window_label(upstream: int, downstream: int) -> str:
+    return f"up{upstream}_down{downstream}"
+
+
+def window_output_path(path: str, upstream: int, downstream: int) -> str:
+    """每个窗口一个输出文件：promoters.fasta → promoters_up500_down0.fasta"""
+    root, ext = os.path.splitext(path)
+    return f"{root}_{window_label(upstream, downstream)}{ext or '.fasta'}"
+
+
+def window_from_path(path: str) -> Optional[Tuple[int, int]]:
+    """window_output_path的逆过程：promoters_up1000_down100.fasta → (1000, 100)；文件名不含窗口标签时返回None"""
+    match = WINDOW_LABEL_PATTERN.search(os.path.splitext(os.path.basename(path))[0])
+    return (int(match.group(1)), int(match.group(2))) if match else None
+
+
+class CircularGenome:
+    """
+    环状基因组的共享索引：序列按需首尾重复延长（只延长一次，所有窗口共用），
+    任意1-based起点的上下游窗口都化为延长序列上的一次切片，无需区分是否跨越原点
+    """
+    __slots__ = ("seq", "length", "_extended")
+
+    def __init__(self, seq: str):
+        self.seq = seq
+        self.length = len(seq)
+        self._extended = seq
+
+    def window(self, cds_start: int, upstream: int, downstream: int) -> str:
+        """返回1-based区间[cds_start - upstream, cds_start + downstream - 1]（环状坐标）"""
+        if not self.length:
+            return ""
+        size = upstream + downstream
+        start = (cds_start - 1 - upstream) % self.length
+        if start + size > len(self._extended):
+            copies = (start + size) // self.length + 1
+            self._extended = self.seq * copies
+        return self._extended[start:start + size]
+
+
+def sweep_windows(records: Iterable[Tuple[str, CircularGenome, int]], windows: List[Tuple[int, int]],
+                  output_path: str, columnar_path: Optional[str] = None, line_width: int = 0,
+                  fasta_outputs: bool = True) -> int:
+    """
+    一次遍历完成全部窗口的提取：records逐条给出(输出FASTA头（不含">"）, 环状基因组, CDS起始位点)，
+    每条记录对所有窗口切片后同时写入各窗口的FASTA文件（window_output_path），
+    columnar_path非空时另写一个列式TSV（每个窗口一列）。line_width > 0时FASTA序列按该宽度换行。
+    返回处理的记录数
+    """
+    count = 0
+    longest = max(up + down for up, down in windows)
+    warned = set()
+    with ExitStack() as stack:
+        handles = []
+        if fasta_outputs:
+            handles = [stack.enter_context(open(window_output_path(output_path, up, down), "w", encoding="utf-8"))
+                       for up, down in windows]
+        columnar = stack.enter_context(open(columnar_path, "w", encoding="utf-8")) if columnar_path else None
+        if columnar:
+            columnar.write("header\tcds_start\t" + "\t".join(window_label(up, down) for up, down in windows) + "\n")
+        for header, genome, cds_start in records:
+            if genome.length < longest and id(genome) not in warned:
+                warned.add(id(genome))
+                print(f"警告：{header} 的基因组长度{genome.length}bp小于最大窗口{longest}bp，窗口将环绕重复")
+            sequences = [genome.window(cds_start, up, down) for up, down in windows]
+            for handle, seq in zip(handles, sequences):
+                handle.write(f">{header}\n")
+                if line_width > 0:
+                    for i in range(0, len(seq), line_width):
+                        handle.write(seq[i:i + line_width] + "\n")
+                else:
+                    handle.write(seq + "\n")
+            if columnar:
+                columnar.write(f"{header}\t{cds_start}\t" + "\t".join(sequences) + "\n")
+            count += 1
+    if fasta_outputs:
+        for up, down in windows:
+            print(f"窗口 {window_label(up, down)} 已保存至：{window_output_path(output_path, up, down)}")
+    if columnar_path:
+        print(f"列式结果已保存至：{columnar_path}")
+    return count
@@ -0,0 +1,377 @@
+import argparse
+import math
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from fasta_io import encode_dna, read_fasta
+from kmer_index import Alignment, banded_align, format_bitscore, format_evalue
+from rotate import reverse_complement
+from translate import codon_table, six_frames
+
+# 氨基酸编码顺序（同NCBI BLOSUM62矩阵），未知字符编码为X
+AMINO_ACIDS = "ARNDCQEGHILKMFPSTWYVBZX*"
+X_CODE = AMINO_ACIDS.index("X")
+BLOSUM62_ROWS = """
+ 4 -1 -2 -2  0 -1 -1  0 -2 -1 -1 -1 -1 -2 -1  1  0 -3 -2  0 -2 -1  0 -4
+-1  5  0 -2 -3  1  0 -2  0 -3 -2  2 -1 -3 -2 -1 -1 -3 -2 -3 -1  0 -1 -4
+-2  0  6  1 -3  0  0  0  1 -3 -3  0 -2 -3 -2  1  0 -4 -2 -3  3  0 -1 -4
+-2 -2  1  6 -3  0  2 -1 -1 -3 -4 -1 -3 -3 -1  0 -1 -4 -3 -3  4  1 -1 -4
+ 0 -3 -3 -3  9 -3 -4 -3 -3 -1 -1 -3 -1 -2 -3 -1 -1 -2 -2 -1 -3 -3 -2 -4
+-1  1  0  0 -3  5  2 -2  0 -3 -2  1  0 -3 -1  0 -1 -2 -1 -2  0  3 -1 -4
+-1  0  0  2 -4  2  5 -2  0 -3 -3  1 -2 -3 -1  0 -1 -3 -2 -2  1  4 -1 -4
+ 0 -2  0 -1 -3 -2 -2  6 -2 -4 -4 -2 -3 -3 -2  0 -2 -2 -3 -3 -1 -2 -1 -4
+-2  0  1 -1 -3  0  0 -2  8 -3 -3 -1 -2 -1 -2 -1 -2 -2  2 -3  0  0 -1 -4
+-1 -3 -3 -3 -1 -3 -3 -4 -3  4  2 -3  1  0 -3 -2 -1 -3 -1  3 -3 -3 -1 -4
+-1 -2 -3 -4 -1 -2 -3 -4 -3  2  4 -2  2  0 -3 -2 -1 -2 -1  1 -4 -3 -1 -4
+-1  2  0 -1 -3  1  1 -2 -1 -3 -2  5 -1 -3 -1  0 -1 -3 -2 -2  0  1 -1 -4
+-1 -1 -2 -3 -1  0 -2 -3 -2  1  2 -1  5  0 -2 -1 -1 -1 -1  1 -3 -1 -1 -4
+-2 -3 -3 -3 -2 -3 -3 -3 -1  0  0 -3  0  6 -4 -2 -2  1  3 -1 -3 -3 -1 -4
+-1 -2 -2 -1 -3 -1 -1 -2 -2 -3 -3 -1 -2 -4  7 -1 -1 -4 -3 -2 -2 -1 -2 -4
+ 1 -1  1  0 -1  0  0  0 -1 -2 -2  0 -1 -2 -1  4  1 -3 -2 -2  0  0  0 -4
+ 0 -1  0 -1 -1 -1 -1 -2 -2 -1 -1 -1 -1 -2 -1  1  5 -2 -2  0 -1 -1  0 -4
+-3 -3 -4 -4 -2 -2 -3 -2 -2 -3 -2 -3 -1  1 -4 -3 -2 11  2 -3 -4 -3 -2 -4
+-2 -2 -2 -3 -2 -1 -2 -3  2 -1 -1 -2 -1  3 -3 -2 -2  2  7 -1 -3 -2 -1 -4
+ 0 -3 -3 -3 -1 -2 -2 -3 -3  3  1 -2  1 -1 -2 -2  0 -3 -1  4 -3 -2 -1 -4
+-2 -1  3  4 -3  0  1 -1  0 -3 -4  0 -3 -3 -2  0 -1 -4 -3 -3  4  1 -1 -4
+-1  0  0  1 -3  3  4 -2  0 -3 -3  1 -1 -3 -1  0 -1 -3 -2 -2  1  4 -1 -4
+ 0 -1 -1 -1 -2 -1 -1 -1 -1 -1 -1 -1 -1 -1 -2  0  0 -2 -1 -1 -1 -1 -1 -4
+-4 -4 -4 -4 -4 -4 -4 -4 -4 -4 -4 -4 -4 -4 -4 -4 -4 -4 -4 -4 -4 -4 -4  1
+"""
+BLOSUM62 = np.array([row.split() for row in BLOSUM62_ROWS.strip().splitlines()], dtype=np.int64)
+
+# BLOSUM62、空位罚分11+1×长度（blastp/blastx默认）对应的Karlin-Altschul参数（有空位/无空位）
+GAP_OPEN, GAP_EXTEND = 11, 1
+LAMBDA, KAPPA = 0.267, 0.041
+UNGAPPED_LAMBDA, UNGAPPED_KAPPA = 0.3176, 0.134
+# 无空位片段达到该比特分才触发有空位比对（blastx的gap trigger）
+GAP_TRIGGER_BITS = 22.0
+
+# Murphy等（2000）的10字母简化字母表：同组氨基酸在种子中视为相同，远缘同源蛋白的种子数因此大大增加
+REDUCED_GROUPS = ("LVIM", "C", "A", "G", "ST", "P", "FYW", "EDNQ", "KR", "H")
+REDUCED_SIZE = len(REDUCED_GROUPS)
+
+# blastx -outfmt "6 qseqid sseqid pident length mismatch gapopen qstart qend sstart send evalue bitscore qframe"
+OUTPUT_COLUMNS = ("qseqid", "sseqid", "pident", "length", "mismatch", "gapopen", "qstart", "qend",
+                  "sstart", "send", "evalue", "bitscore", "qframe")
+
+
+def _protein_table() -> bytes:
+    table = bytearray([X_CODE] * 256)
+    for code, aa in enumerate(AMINO_ACIDS):
+        table[ord(aa)] = code
+        table[ord(aa.lower())] = code
+    return bytes(table)
+
+
+def _reduced_table() -> np.ndarray:
+    reduced = np.full(len(AMINO_ACIDS), REDUCED_SIZE, dtype=np.int64)
+    for group, letters in enumerate(REDUCED_GROUPS):
+        for aa in letters:
+            reduced[AMINO_ACIDS.index(aa)] = group
+    return reduced
+
+
+_PROTEIN_CODES = _protein_table()
+_REDUCED = _reduced_table()
+
+
+def encode_protein(seq) -> np.ndarray:
+    """蛋白序列（str或bytes）→ AMINO_ACIDS下标（uint8）"""
+    if isinstance(seq, str):
+        seq = seq.encode("ascii", "replace")
+    return np.frombuffer(seq.translate(_PROTEIN_CODES), dtype=np.uint8)
+
+
+def reduced_kmers(codes: np.ndarray, k: int) -> np.ndarray:
+    """每个起点的简化字母表k-mer编码（10进制）；含B/Z/X/终止符的k-mer为-1"""
+    if len(codes) < k:
+        return np.zeros(0, dtype=np.int64)
+    windows = sliding_window_view(_REDUCED[codes], k)
+    packed = windows @ (REDUCED_SIZE ** np.arange(k - 1, -1, -1, dtype=np.int64))
+    packed[(windows == REDUCED_SIZE).any(axis=1)] = -1
+    return packed
+
+
+class ProteinIndex:
+    """参考蛋白的简化字母表k-mer索引（按编码直接寻址的CSR表：k-mer → (蛋白下标, 位置)）"""
+
+    def __init__(self, proteins: List[Tuple[str, str]], k: int = 4):
+        self.k = k
+        self.names = [name for name, _ in proteins]
+        self.codes = [encode_protein(seq.rstrip("*")) for _, seq in proteins]
+        self.db_length = sum(len(codes) for codes in self.codes)
+        kmers, owners, positions = [], [], []
+        for p, codes in enumerate(self.codes):
+            packed = reduced_kmers(codes, k)
+            valid = np.flatnonzero(packed >= 0)
+            kmers.append(packed[valid])
+            owners.append(np.full(len(valid), p, dtype=np.int64))
+            positions.append(valid)
+        kmers = np.concatenate(kmers) if kmers else np.zeros(0, dtype=np.int64)
+        order = np.argsort(kmers, kind="stable")
+        self.starts = np.searchsorted(kmers[order], np.arange(REDUCED_SIZE ** k + 1))
+        self.owners = np.concatenate(owners)[order] if owners else np.zeros(0, dtype=np.int64)
+        self.positions = np.concatenate(positions)[order] if positions else np.zeros(0, dtype=np.int64)
+
+    def seeds(self, codes: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """查询蛋白序列的全部种子：返回(查询位置, 参考蛋白下标, 参考位置)"""
+        packed = reduced_kmers(codes, self.k)
+        query_pos = np.flatnonzero(packed >= 0)
+        lo = self.starts[packed[query_pos]]
+        counts = self.starts[packed[query_pos] + 1] - lo
+        total = int(counts.sum())
+        if not total:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, empty
+        owner = np.repeat(np.arange(len(query_pos)), counts)
+        within = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        return query_pos[owner], self.owners[lo[owner] + within], self.positions[lo[owner] + within]
+
+
+def bit_score(raw: int) -> float:
+    return (LAMBDA * raw - math.log(KAPPA)) / math.log(2)
+
+
+def e_value(raw: int, query_length: int, db_length: int) -> float:
+    """搜索空间取读框长度（氨基酸）×参考蛋白总长，未做有效长度校正"""
+    return KAPPA * query_length * db_length * math.exp(-LAMBDA * raw)
+
+
+def ungapped_segment(query: np.ndarray, reference: np.ndarray, diag: int) -> Tuple[int, int, int]:
+    """对角线diag = s - q上BLOSUM62得分最高的无空位片段：返回(q起点, q终点, 得分)"""
+    q_lo = max(0, -diag)
+    q_hi = min(len(query), len(reference) - diag)
+    if q_hi <= q_lo:
+        return q_lo, q_lo, 0
+    prefix = np.concatenate([[0], np.cumsum(BLOSUM62[query[q_lo:q_hi], reference[q_lo + diag:q_hi + diag]])])
+    running_min = np.minimum.accumulate(prefix)
+    gain = prefix - running_min
+    end = int(np.argmax(gain))
+    start = int(np.flatnonzero(prefix[:end + 1] == running_min[end])[-1])
+    return start + q_lo, end + q_lo, int(gain[end])
+
+
+def two_hit_diagonals(q_pos: np.ndarray, ref: np.ndarray, s_pos: np.ndarray, k: int,
+                      window: int) -> np.ndarray:
+    """
+    双命中原则：同一参考蛋白、同一对角线上相距k到window个氨基酸（不重叠）的两个种子才触发延伸，
+    孤立的随机种子由此大多被排除。返回触发的(参考蛋白下标, 对角线)，形状(2, n)
+    """
+    diag = s_pos - q_pos
+    order = np.lexsort((q_pos, diag, ref))
+    q_pos, ref, diag = q_pos[order], ref[order], diag[order]
+    # 每个种子与同一对角线上、至少k个位置之前的最近种子比较（连续匹配中相邻种子彼此重叠）
+    new_group = np.concatenate([[True], (ref[1:] != ref[:-1]) | (diag[1:] != diag[:-1])])
+    group = np.cumsum(new_group)
+    key = group * (int(q_pos.max()) + k + 1) + q_pos
+    previous = np.searchsorted(key, key - k, side="right") - 1
+    paired = (previous >= 0) & (group[np.maximum(previous, 0)] == group) & \
+        (q_pos - q_pos[np.maximum(previous, 0)] <= window)
+    if not paired.any():
+        return np.zeros((2, 0), dtype=np.int64)
+    return np.unique(np.stack([ref[paired], diag[paired]]), axis=1)
+
+
+def search_frames(index: ProteinIndex, frames: List[np.ndarray], frame_length: int, max_evalue: float = 1e-3,
+                  band: int = 16, window: int = 40) -> List[Tuple[int, int, Alignment]]:
+    """
+    在六个读框的翻译上搜索参考蛋白（流程同blastx）：
+        1. 简化字母表k-mer种子按双命中原则（two_hit_diagonals）选出候选对角线；
+        2. 每条候选对角线做BLOSUM62无空位延伸，最高分片段达到GAP_TRIGGER_BITS才触发有空位比对；
+        3. 按片段得分从高到低，在其对角线 ± band带内做BLOSUM62仿射空位（11+1）局部比对，
+           片段已落在同一读框、同一参考蛋白的已有比对内（对角线在带内）时不再比对；
+        4. E值 ≤ max_evalue的比对保留。
+    返回[(读框下标, 参考蛋白下标, Alignment)]，Alignment的q坐标为读框内的氨基酸位置
+    """
+    trigger = (GAP_TRIGGER_BITS * math.log(2) + math.log(UNGAPPED_KAPPA)) / UNGAPPED_LAMBDA
+    results = []
+    for frame, query in enumerate(frames):
+        q_pos, ref, s_pos = index.seeds(query)
+        if not len(q_pos):
+            continue
+        segments = []
+        for r, diag in two_hit_diagonals(q_pos, ref, s_pos, index.k, window).T.tolist():
+            start, end, score = ungapped_segment(query, index.codes[r], diag)
+            if score >= trigger:
+                segments.append((score, r, diag, start, end))
+        segments.sort(key=lambda item: (-item[0], item[1], item[2]))
+        aligned: Dict[int, List[Alignment]] = {}
+        for _, r, diag, start, end in segments:
+            done = aligned.setdefault(r, [])
+            middle = (start + end) // 2
+            if any(hit.q_start <= middle < hit.q_end and abs(hit.s_start - hit.q_start - diag) <= band
+                   for hit in done):
+                continue
+            alignment = banded_align(query, index.codes[r], diag, band, BLOSUM62, GAP_OPEN, GAP_EXTEND, X_CODE)
+            if alignment is None:
+                continue
+            done.append(alignment)
+            if e_value(alignment.score, frame_length, index.db_length) <= max_evalue:
+                results.append((frame, r, alignment))
+    results.sort(key=lambda item: -item[2].score)
+    return results
+
+
+def search_genome(index: ProteinIndex, seq: str, table: bytes, circular: bool = False, max_evalue: float = 1e-3,
+                  band: int = 16, window: int = 40) -> List[Tuple[str, int, int, int, Alignment]]:
+    """
+    一条基因组的翻译搜索：六框翻译后调用search_frames；环状基因组翻译首尾相接的两份序列，
+    跨原点的同源区域因此完整；比对按得分从高到低，包含在同一参考蛋白、同一链上已有比对中的
+    （两份中重复出现的同一比对及在序列末端截断的比对）不再报告。
+    返回[(读框, 正链起点, 正链终点, 参考蛋白下标, Alignment)]，核酸坐标0-based半开，已取模到[0, L)的起点，
+    终点可能大于L（跨原点）
+    """
+    length = len(seq)
+    codes = encode_dna(seq)
+    linear = np.concatenate([codes, codes]) if circular else codes
+    total = len(linear)
+    frames = [encode_protein(protein) for protein in six_frames(linear, table)]
+    hits = []
+    for frame, ref, alignment in search_frames(index, frames, length // 3, max_evalue, band, window):
+        offset = frame % 3
+        nt_start = offset + 3 * alignment.q_start
+        nt_end = offset + 3 * alignment.q_end
+        if frame >= 3:
+            nt_start, nt_end = total - nt_end, total - nt_start
+        shift = (nt_start // length) * length if length else 0
+        nt_start, nt_end = nt_start - shift, nt_end - shift
+        # 环状基因组第二份中的读框编号与第一份不同（L不是3的倍数时），按取模后的坐标重新确定读框
+        strand = "+" if frame < 3 else "-"
+        frame_name = f"{strand}{(nt_start if strand == '+' else length - nt_end) % 3 + 1}"
+        if nt_end - nt_start > length or any(
+                other[3] == ref and other[0][0] == strand and other[4].s_start <= alignment.s_start
+                and alignment.s_end <= other[4].s_end
+                and any(min(nt_end, other[2] + shift) > max(nt_start, other[1] + shift)
+                        for shift in (-length, 0, length))
+                for other in hits):
+            # 两份序列末端截断的比对包含在同一区域更完整的比对中
+            continue
+        hits.append((frame_name, nt_start, nt_end, ref, alignment))
+    return hits
+
+
+def format_hit(genome_id: str, length: int, index: ProteinIndex, hit: Tuple[str, int, int, int, Alignment]) -> str:
+    """一条命中转为OUTPUT_COLUMNS的文本行（同blastx：负链读框qstart > qend；坐标1-based并取模到基因组长度）"""
+    frame, nt_start, nt_end, ref, alignment = hit
+    first, last = nt_start % length + 1, (nt_end - 1) % length + 1
+    if frame.startswith("-"):
+        first, last = last, first
+    return "\t".join([
+        genome_id, index.names[ref], f"{100.0 * alignment.matches / alignment.length:.3f}", str(alignment.length),
+        str(alignment.mismatches), str(alignment.gap_opens), str(first), str(last),
+        str(alignment.s_start + 1), str(alignment.s_end),
+        format_evalue(e_value(alignment.score, length // 3, index.db_length)),
+        format_bitscore(bit_score(alignment.score)), frame])
+
+
+def upstream_window(seq: str, frame: str, nt_start: int, nt_end: int, upstream: int,
+                    circular: bool) -> Optional[Tuple[int, int, str]]:
+    """
+    同源区域5'端上游upstream bp的启动子窗口（按基因方向，负链取反向互补）：
+    返回(窗口第一个碱基, 窗口最后一个碱基, 序列)，坐标1-based、按基因方向排列（负链时前者大于后者）；
+    线性序列上游不足时截短，完全没有上游时返回None
+    """
+    length = len(seq)
+    if frame.startswith("+"):
+        lo, hi = nt_start - upstream, nt_start
+    else:
+        lo, hi = nt_end, nt_end + upstream
+    if not circular:
+        lo, hi = max(lo, 0), min(hi, length)
+    if hi <= lo:
+        return None
+    window = (seq * 3)[lo + length:hi + length] if circular else seq[lo:hi]
+    first, last = lo % length + 1, (hi - 1) % length + 1
+    if frame.startswith("-"):
+        window = reverse_complement(window)
+        first, last = last, first
+    return first, last, window
+
+
+_WORKER: Dict[str, object] = {}
+
+
+def _init_worker(proteins: List[Tuple[str, str]], params: Dict[str, object]) -> None:
+    _WORKER["index"] = ProteinIndex(proteins, params["k"])
+    _WORKER["table"] = codon_table(params["table"])
+    _WORKER["params"] = params
+
+
+def _search_batch(batch: List[Tuple[str, str]]) -> List[Tuple[str, List[str], List[str]]]:
+    """工作进程：搜索一批基因组，返回[(基因组ID, 输出行, 启动子FASTA记录)]"""
+    index: ProteinIndex = _WORKER["index"]
+    params = _WORKER["params"]
+    results = []
+    for genome_id, seq in batch:
+        hits = search_genome(index, seq, _WORKER["table"], params["circular"], params["evalue"], params["band"],
+                             params["window"])
+        lines = [format_hit(genome_id, len(seq), index, hit) for hit in hits]
+        promoters = []
+        if params["upstream"]:
+            for frame, nt_start, nt_end, ref, _ in hits:
+                window = upstream_window(seq, frame, nt_start, nt_end, params["upstream"], params["circular"])
+                if window:
+                    first, last, window_seq = window
+                    promoters.append(f">{genome_id}_from_{first}_to_{last} protein={index.names[ref]} "
+                                     f"frame={frame}\n{window_seq}\n")
+        results.append((genome_id, lines, promoters))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="翻译蛋白搜索（类似blastx）：在基因组六框翻译上定位参考蛋白（如HBV P/S/X/C）的远缘同源区域，并提取其上游启动子")
+    parser.add_argument("--proteins", required=True, help="参考蛋白FASTA（如New/HBV_protein.faa）")
+    parser.add_argument("--genomes", nargs="+", required=True, help="基因组FASTA（如 不同物种代表性序列/*）")
+    parser.add_argument("--output", required=True, help="输出表（blastx -outfmt 6的12列 + qframe）")
+    parser.add_argument("--promoters", help="同源区域上游的启动子窗口FASTA输出")
+    parser.add_argument("--upstream", type=int, default=500, help="启动子窗口长度（默认500bp）")
+    parser.add_argument("--circular", action="store_true", help="按环状基因组处理（报告跨原点的同源区域）")
+    parser.add_argument("--table", type=int, default=1, help="遗传密码表编号（默认1）")
+    parser.add_argument("-k", type=int, default=4, help="简化字母表种子长度（默认4）")
+    parser.add_argument("--band", type=int, default=16, help="种子聚类与比对的对角线带宽（默认16）")
+    parser.add_argument("--window", type=int, default=40, help="双命中种子的最大间距（默认40个氨基酸）")
+    parser.add_argument("--evalue", type=float, default=1e-3, help="E值阈值（默认1e-3）")
+    parser.add_argument("--workers", type=int, default=1, help="并行进程数（默认1）")
+    args = parser.parse_args()
+
+    proteins = read_fasta(args.proteins)
+    params = {"k": args.k, "table": args.table, "circular": args.circular, "evalue": args.evalue, "band": args.band,
+              "window": args.window, "upstream": args.upstream if args.promoters else 0}
+    genomes = [record for path in args.genomes for record in read_fasta(path)]
+    print(f"参考蛋白 {len(proteins)} 条，基因组 {len(genomes)} 条")
+
+    t0 = time.time()
+    batches = [genomes[i:i + 4] for i in range(0, len(genomes), 4)]
+    if args.workers > 1:
+        executor = ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker, initargs=(proteins, params))
+        results = executor.map(_search_batch, batches)
+    else:
+        executor = None
+        _init_worker(proteins, params)
+        results = map(_search_batch, batches)
+    total_hits, found = 0, 0
+    promoter_out = open(args.promoters, "w", encoding="utf-8") if args.promoters else None
+    try:
+        with open(args.output, "w", encoding="utf-8") as out:
+            for batch in results:
+                for genome_id, lines, promoters in batch:
+                    out.write("".join(line + "\n" for line in lines))
+                    total_hits += len(lines)
+                    found += bool(lines)
+                    if promoter_out:
+                        promoter_out.write("".join(promoters))
+        if executor:
+            executor.shutdown()
+    finally:
+        if promoter_out:
+            promoter_out.close()
+    print(f"搜索完成（{time.time() - t0:.1f} 秒）：{found}/{len(genomes)} 条基因组有同源区域，共 {total_hits} 个比对，"
+          f"结果保存至：{args.output}")
+
+
+if __name__ == "__main__":
+    main()
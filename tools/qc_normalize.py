@@ -0,0 +1,182 @@
+import argparse
+from typing import Dict, List
+
+import numpy as np
+
+from fasta_io import BATCH_BASES, iter_fasta_batches
+
+# 碱基类别：0-3为ACGT，4为N，5为其他IUPAC简并碱基，6为非法字符（数字、"-"、"*"等）
+IUPAC_AMBIGUOUS = b"RYSWKMBDHV"
+CLASS_NAMES = ("A", "C", "G", "T", "N", "ambiguous", "invalid")
+
+
+def _class_table() -> bytes:
+    table = bytearray([6] * 256)
+    for code, bases in enumerate((b"Aa", b"Cc", b"Gg", b"Tt", b"Nn")):
+        for base in bases:
+            table[base] = code
+    for base in IUPAC_AMBIGUOUS + IUPAC_AMBIGUOUS.lower():
+        table[base] = 5
+    return bytes(table)
+
+
+def _normalize_table() -> bytes:
+    """小写转大写、IUPAC字符保留、非法字符替换为N的translate表"""
+    table = bytearray(b"N" * 256)
+    for base in b"ACGTN" + IUPAC_AMBIGUOUS:
+        table[base] = base
+        table[base + 32] = base
+    return bytes(table)
+
+
+_CLASSES = _class_table()
+_NORMALIZE = _normalize_table()
+
+# 硬性问题：记录不写入标准化输出
+HARD_FLAGS = ("empty", "duplicate_id")
+# 软性问题：只在QC表中标记，可用--exclude排除（gc_outlier需要全部记录的分布，遍历结束才能判定，只标记不排除）
+EXCLUDABLE_FLAGS = ("length_low", "length_high", "ambiguous", "n_run", "invalid_chars")
+
+
+def batch_statistics(data: np.ndarray, offsets: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    一批序列（首尾拼接的原始字节data，第i条为data[offsets[i]:offsets[i + 1]]）的逐条统计，全部向量化：
+        counts: (n, 7) 各类别碱基数（列顺序同CLASS_NAMES）
+        longest_n_run: 最长连续N（只计N，不计其他简并碱基）
+        n_runs: 连续N片段数
+    """
+    n = len(offsets) - 1
+    lengths = np.diff(offsets)
+    classes = np.frombuffer(data.tobytes().translate(_CLASSES), dtype=np.uint8)
+    owner = np.repeat(np.arange(n), lengths)
+    counts = np.bincount(owner * 7 + classes, minlength=n * 7).reshape(n, 7)
+
+    # 连续N片段：在记录边界处强制断开
+    is_n = classes == 4
+    record_start = np.zeros(len(data), dtype=bool)
+    record_start[offsets[:-1][lengths > 0]] = True
+    record_end = np.zeros(len(data), dtype=bool)
+    record_end[offsets[1:][lengths > 0] - 1] = True
+    previous_n = np.concatenate([[False], is_n[:-1]]) & ~record_start
+    next_n = np.concatenate([is_n[1:], [False]]) & ~record_end
+    starts = np.flatnonzero(is_n & ~previous_n)
+    ends = np.flatnonzero(is_n & ~next_n)
+    run_owner = owner[starts]
+    longest = np.zeros(n, dtype=np.int64)
+    np.maximum.at(longest, run_owner, ends - starts + 1)
+    return {
+        "lengths": lengths,
+        "counts": counts,
+        "longest_n_run": longest,
+        "n_runs": np.bincount(run_owner, minlength=n),
+    }
+
+
+def robust_outliers(values: np.ndarray, z: float) -> np.ndarray:
+    """稳健z分数（中位数/MAD）超过z的位置；有效值少于5个或MAD为0时不标记"""
+    flags = np.zeros(len(values), dtype=bool)
+    finite = np.isfinite(values)
+    if finite.sum() < 5:
+        return flags
+    median = np.median(values[finite])
+    mad = np.median(np.abs(values[finite] - median))
+    if mad == 0:
+        return flags
+    flags[finite] = np.abs(0.6745 * (values[finite] - median) / mad) > z
+    return flags
+
+
+def qc_normalize(fasta_path: str, output_path: str, table_path: str, min_length: int = 3000,
+                 max_length: int = 3300, gc_z: float = 3.5, max_ambiguous: float = 0.01,
+                 max_n_run: int = 50, exclude: List[str] = None, line_width: int = 60,
+                 batch_bases: int = BATCH_BASES) -> Dict[str, int]:
+    """
+    一次遍历完成标准化与QC：按批读取原始字节，translate表统一转大写、非法字符替换为N后写出标准化FASTA，
+    同一批数据上用NumPy统计碱基组成、简并碱基与N片段；GC离群需要全部记录的分布，
+    因此QC表在遍历结束后写出（只保存逐条统计量，不保留序列）。
+    有硬性问题（空序列、重复ID）的记录不写入标准化输出，exclude中的软性问题同样排除。
+    返回{标记: 记录数}（含"PASS"与"written"）
+    """
+    exclude = set(exclude or [])
+    seen = set()
+    rows = []
+    written = 0
+    with open(output_path, "w", encoding="utf-8") as out:
+        for batch in iter_fasta_batches(fasta_path, batch_bases, uppercase=False):
+            stats = batch_statistics(batch.data, batch.offsets)
+            normalized = batch.data.tobytes().translate(_NORMALIZE)
+            for i, seq_id in enumerate(batch.ids):
+                counts = stats["counts"][i]
+                length = int(stats["lengths"][i])
+                acgt = int(counts[:4].sum())
+                flags = []
+                if length == 0:
+                    flags.append("empty")
+                if seq_id in seen:
+                    flags.append("duplicate_id")
+                seen.add(seq_id)
+                if 0 < length < min_length:
+                    flags.append("length_low")
+                if length > max_length:
+                    flags.append("length_high")
+                if length and counts[5] / length > max_ambiguous:
+                    flags.append("ambiguous")
+                if stats["longest_n_run"][i] >= max_n_run:
+                    flags.append("n_run")
+                if counts[6]:
+                    flags.append("invalid_chars")
+                rows.append([seq_id, length] + counts.tolist() + [
+                    (counts[1] + counts[2]) / acgt if acgt else float("nan"),
+                    int(stats["longest_n_run"][i]), int(stats["n_runs"][i]), flags])
+                if set(flags) & (set(HARD_FLAGS) | exclude):
+                    continue
+                seq = normalized[batch.offsets[i]:batch.offsets[i + 1]]
+                out.write(f">{batch.descriptions[i]}\n")
+                if line_width > 0:
+                    for start in range(0, len(seq), line_width):
+                        out.write(seq[start:start + line_width].decode("ascii") + "\n")
+                else:
+                    out.write(seq.decode("ascii") + "\n")
+                written += 1
+
+    gc = np.array([row[9] for row in rows], dtype=np.float64)
+    gc_flags = robust_outliers(gc, gc_z)
+    summary = {"written": written}
+    with open(table_path, "w", encoding="utf-8") as f:
+        f.write("seq_id\tlength\t" + "\t".join(CLASS_NAMES) + "\tgc\tlongest_n_run\tn_runs\tflags\n")
+        for row, gc_outlier in zip(rows, gc_flags):
+            flags = row[-1] + (["gc_outlier"] if gc_outlier else [])
+            for flag in flags or ["PASS"]:
+                summary[flag] = summary.get(flag, 0) + 1
+            gc_text = f"{row[9]:.4f}" if np.isfinite(row[9]) else "NA"
+            f.write("\t".join(str(v) for v in row[:9]) + f"\t{gc_text}\t{row[10]}\t{row[11]}\t"
+                    + (",".join(flags) or "PASS") + "\n")
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="序列标准化与QC：统一大写、非法字符替换为N，统计简并碱基、N片段、长度与GC离群，一次遍历写出标准化FASTA与QC表")
+    parser.add_argument("--fasta", required=True, help="输入FASTA（如DATA.fasta）")
+    parser.add_argument("--output", required=True, help="标准化FASTA输出")
+    parser.add_argument("--table", required=True, help="QC表输出（TSV）")
+    parser.add_argument("--min-length", type=int, default=3000, help="长度下限（默认3000，嗜肝DNA病毒基因组约3.0-3.3kb）")
+    parser.add_argument("--max-length", type=int, default=3300, help="长度上限（默认3300）")
+    parser.add_argument("--gc-z", type=float, default=3.5, help="GC含量稳健z分数阈值（默认3.5）")
+    parser.add_argument("--max-ambiguous", type=float, default=0.01, help="N以外简并碱基比例上限（默认0.01）")
+    parser.add_argument("--max-n-run", type=int, default=50, help="连续N长度达到该值即标记（默认50）")
+    parser.add_argument("--exclude", nargs="*", default=[], choices=EXCLUDABLE_FLAGS,
+                        help="带有这些标记的记录不写入标准化输出（空序列、重复ID总是排除）")
+    parser.add_argument("--line-width", type=int, default=60, help="序列换行宽度（默认60，0表示不换行）")
+    args = parser.parse_args()
+
+    summary = qc_normalize(args.fasta, args.output, args.table, args.min_length, args.max_length, args.gc_z,
+                           args.max_ambiguous, args.max_n_run, args.exclude, args.line_width)
+    written = summary.pop("written")
+    passed = summary.pop("PASS", 0)
+    details = "，".join(f"{flag} {count}" for flag, count in sorted(summary.items()))
+    print(f"通过 {passed} 条{('；' + details) if details else ''}")
+    print(f"标准化序列 {written} 条已保存至：{args.output}，QC表：{args.table}")
+
+
+if __name__ == "__main__":
+    main()
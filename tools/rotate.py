@@ -0,0 +1,269 @@
+import argparse
+import sys
+from typing import Dict, Iterator, Optional, Tuple
+
+import numpy as np
+
+from fasta_io import encode_dna, iter_fasta, read_fasta
+from kmer_index import kmer_codes
+from liftover import Hit, read_hit_table
+
+# 直接寻址的锚点表大小为4^k（k=12时64 MB），k不宜更大
+MAX_K = 12
+# 锚点表中的特殊值：不在参考中 / 在参考中出现多次（不作为锚点）
+ABSENT, REPEATED = -1, -2
+OFFSET_COLUMNS = ("seq_id", "length", "strand", "offset", "method", "anchor_ref_pos", "votes")
+
+
+_COMPLEMENT = str.maketrans("ACGTRYKMBDHVNacgtrykmbdhvn", "TGCAYRMKVHDBNtgcayrmkvhdbn")
+
+
+def reverse_complement(seq: str) -> str:
+    return seq.translate(_COMPLEMENT)[::-1]
+
+
+def reverse_complement_codes(codes: np.ndarray) -> np.ndarray:
+    """碱基编码的反向互补（N等仍为4）"""
+    return np.where(codes > 3, 4, 3 - np.minimum(codes, 3))[::-1].astype(np.uint8)
+
+
+def circular_kmers(codes: np.ndarray, k: int) -> np.ndarray:
+    """环状序列每个起点（共len(codes)个，跨原点的k-mer也计入）的k-mer编码"""
+    if len(codes) < k:
+        return np.zeros(0, dtype=np.uint64)
+    return kmer_codes(np.concatenate([codes, codes[:k - 1]]), k)
+
+
+def least_rotation(seq: bytes) -> int:
+    """Booth算法：字典序最小旋转的起点，O(n)"""
+    doubled = seq + seq
+    n = len(seq)
+    failure = [-1] * len(doubled)
+    k = 0
+    for j in range(1, len(doubled)):
+        c = doubled[j]
+        i = failure[j - k - 1]
+        while i != -1 and c != doubled[k + i + 1]:
+            if c < doubled[k + i + 1]:
+                k = j - i - 1
+            i = failure[i]
+        if c != doubled[k + i + 1]:
+            # 此时i == -1
+            if c < doubled[k]:
+                k = j
+            failure[j - k] = -1
+        else:
+            failure[j - k] = i + 1
+    return k % n if n else 0
+
+
+class Rotation:
+    """
+    一条环状基因组的旋转：strand为"-"时先取反向互补，再从offset（0-based）处切开，
+    即旋转后序列 = s[offset:] + s[:offset]（s为原序列或其反向互补）
+    """
+    __slots__ = ("seq_id", "length", "strand", "offset")
+
+    def __init__(self, seq_id: str, length: int, strand: str, offset: int):
+        self.seq_id = seq_id
+        self.length = length
+        self.strand = strand
+        self.offset = offset
+
+    def to_original(self, start: int, end: int) -> Tuple[int, int, bool]:
+        """
+        旋转后坐标[start, end)（0-based半开）→ 原序列坐标，返回(起点, 终点, 是否翻转链)
+        起点取模到[0, L)，终点 = 起点 + 宽度（跨原点时终点 > L，与liftover.py一致）
+        """
+        width = end - start
+        if self.strand == "+":
+            new_start = (self.offset + start) % self.length
+        else:
+            new_start = (self.length - (self.offset + start) % self.length - width) % self.length
+        return new_start, new_start + width, self.strand == "-"
+
+    def to_rotated(self, start: int, end: int) -> Tuple[int, int, bool]:
+        """原序列坐标 → 旋转后坐标，返回值同to_original"""
+        width = end - start
+        if self.strand == "+":
+            new_start = (start - self.offset) % self.length
+        else:
+            new_start = (self.length - end - self.offset) % self.length
+        return new_start, new_start + width, self.strand == "-"
+
+
+class AnchorTable:
+    """
+    参考基因组（已旋转到指定原点）的保守k-mer锚点表：按k-mer打包编码直接寻址，
+    值为该k-mer在参考上的唯一位置；参考中出现多次的k-mer不作为锚点
+    """
+
+    def __init__(self, reference: np.ndarray, k: int = 11):
+        if not 1 <= k <= MAX_K:
+            raise ValueError(f"k必须在1-{MAX_K}之间：{k}")
+        self.k = k
+        self.length = len(reference)
+        self.table = np.full(4 ** k, ABSENT, dtype=np.int32)
+        kmers = circular_kmers(reference, k)
+        positions = np.flatnonzero(kmers != np.uint64(0xFFFFFFFFFFFFFFFF))
+        kmers = kmers[positions].astype(np.int64)
+        unique, counts = np.unique(kmers, return_counts=True)
+        self.table[kmers] = positions
+        self.table[unique[counts > 1]] = REPEATED
+        self.anchors = int((counts == 1).sum())
+
+    def matches(self, codes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """环状序列与参考的全部唯一锚点匹配：返回(序列位置, 参考位置)"""
+        kmers = circular_kmers(codes, self.k)
+        valid = np.flatnonzero(kmers != np.uint64(0xFFFFFFFFFFFFFFFF))
+        ref_pos = self.table[kmers[valid].astype(np.int64)]
+        hit = ref_pos >= 0
+        return valid[hit], ref_pos[hit].astype(np.int64)
+
+    def locate(self, codes: np.ndarray, tolerance: int) -> Tuple[int, int, int]:
+        """
+        在环状序列上定位参考原点：全部锚点匹配按对角线 (序列位置 - 参考位置) mod L 投票，
+        窗口宽度2×tolerance+1（容纳插入缺失造成的对角线漂移）内票数最多的对角线为主对角线；
+        主对角线上离参考原点最近（环状距离）的锚点决定原点位置。
+        返回(原点在序列上的位置, 所用锚点的参考位置, 票数)；没有匹配时票数为0
+        """
+        length = len(codes)
+        seq_pos, ref_pos = self.matches(codes)
+        if not len(seq_pos):
+            return 0, -1, 0
+        diagonal = (seq_pos - ref_pos) % length
+        votes = np.bincount(diagonal, minlength=length)
+        # 环状滑动窗口求和
+        padded = np.concatenate([votes[-tolerance:] if tolerance else votes[:0], votes, votes[:tolerance]])
+        window = np.convolve(padded, np.ones(2 * tolerance + 1, dtype=np.int64), mode="valid")
+        best = int(np.argmax(window))
+        distance = np.abs(diagonal - best)
+        on_diagonal = np.minimum(distance, length - distance) <= tolerance
+        # 参考位置超过一半的锚点视为位于原点之前（负偏移）
+        signed = np.where(ref_pos[on_diagonal] > self.length // 2, ref_pos[on_diagonal] - self.length,
+                          ref_pos[on_diagonal])
+        nearest = int(np.argmin(np.abs(signed)))
+        origin = int(seq_pos[on_diagonal][nearest] - signed[nearest]) % length
+        return origin, int(ref_pos[on_diagonal][nearest]), int(window[best])
+
+
+def rotate_genome(seq_id: str, seq: str, anchors: Optional[AnchorTable], tolerance: int = 30,
+                  min_votes: int = 3) -> Tuple[Rotation, str, str, int, int]:
+    """
+    确定一条环状基因组的旋转：正链与反向互补各做一次锚点投票，取票数多者；
+    票数不足min_votes（或未提供参考）时退回Booth算法的字典序最小旋转（正链）。
+    返回(Rotation, 旋转后序列, 方法, 锚点参考位置, 票数)
+    """
+    codes = encode_dna(seq)
+    best = None
+    if anchors is not None and len(codes) >= anchors.k:
+        for strand, strand_codes in (("+", codes), ("-", reverse_complement_codes(codes))):
+            origin, ref_pos, votes = anchors.locate(strand_codes, tolerance)
+            if best is None or votes > best[3]:
+                best = (strand, origin, ref_pos, votes)
+    if best is not None and best[3] >= min_votes:
+        strand, offset, ref_pos, votes = best
+        method = "anchor"
+    else:
+        strand, offset, ref_pos, votes, method = "+", least_rotation(seq.encode("ascii", "replace")), -1, 0, "booth"
+    oriented = seq if strand == "+" else reverse_complement(seq)
+    return Rotation(seq_id, len(seq), strand, offset), oriented[offset:] + oriented[:offset], method, ref_pos, votes
+
+
+def read_offsets(path: str) -> Dict[str, Rotation]:
+    """读取rotate输出的偏移表"""
+    rotations: Dict[str, Rotation] = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            parts = line.rstrip("\n").split("\t")
+            if len(parts) < 4 or parts[0] == "seq_id":
+                continue
+            rotations[parts[0]] = Rotation(parts[0], int(parts[1]), parts[2], int(parts[3]))
+    return rotations
+
+
+def lift_rotated_hits(hits: Iterator[Hit], rotations: Dict[str, Rotation], to_original: bool = True) -> Iterator[Hit]:
+    """把统一命中表在旋转坐标与原坐标之间换算；反向互补旋转的基因组同时翻转命中的链"""
+    missing = set()
+    for hit in hits:
+        rotation = rotations.get(hit.seq_id)
+        if rotation is None:
+            if hit.seq_id not in missing:
+                print(f"跳过序列 {hit.seq_id} → 偏移表中没有该序列")
+                missing.add(hit.seq_id)
+            continue
+        convert = rotation.to_original if to_original else rotation.to_rotated
+        start, end, flipped = convert(hit.start, hit.end)
+        strand = {"+": "-", "-": "+"}.get(hit.strand, hit.strand) if flipped else hit.strand
+        yield Hit(hit.seq_id, start, end, hit.motif, strand, hit.score)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="环状基因组旋转到统一原点（保守k-mer锚点，无锚点时用Booth字典序最小旋转），并可将坐标换算回原序列")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    rotate_parser = subparsers.add_parser("rotate", help="旋转基因组，输出旋转后FASTA与偏移表")
+    rotate_parser.add_argument("--fasta", required=True, help="环状基因组FASTA（如DATA.fasta、Human.fasta）")
+    rotate_parser.add_argument("--reference", help="参考基因组FASTA（不提供时全部使用字典序最小旋转）")
+    rotate_parser.add_argument("--reference-id", help="参考序列ID（默认第一条）")
+    rotate_parser.add_argument("--origin", type=int, default=1, help="参考上作为原点的位置（1-based，默认1，如HBV的EcoRI位点）")
+    rotate_parser.add_argument("--output", required=True, help="旋转后的FASTA")
+    rotate_parser.add_argument("--offsets", required=True, help="偏移表（seq_id length strand offset method anchor_ref_pos votes）")
+    rotate_parser.add_argument("-k", type=int, default=11, help=f"锚点k-mer长度（默认11，最大{MAX_K}）")
+    rotate_parser.add_argument("--tolerance", type=int, default=30, help="对角线投票窗口半宽（默认30bp，容纳插入缺失）")
+    rotate_parser.add_argument("--min-votes", type=int, default=3, help="锚点票数下限，不足时退回字典序最小旋转（默认3）")
+    rotate_parser.add_argument("--line-width", type=int, default=60, help="序列换行宽度（默认60，0表示不换行）")
+
+    lift_parser = subparsers.add_parser("lift", help="统一命中表坐标换算")
+    lift_parser.add_argument("--offsets", required=True, help="rotate输出的偏移表")
+    lift_parser.add_argument("--hits", required=True, help="统一命中表（seq_id start end motif strand score）")
+    lift_parser.add_argument("--to", choices=["original", "rotated"], default="original",
+                             help="换算方向（默认旋转坐标 → 原坐标）")
+    lift_parser.add_argument("--output", default="-")
+
+    args = parser.parse_args()
+    if args.command == "rotate":
+        anchors = None
+        if args.reference:
+            references = read_fasta(args.reference)
+            chosen = [seq for seq_id, seq in references if seq_id == args.reference_id] if args.reference_id \
+                else [seq for _, seq in references[:1]]
+            if not chosen:
+                print(f"错误：参考FASTA中没有序列 {args.reference_id or ''}")
+                sys.exit(1)
+            reference = chosen[0]
+            origin = (args.origin - 1) % len(reference)
+            anchors = AnchorTable(encode_dna(reference[origin:] + reference[:origin]), args.k)
+            print(f"参考长度 {anchors.length} bp，唯一锚点k-mer {anchors.anchors} 个")
+
+        methods: Dict[str, int] = {}
+        with open(args.output, "w", encoding="utf-8") as out, open(args.offsets, "w", encoding="utf-8") as table:
+            table.write("\t".join(OFFSET_COLUMNS) + "\n")
+            for record in iter_fasta(args.fasta):
+                rotation, rotated, method, ref_pos, votes = rotate_genome(
+                    record.id, record.sequence, anchors, args.tolerance, args.min_votes)
+                methods[method] = methods.get(method, 0) + 1
+                table.write(f"{record.id}\t{rotation.length}\t{rotation.strand}\t{rotation.offset}\t{method}\t"
+                            f"{ref_pos}\t{votes}\n")
+                out.write(f">{record.description}\n")
+                if args.line_width > 0:
+                    for start in range(0, len(rotated), args.line_width):
+                        out.write(rotated[start:start + args.line_width] + "\n")
+                else:
+                    out.write(rotated + "\n")
+        details = "，".join(f"{method} {count}" for method, count in sorted(methods.items()))
+        print(f"旋转完成（{details}），序列保存至：{args.output}，偏移表：{args.offsets}")
+    else:
+        rotations = read_offsets(args.offsets)
+        out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+        try:
+            out.write("seq_id\tstart\tend\tmotif\tstrand\tscore\n")
+            for hit in lift_rotated_hits(read_hit_table(args.hits), rotations, args.to == "original"):
+                out.write(f"{hit.seq_id}\t{hit.start}\t{hit.end}\t{hit.motif}\t{hit.strand}\t{hit.score:.3f}\n")
+        finally:
+            if out is not sys.stdout:
+                out.close()
+
+
+if __name__ == "__main__":
+    main()
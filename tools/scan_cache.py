@@ -0,0 +1,132 @@
+import hashlib
+import os
+import sqlite3
+import time
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+from motifs import MotifBank
+
+# 命中结果的格式或打分方法变化时递增，旧缓存条目随之失效
+SCAN_VERSION = 1
+# 每个条目在命中数组之外计入的大小（两个摘要与SQLite行开销的近似值），没有命中的序列也占用缓存空间
+ENTRY_OVERHEAD = 96
+# 缓存中每条序列的命中列表（motif为MotifBank中的下标，起点0-based）
+CACHED_HIT_DTYPE = np.dtype([("motif", "<i4"), ("start", "<i4"), ("strand", "i1"), ("score", "<f4")])
+
+
+def sequence_digest(seq: str) -> str:
+    """序列内容摘要（大写后计算，大小写不同的相同序列共用一个条目）"""
+    return hashlib.blake2b(seq.upper().encode("ascii", "replace"), digest_size=16).hexdigest()
+
+
+def library_digest(bank: MotifBank, thresholds: np.ndarray) -> str:
+    """motif库（ID、宽度、PWM数值）+ 各motif阈值 + SCAN_VERSION的摘要，任一项变化即对应不同的缓存空间"""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"v{SCAN_VERSION}\n".encode())
+    h.update("\n".join(bank.ids).encode("utf-8"))
+    h.update(np.ascontiguousarray(bank.widths, dtype=np.int64).tobytes())
+    h.update(np.ascontiguousarray(bank.pwm).tobytes())
+    h.update(np.ascontiguousarray(thresholds, dtype=np.float64).tobytes())
+    return h.hexdigest()
+
+
+def deduplicate(records: Iterable[Tuple[str, str]]) -> Tuple[List[Tuple[str, str]], List[str]]:
+    """
+    按序列摘要去重：返回([(摘要, 序列)]（每种序列一条，按首次出现顺序）, 与records逐条对应的摘要列表)
+    摘要按记录位置而非序列ID对应，同名但序列不同的记录各自保留自己的结果
+    """
+    unique: Dict[str, str] = {}
+    owners: List[str] = []
+    for _, seq in records:
+        digest = sequence_digest(seq)
+        unique.setdefault(digest, seq)
+        owners.append(digest)
+    return list(unique.items()), owners
+
+
+class ScanCache:
+    """
+    逐条序列扫描结果的持久化缓存（SQLite单文件），键为(序列摘要, motif库摘要)，值为命中数组的字节串：
+        写入后总大小超过max_bytes时按最近使用时间淘汰最久未用的条目（LRU），命中缓存时刷新使用时间；
+        以WAL模式打开，多个进程可同时读写同一缓存文件
+    """
+
+    def __init__(self, path: str, max_bytes: int = 256 << 20):
+        self.path = path
+        self.max_bytes = max_bytes
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path, timeout=60)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""CREATE TABLE IF NOT EXISTS scans (
+            sequence TEXT NOT NULL, library TEXT NOT NULL, hits BLOB NOT NULL,
+            size INTEGER NOT NULL, last_used INTEGER NOT NULL, PRIMARY KEY (sequence, library))""")
+        self.db.execute("CREATE INDEX IF NOT EXISTS scans_last_used ON scans (last_used)")
+        self.db.commit()
+
+    def close(self) -> None:
+        self.db.close()
+
+    def __enter__(self) -> "ScanCache":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def get_many(self, library: str, digests: List[str]) -> Dict[str, np.ndarray]:
+        """批量查询，返回{序列摘要: 命中数组}（只含缓存中已有的），并刷新这些条目的使用时间"""
+        found: Dict[str, np.ndarray] = {}
+        for i in range(0, len(digests), 500):
+            part = digests[i:i + 500]
+            rows = self.db.execute(
+                f"SELECT sequence, hits FROM scans WHERE library = ? AND sequence IN ({','.join('?' * len(part))})",
+                [library] + part).fetchall()
+            for digest, blob in rows:
+                found[digest] = np.frombuffer(blob, dtype=CACHED_HIT_DTYPE)
+        if found:
+            now = time.time_ns()
+            self.db.executemany("UPDATE scans SET last_used = ? WHERE sequence = ? AND library = ?",
+                                [(now, digest, library) for digest in found])
+            self.db.commit()
+        return found
+
+    def put_many(self, library: str, results: Dict[str, np.ndarray]) -> None:
+        """批量写入，写入后按max_bytes做LRU淘汰"""
+        now = time.time_ns()
+        rows = []
+        for digest, hits in results.items():
+            blob = hits.astype(CACHED_HIT_DTYPE).tobytes()
+            rows.append((digest, library, blob, len(blob) + ENTRY_OVERHEAD, now))
+        self.db.executemany(
+            "INSERT OR REPLACE INTO scans (sequence, library, hits, size, last_used) VALUES (?, ?, ?, ?, ?)", rows)
+        self.db.commit()
+        self.evict()
+
+    def size(self) -> int:
+        return int(self.db.execute("SELECT COALESCE(SUM(size), 0) FROM scans").fetchone()[0])
+
+    def evict(self) -> int:
+        """淘汰最久未用的条目直至总大小不超过max_bytes，返回淘汰条数"""
+        excess = self.size() - self.max_bytes
+        if excess <= 0:
+            return 0
+        removed, freed = [], 0
+        for rowid, size in self.db.execute("SELECT rowid, size FROM scans ORDER BY last_used"):
+            removed.append((rowid,))
+            freed += size
+            if freed >= excess:
+                break
+        self.db.executemany("DELETE FROM scans WHERE rowid = ?", removed)
+        self.db.commit()
+        return len(removed)
+
+
+def pack_hits(motif: np.ndarray, start: np.ndarray, strand: np.ndarray, score: np.ndarray) -> np.ndarray:
+    hits = np.empty(len(motif), dtype=CACHED_HIT_DTYPE)
+    hits["motif"] = motif
+    hits["start"] = start
+    hits["strand"] = strand
+    hits["score"] = score
+    return hits
@@ -0,0 +1,267 @@
+import argparse
+import heapq
+import json
+import mmap
+import os
+import shutil
+import time
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+
+from fasta_io import _DNA_CODES, fasta_offsets
+from motifs import MotifBank, read_motif_file
+
+# 溢写到磁盘的命中记录（每个run内按(seq, start, motif, strand)排序）
+HIT_DTYPE = np.dtype([("seq", np.int32), ("start", np.int64), ("motif", np.int32),
+                      ("strand", np.int8), ("score", np.float32)])
+CHECKPOINT_FILE = "checkpoint.json"
+# 分块打分时每个位置的峰值内存：正、负链得分及一个临时数组（字节/motif），以及窗口one-hot矩阵（字节/motif宽度列）
+BYTES_PER_CELL = 12
+BYTES_PER_ONEHOT_COLUMN = 40
+
+
+def index_fasta(path: str) -> List[Tuple[str, int, int]]:
+    """
+    通过内存映射扫描FASTA，返回每条记录的(序列ID, 序列原始字节起点, 终点)，不把序列读入内存
+    原始字节范围内含换行符，扫描时再去除
+    """
+    records: List[Tuple[str, int, int]] = []
+    if os.path.getsize(path) == 0:
+        return records
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for header_start, seq_start, seq_end in fasta_offsets(mm):
+            header = mm[header_start:seq_start].decode("utf-8", errors="replace").split()
+            records.append((header[0] if header else "", seq_start, seq_end))
+    return records
+
+
+def iter_chunks(mm: mmap.mmap, start: int, end: int, chunk_bytes: int, offset: int = 0) -> Iterator[Tuple[int, np.ndarray]]:
+    """
+    从记录的原始字节范围[start, end)按固定大小分块读取（从相对起点offset处开始），去除换行后编码为0-4
+    逐块产出(下一块的原始字节偏移, 本块碱基编码)
+    """
+    pos = start + offset
+    while pos < end:
+        stop = min(pos + chunk_bytes, end)
+        raw = mm[pos:stop].translate(None, b"\r\n \t")
+        pos = stop
+        yield pos - start, np.frombuffer(raw.translate(_DNA_CODES), dtype=np.uint8)
+
+
+class HitSpiller:
+    """
+    命中缓冲区：超过容量时排序后溢写为一个run（<runs目录>/run_00000.npy），最后多路归并为有序的命中表
+    """
+
+    def __init__(self, run_dir: str, capacity: int, runs: List[str] = None):
+        self.run_dir = run_dir
+        self.capacity = max(1, capacity)
+        self.runs = list(runs or [])
+        self.parts: List[np.ndarray] = []
+        self.size = 0
+        os.makedirs(run_dir, exist_ok=True)
+
+    def add(self, hits: np.ndarray) -> None:
+        if len(hits):
+            self.parts.append(hits)
+            self.size += len(hits)
+            if self.size >= self.capacity:
+                self.spill()
+
+    def spill(self) -> None:
+        if not self.size:
+            return
+        hits = np.concatenate(self.parts)
+        hits = hits[np.lexsort((hits["strand"], hits["motif"], hits["start"], hits["seq"]))]
+        path = os.path.join(self.run_dir, f"run_{len(self.runs):05d}.npy")
+        np.save(path, hits)
+        self.runs.append(os.path.basename(path))
+        self.parts, self.size = [], 0
+
+    def merged(self, block: int = 1 << 16) -> Iterator[tuple]:
+        """对全部run做多路归并，按(seq, start, motif, strand)顺序逐条产出"""
+        def iter_run(name):
+            data = np.load(os.path.join(self.run_dir, name), mmap_mode="r")
+            for i in range(0, len(data), block):
+                yield from data[i:i + block].tolist()
+        return heapq.merge(*(iter_run(name) for name in self.runs), key=lambda row: row[:4])
+
+
+def chunk_hits(bank: MotifBank, thresholds: np.ndarray, codes: np.ndarray, buffer_start: int,
+               carry: int, seq_index: int, seq_length: int = -1) -> np.ndarray:
+    """
+    对一个分块（前carry个碱基为上一块末尾的重叠部分）打分，返回达到阈值的命中。
+    只输出终点落在本块新数据中的窗口（起点s满足 s + w > carry），重叠部分已完整打分的窗口不重复输出；
+    seq_length ≥ 0时（环状基因组补上的首部）丢弃起点超出原序列长度的窗口
+    """
+    forward, reverse = bank.score_windows(codes)
+    positions = np.arange(len(codes))
+    fresh = positions[None, :] > (carry - bank.widths)[:, None]
+    if seq_length >= 0:
+        fresh &= (buffer_start + positions)[None, :] < seq_length
+    parts = []
+    for strand, scores in ((0, forward), (1, reverse)):
+        motif_idx, start_idx = np.nonzero((scores >= thresholds[:, None]) & fresh)
+        hits = np.empty(len(motif_idx), dtype=HIT_DTYPE)
+        hits["seq"] = seq_index
+        hits["start"] = buffer_start + start_idx
+        hits["motif"] = motif_idx
+        hits["strand"] = strand
+        hits["score"] = scores[motif_idx, start_idx]
+        parts.append(hits)
+    return np.concatenate(parts)
+
+
+class StreamScanner:
+    """
+    分块、内存受限的全motif扫描：
+        FASTA以内存映射方式按记录、按固定大小分块读取，相邻块重叠（最大motif宽度 - 1）个碱基；
+        块大小由内存预算决定（打分矩阵 ≈ 12字节 × motif数 × 块长，另加窗口one-hot矩阵），命中缓冲区也按预算溢写为有序run；
+        每处理checkpoint_every个块强制溢写并写检查点（文件指纹、参数、当前记录与字节偏移、重叠碱基、run列表），
+        中断后以相同参数重新运行即从检查点继续
+    """
+
+    def __init__(self, bank: MotifBank, thresholds: np.ndarray, work_dir: str, memory_mb: int = 512,
+                 checkpoint_every: int = 50, circular: bool = False):
+        self.bank = bank
+        self.thresholds = thresholds
+        self.work_dir = work_dir
+        self.circular = circular
+        self.checkpoint_every = checkpoint_every
+        budget = memory_mb * (1 << 20)
+        per_base = BYTES_PER_CELL * len(bank) + BYTES_PER_ONEHOT_COLUMN * bank.max_width
+        self.chunk_bases = max(4 * bank.max_width, budget // 2 // per_base)
+        self.hit_capacity = max(1024, budget // 4 // HIT_DTYPE.itemsize)
+        self.overlap = bank.max_width - 1
+        os.makedirs(work_dir, exist_ok=True)
+
+    def _checkpoint_path(self) -> str:
+        return os.path.join(self.work_dir, CHECKPOINT_FILE)
+
+    def _load_checkpoint(self, signature: Dict[str, object]) -> Dict[str, object]:
+        path = self._checkpoint_path()
+        if not os.path.exists(path):
+            return {}
+        with open(path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        if state.get("signature") != signature:
+            print("检查点与当前输入或参数不一致，重新开始扫描")
+            return {}
+        return state
+
+    def _save_checkpoint(self, signature, spiller: HitSpiller, position: Dict[str, object]) -> None:
+        spiller.spill()
+        state = {"signature": signature, "runs": spiller.runs, **position}
+        tmp_path = self._checkpoint_path() + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self._checkpoint_path())
+
+    def scan(self, fasta_paths: List[str], signature: Dict[str, object]) -> Tuple[List[str], HitSpiller]:
+        """扫描全部FASTA，返回(全局序列ID列表, 保存全部run的HitSpiller)"""
+        state = self._load_checkpoint(signature)
+        if not state:
+            for name in os.listdir(self.work_dir):
+                if name.startswith("run_") and name.endswith(".npy"):
+                    os.remove(os.path.join(self.work_dir, name))
+        spiller = HitSpiller(self.work_dir, self.hit_capacity, state.get("runs"))
+        seq_names: List[str] = []
+        chunks_since_checkpoint = 0
+        resume_seq = state.get("seq_index", 0)
+        if state:
+            print(f"从检查点继续：第 {resume_seq + 1} 条序列，字节偏移 {state.get('offset', 0)}")
+
+        for path in fasta_paths:
+            records = index_fasta(path)
+            if not records:
+                continue
+            with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                for seq_id, start, end in records:
+                    seq_index = len(seq_names)
+                    seq_names.append(seq_id)
+                    if seq_index < resume_seq:
+                        continue
+                    offset, buffer_start, carry_codes, head = 0, 0, np.zeros(0, dtype=np.uint8), np.zeros(0, dtype=np.uint8)
+                    if seq_index == resume_seq and state:
+                        offset = state["offset"]
+                        buffer_start = state["buffer_start"]
+                        carry_codes = np.array(state["carry"], dtype=np.uint8)
+                        head = np.array(state["head"], dtype=np.uint8)
+                    for offset, codes in iter_chunks(mm, start, end, self.chunk_bases, offset):
+                        if len(head) < self.overlap:
+                            head = np.concatenate([head, codes[:self.overlap - len(head)]])
+                        buffer = np.concatenate([carry_codes, codes])
+                        spiller.add(chunk_hits(self.bank, self.thresholds, buffer, buffer_start, len(carry_codes), seq_index))
+                        keep = min(self.overlap, len(buffer))
+                        buffer_start += len(buffer) - keep
+                        carry_codes = buffer[len(buffer) - keep:]
+                        chunks_since_checkpoint += 1
+                        if chunks_since_checkpoint >= self.checkpoint_every:
+                            self._save_checkpoint(signature, spiller, {
+                                "seq_index": seq_index, "offset": offset, "buffer_start": buffer_start,
+                                "carry": carry_codes.tolist(), "head": head.tolist()})
+                            chunks_since_checkpoint = 0
+                    if self.circular and len(head):
+                        # 环状基因组：末尾重叠部分接上序列开头，补扫跨越原点的窗口
+                        seq_length = buffer_start + len(carry_codes)
+                        buffer = np.concatenate([carry_codes, head])
+                        spiller.add(chunk_hits(self.bank, self.thresholds, buffer, buffer_start,
+                                               len(carry_codes), seq_index, seq_length))
+                    if chunks_since_checkpoint >= self.checkpoint_every:
+                        self._save_checkpoint(signature, spiller, {
+                            "seq_index": seq_index + 1, "offset": 0, "buffer_start": 0, "carry": [], "head": []})
+                        chunks_since_checkpoint = 0
+        spiller.spill()
+        return seq_names, spiller
+
+
+def input_signature(fasta_paths: List[str], motif_path: str, params: Dict[str, object]) -> Dict[str, object]:
+    files = {}
+    for path in fasta_paths + [motif_path]:
+        stat = os.stat(path)
+        files[os.path.abspath(path)] = [stat.st_size, stat.st_mtime_ns]
+    return {"files": files, "fasta_order": [os.path.abspath(p) for p in fasta_paths], "params": params}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="大规模基因组集合的分块、内存受限motif扫描（内存映射、检查点续扫、命中有序溢写）")
+    parser.add_argument("fasta", nargs="+", help="基因组FASTA文件（可多个，可很大）")
+    parser.add_argument("--motifs", required=True, help="motif库（MEME/JASPAR/HOMER格式，自动识别）")
+    parser.add_argument("--output", required=True, help="输出命中表（seq_id start end motif strand score，0-based半开区间）")
+    parser.add_argument("--threshold", type=float, default=0.85, help="相对得分阈值（默认0.85）")
+    parser.add_argument("--memory-mb", type=int, default=512, help="内存预算（MB，默认512）")
+    parser.add_argument("--checkpoint-every", type=int, default=50, help="每处理多少个分块写一次检查点（默认50）")
+    parser.add_argument("--circular", action="store_true", help="按环状基因组处理，补扫跨越原点的窗口")
+    parser.add_argument("--work-dir", help="run文件与检查点目录（默认<输出文件>.runs）")
+    parser.add_argument("--keep-runs", action="store_true", help="完成后保留run文件与检查点")
+    args = parser.parse_args()
+
+    t0 = time.time()
+    motifs = read_motif_file(args.motifs)
+    bank = MotifBank(motifs)
+    thresholds = bank.thresholds(args.threshold)
+    work_dir = args.work_dir or args.output + ".runs"
+    scanner = StreamScanner(bank, thresholds, work_dir, args.memory_mb, args.checkpoint_every, args.circular)
+    print(f"{len(bank)} 个motif（最大宽度 {bank.max_width}），分块 {scanner.chunk_bases} bp，"
+          f"命中缓冲 {scanner.hit_capacity} 条")
+    signature = input_signature(args.fasta, args.motifs, {
+        "threshold": args.threshold, "memory_mb": args.memory_mb, "circular": args.circular,
+        "checkpoint_every": args.checkpoint_every})
+    seq_names, spiller = scanner.scan(args.fasta, signature)
+
+    count = 0
+    widths = bank.widths
+    with open(args.output, "w", encoding="utf-8") as f:
+        f.write("seq_id\tstart\tend\tmotif\tstrand\tscore\n")
+        for seq, start, motif, strand, score in spiller.merged():
+            f.write(f"{seq_names[seq]}\t{start}\t{start + widths[motif]}\t{bank.ids[motif]}\t"
+                    f"{'-' if strand else '+'}\t{score:.3f}\n")
+            count += 1
+    if not args.keep_runs:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    print(f"扫描完成（{time.time() - t0:.1f} 秒）：{len(seq_names)} 条序列，{count} 个命中 → {args.output}")
+
+
+if __name__ == "__main__":
+    main()
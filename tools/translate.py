@@ -0,0 +1,237 @@
+import argparse
+import itertools
+import time
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+
+from fasta_io import BATCH_BASES, encode_dna, iter_fasta, iter_fasta_batches
+
+# NCBI遗传密码表：密码子按TCAG顺序排列（TTT, TTC, TTA, TTG, TCT, ...）时对应的氨基酸
+GENETIC_CODES: Dict[int, Tuple[str, str]] = {
+    1: ("Standard", "FFLLSSSSYY**CC*WLLLLPPPPHHQQRRRRIIIMTTTTNNKKSSRRVVVVAAAADDEEGGGG"),
+    2: ("Vertebrate Mitochondrial", "FFLLSSSSYY**CC*WLLLLPPPPHHQQRRRRIIMMTTTTNNKKSS**VVVVAAAADDEEGGGG"),
+    3: ("Yeast Mitochondrial", "FFLLSSSSYY**CCWWTTTTPPPPHHQQRRRRIIMMTTTTNNKKSSRRVVVVAAAADDEEGGGG"),
+    4: ("Mold/Protozoan Mitochondrial; Mycoplasma", "FFLLSSSSYY**CCWWLLLLPPPPHHQQRRRRIIIMTTTTNNKKSSRRVVVVAAAADDEEGGGG"),
+    5: ("Invertebrate Mitochondrial", "FFLLSSSSYY**CCWWLLLLPPPPHHQQRRRRIIMMTTTTNNKKSSSSVVVVAAAADDEEGGGG"),
+    6: ("Ciliate Nuclear", "FFLLSSSSYYQQCC*WLLLLPPPPHHQQRRRRIIIMTTTTNNKKSSRRVVVVAAAADDEEGGGG"),
+    11: ("Bacterial, Archaeal and Plant Plastid", "FFLLSSSSYY**CC*WLLLLPPPPHHQQRRRRIIIMTTTTNNKKSSRRVVVVAAAADDEEGGGG"),
+}
+
+# encode_dna的碱基编码（A/C/G/T → 0/1/2/3）在TCAG顺序中的位置
+_TCAG_RANK = (2, 1, 3, 0)
+# 密码子下标：三个碱基编码（0-4，4为N等简并碱基）按5进制组合（0-124），可放入uint8
+FRAMES = ("+1", "+2", "+3", "-1", "-2", "-3")
+
+
+def codon_table(code: int = 1) -> bytes:
+    """
+    密码子下标（0-124）→ 氨基酸的bytes.translate表：
+    含简并碱基的密码子在所有可能取值都编码同一氨基酸时取该氨基酸（如GGN → G），否则为X
+    """
+    if code not in GENETIC_CODES:
+        raise ValueError(f"不支持的遗传密码表：{code}（可选 {sorted(GENETIC_CODES)}）")
+    amino_acids = GENETIC_CODES[code][1]
+    table = bytearray(b"X" * 256)
+    for a, b, c in itertools.product(range(5), repeat=3):
+        choices = {amino_acids[_TCAG_RANK[x] * 16 + _TCAG_RANK[y] * 4 + _TCAG_RANK[z]]
+                   for x in ([a] if a < 4 else range(4))
+                   for y in ([b] if b < 4 else range(4))
+                   for z in ([c] if c < 4 else range(4))}
+        if len(choices) == 1:
+            table[a * 25 + b * 5 + c] = ord(choices.pop())
+    return bytes(table)
+
+
+def codon_index(codes: np.ndarray, circular: bool = False) -> np.ndarray:
+    """
+    每个位置起始的密码子下标（uint8）；circular为True时序列首尾相接，共len(codes)个，
+    否则只有len(codes) - 2个（不足一个密码子时为空）
+    """
+    if circular and len(codes):
+        codes = np.concatenate([codes, np.resize(codes, 2)])
+    if len(codes) < 3:
+        return np.zeros(0, dtype=np.uint8)
+    return codes[:-2] * np.uint8(25) + codes[1:-1] * np.uint8(5) + codes[2:]
+
+
+def reverse_complement_codes(codes: np.ndarray) -> np.ndarray:
+    return np.where(codes > 3, 4, 3 - np.minimum(codes, 3))[::-1].astype(np.uint8)
+
+
+def codon_set(codons: List[str]) -> np.ndarray:
+    """密码子列表（如ATG GTG TTG）→ 密码子下标的布尔查找表"""
+    flags = np.zeros(256, dtype=bool)
+    for codon in codons:
+        codes = encode_dna(codon.upper())
+        if len(codes) != 3 or (codes > 3).any():
+            raise ValueError(f"无效的密码子：{codon}")
+        flags[int(codes[0]) * 25 + int(codes[1]) * 5 + int(codes[2])] = True
+    return flags
+
+
+def six_frames(codes: np.ndarray, table: bytes, circular: bool = False) -> List[bytes]:
+    """
+    六框翻译（顺序同FRAMES）：正链三个读框与反向互补链三个读框一次算出密码子下标后按步长3切片查表；
+    circular为True时每个读框的最后几个密码子跨过原点继续读取（每个读框覆盖len(codes) // 3个密码子）
+    """
+    frames = []
+    for strand_codes in (codes, reverse_complement_codes(codes)):
+        index = codon_index(strand_codes, circular)
+        for frame in range(3):
+            codons = index[frame::3]
+            if not circular:
+                codons = codons[:(len(strand_codes) - frame) // 3]
+            else:
+                codons = codons[:len(strand_codes) // 3]
+            frames.append(codons.tobytes().translate(table))
+    return frames
+
+
+def find_orfs(codes: np.ndarray, table: bytes, starts: np.ndarray, min_length: int = 50,
+              circular: bool = False) -> List[Tuple[int, int, str, str]]:
+    """
+    六个读框上的ORF（起始密码子至终止密码子，含终止密码子）：每个终止密码子只取其上游、
+    上一个终止密码子之后的第一个起始密码子（最长ORF），氨基酸数（不含终止）≥ min_length。
+    环状基因组在三份首尾拼接的序列上查找、只保留起点落在中间一份的ORF，跨原点的ORF由此完整给出；
+    线性序列末端没有终止密码子的ORF不报告。
+    返回[(起点, 终点, 链, 蛋白序列)]，坐标为正链0-based半开区间，跨原点时终点 > L
+    """
+    length = len(codes)
+    stop_flags = np.frombuffer(table, dtype=np.uint8) == ord("*")
+    orfs = []
+    for strand, strand_codes in (("+", codes), ("-", reverse_complement_codes(codes))):
+        linear = np.concatenate([strand_codes] * 3) if circular else strand_codes
+        index = codon_index(linear)
+        lo, hi = (length, 2 * length) if circular else (0, length)
+        for frame in range(3):
+            codons = index[frame::3]
+            stop_at = np.flatnonzero(stop_flags[codons])
+            start_at = np.flatnonzero(starts[codons])
+            if not len(stop_at) or not len(start_at):
+                continue
+            previous = np.concatenate([[-1], stop_at[:-1]])
+            first = np.searchsorted(start_at, previous + 1)
+            valid = first < len(start_at)
+            first_start = start_at[np.minimum(first, len(start_at) - 1)]
+            valid &= first_start < stop_at
+            valid &= stop_at - first_start >= min_length
+            for begin, end in zip(first_start[valid].tolist(), stop_at[valid].tolist()):
+                nt_start = frame + 3 * begin
+                nt_end = frame + 3 * end + 3
+                if not lo <= nt_start < hi or (circular and nt_end - nt_start > length):
+                    continue
+                protein = codons[begin:end + 1].tobytes().translate(table).decode("ascii")
+                nt_start -= lo
+                nt_end -= lo
+                if strand == "-":
+                    nt_start, nt_end = length - nt_end, length - nt_start
+                    if nt_start < 0:
+                        nt_start, nt_end = nt_start + length, nt_end + length
+                orfs.append((nt_start, nt_end, strand, protein))
+    orfs.sort(key=lambda orf: (orf[0], orf[1]))
+    return orfs
+
+
+def translate_batches(fasta_path: str, table: bytes, starts: np.ndarray, keep_stop: bool = True,
+                      batch_bases: int = BATCH_BASES) -> Iterator[Tuple[str, str]]:
+    """
+    CDS文件批量翻译（读框+1）：每批序列首尾拼接后一次算出全部密码子下标，
+    按各条CDS的密码子起点一次查表，再按每条的密码子数切分；
+    起始密码子属于starts时首个氨基酸记为M（同Prodigal），keep_stop为False时去掉末尾的终止符
+    """
+    for batch in iter_fasta_batches(fasta_path, batch_bases):
+        index = codon_index(np.concatenate([batch.encoded(), np.full(2, 4, dtype=np.uint8)]))
+        n_codons = batch.lengths() // 3
+        total = int(n_codons.sum())
+        first_codon = np.cumsum(n_codons) - n_codons
+        positions = (np.repeat(batch.offsets[:-1], n_codons)
+                     + 3 * (np.arange(total) - np.repeat(first_codon, n_codons)))
+        codons = index[positions]
+        initiator = np.zeros(total, dtype=bool)
+        has_codon = n_codons > 0
+        initiator[first_codon[has_codon]] = starts[codons[first_codon[has_codon]]]
+        protein = np.frombuffer(codons.tobytes().translate(table), dtype=np.uint8).copy()
+        protein[initiator] = ord("M")
+        protein = protein.tobytes()
+        for i, seq_id in enumerate(batch.descriptions):
+            aa = protein[first_codon[i]:first_codon[i] + n_codons[i]].decode("ascii")
+            if not keep_stop and aa.endswith("*"):
+                aa = aa[:-1]
+            yield seq_id, aa
+
+
+def write_fasta_record(out, header: str, seq: str, line_width: int = 60) -> None:
+    out.write(f">{header}\n")
+    if line_width > 0:
+        for start in range(0, len(seq), line_width):
+            out.write(seq[start:start + line_width] + "\n")
+    else:
+        out.write(seq + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="向量化翻译：六框翻译、ORF查找（支持环状基因组跨原点与其他遗传密码表）、CDS文件批量翻译")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--fasta", required=True, help="输入FASTA")
+    common.add_argument("--output", required=True, help="输出FASTA（蛋白序列）")
+    common.add_argument("--table", type=int, default=1, choices=sorted(GENETIC_CODES),
+                        help="NCBI遗传密码表编号（默认1，Prodigal原核模式为11）")
+    common.add_argument("--line-width", type=int, default=60, help="序列换行宽度（默认60，0表示不换行）")
+
+    frames_parser = subparsers.add_parser("frames", parents=[common], help="基因组六框翻译")
+    frames_parser.add_argument("--circular", action="store_true", help="按环状基因组处理，读框跨原点继续读取")
+
+    orf_parser = subparsers.add_parser("orfs", parents=[common], help="查找ORF")
+    orf_parser.add_argument("--circular", action="store_true", help="按环状基因组处理，报告跨原点的ORF")
+    orf_parser.add_argument("--min-length", type=int, default=50, help="ORF最短氨基酸数（默认50，不含终止密码子）")
+    orf_parser.add_argument("--starts", nargs="+", default=["ATG"], help="起始密码子（默认ATG）")
+    orf_parser.add_argument("--orf-table", help="ORF坐标表输出（seq_id orf start end strand frame aa_length）")
+
+    cds_parser = subparsers.add_parser("cds", parents=[common], help="CDS文件批量翻译（读框+1）")
+    cds_parser.add_argument("--starts", nargs="+", default=["ATG", "GTG", "TTG"],
+                            help="首个密码子属于这些起始密码子时译为M（默认ATG GTG TTG，同Prodigal）")
+    cds_parser.add_argument("--strip-stop", action="store_true", help="去掉末尾的终止符*（默认保留，同Prodigal）")
+
+    args = parser.parse_args()
+    table = codon_table(args.table)
+    t0 = time.time()
+    count = 0
+    with open(args.output, "w", encoding="utf-8") as out:
+        if args.command == "frames":
+            for record in iter_fasta(args.fasta):
+                for frame, protein in zip(FRAMES, six_frames(encode_dna(record.sequence), table, args.circular)):
+                    write_fasta_record(out, f"{record.id}_frame{frame}", protein.decode("ascii"), args.line_width)
+                count += 1
+        elif args.command == "orfs":
+            starts = codon_set(args.starts)
+            orf_out = open(args.orf_table, "w", encoding="utf-8") if args.orf_table else None
+            try:
+                if orf_out:
+                    orf_out.write("seq_id\torf\tstart\tend\tstrand\tframe\taa_length\n")
+                for record in iter_fasta(args.fasta):
+                    codes = encode_dna(record.sequence)
+                    for n, (start, end, strand, protein) in enumerate(
+                            find_orfs(codes, table, starts, args.min_length, args.circular), 1):
+                        frame = f"{strand}{(start if strand == '+' else len(codes) - end) % 3 + 1}"
+                        name = f"{record.id}_orf{n}"
+                        write_fasta_record(out, f"{name} # {start + 1} # {end} # {strand} # frame={frame}",
+                                           protein, args.line_width)
+                        if orf_out:
+                            orf_out.write(f"{record.id}\t{name}\t{start}\t{end}\t{strand}\t{frame}\t"
+                                          f"{len(protein) - protein.endswith('*')}\n")
+                        count += 1
+            finally:
+                if orf_out:
+                    orf_out.close()
+        else:
+            for header, protein in translate_batches(args.fasta, table, codon_set(args.starts), not args.strip_stop):
+                write_fasta_record(out, header, protein, args.line_width)
+                count += 1
+    unit = {"frames": "条序列", "orfs": "个ORF", "cds": "条CDS"}[args.command]
+    print(f"完成（{time.time() - t0:.2f} 秒）：{count} {unit}，结果保存至：{args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,13 @@
 import os
 import sys
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "..", "tools"))
+from fasta_io import iter_fasta
+
 def parse_fasta_entries(filename):
     """解析fasta文件，返回包含4个条目的列表，每个条目是(标题行, 序列)的元组"""
-    entries = []
-    current_title = None
-    current_sequence = []
-    
-    with open(filename, 'r') as f:
-        for line in f:
-            line = line.rstrip('\n')  # 保留其他空白符，只移除换行
-            if line.startswith('>'):
-                # 如果已有正在处理的条目，先保存
-                if current_title is not None:
-                    entries.append((current_title, ''.join(current_sequence)))
-                current_title = line
-                current_sequence = []
-            elif current_title is not None:
-                current_sequence.append(line)
-    
-    # 添加最后一个条目
-    if current_title is not None:
-        entries.append((current_title, ''.join(current_sequence)))
+    # 标题行保留">"及全部描述
+    entries = [(f">{record.description}", record.sequence) for record in iter_fasta(filename)]
     
     # 验证条目数量是否为4
     if len(entries) != 4:
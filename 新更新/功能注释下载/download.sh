@@ -1,2 +1,12 @@
 cat cat_accessions.txt | xargs -I {} datasets download virus genome accession {} --include genome,cds,protein --filename {}.zip
 cat shrew_accessions.txt | xargs -I {} datasets download virus genome accession {} --include genome,cds,protein --filename {}.zip
+
+# 或用内置下载器并发下载（断点续传、完整性校验），直接写入tiqu_cds.py读取的目录
+# python fetch_genomes.py fetch --accessions cat_accessions.txt --output-dir cat
+# python fetch_genomes.py fetch --accessions shrew_accessions.txt --output-dir shrew
+# 本地替身服务器（提供fixture数据包，用于离线测试）：python fetch_genomes.py serve --fixtures cat --port 8000
+#   再以 --endpoint 'http://127.0.0.1:8000/download?accessions={accession}' 指向它
+
+# 下载后增量处理（只处理新增或变化的accession，并拼接进合并文件）
+# python incremental.py cat --accessions cat_accessions.txt --merged-dir 提取启动子
+# python incremental.py shrew --accessions shrew_accessions.txt --merged-dir 提取启动子
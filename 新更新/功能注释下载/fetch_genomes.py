@@ -0,0 +1,249 @@
+import argparse
+import hashlib
+import http.client
+import os
+import re
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# NCBI Datasets v2 REST接口（与download.sh中datasets download virus genome accession ... --include genome,cds,protein等价）
+NCBI_ENDPOINT = ("https://api.ncbi.nlm.nih.gov/datasets/v2/virus/genome/download"
+                 "?accessions={accession}&include_sequence=GENOME&include_sequence=CDS&include_sequence=PROTEIN")
+CHUNK_SIZE = 1 << 16
+
+
+def verify_archive(path: str) -> str:
+    """
+    校验数据包完整性：ZIP结构与各成员CRC（testzip），以及包内md5sum.txt中列出的文件MD5
+    返回空串表示通过，否则返回错误说明
+    """
+    try:
+        with zipfile.ZipFile(path, "r") as zf:
+            broken = zf.testzip()
+            if broken:
+                return f"成员CRC校验失败：{broken}"
+            names = set(zf.namelist())
+            if "md5sum.txt" not in names:
+                return ""
+            for line in zf.read("md5sum.txt").decode("utf-8", errors="replace").splitlines():
+                parts = line.split()
+                if len(parts) != 2:
+                    continue
+                expected, member = parts
+                if member not in names:
+                    return f"md5sum.txt中列出的文件缺失：{member}"
+                if hashlib.md5(zf.read(member)).hexdigest() != expected:
+                    return f"MD5校验失败：{member}"
+    except (zipfile.BadZipFile, OSError) as e:
+        return f"不是有效的ZIP文件：{str(e)}"
+    return ""
+
+
+class GenomeFetcher:
+    """
+    并发、可断点续传的accession下载器：
+        下载先写入<accession>.zip.part，中断后再次运行时以Range请求从已下载位置继续
+        （服务器不支持Range而返回200时从头下载）；完成后校验完整性，再原子重命名为<accession>.zip
+        endpoint为带{accession}占位符的URL模板，可指向NCBI或本地替身服务器
+    """
+
+    def __init__(self, endpoint: str, output_dir: str, workers: int = 8, retries: int = 4,
+                 timeout: float = 60.0, api_key: str = ""):
+        self.endpoint = endpoint
+        self.output_dir = output_dir
+        self.workers = workers
+        self.retries = retries
+        self.timeout = timeout
+        self.api_key = api_key
+        self.lock = threading.Lock()
+        self.bytes_done = 0
+        os.makedirs(output_dir, exist_ok=True)
+
+    def url_for(self, accession: str) -> str:
+        return self.endpoint.format(accession=urllib.parse.quote(accession))
+
+    def _download_once(self, accession: str, part_path: str) -> None:
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        request = urllib.request.Request(self.url_for(accession))
+        if offset:
+            request.add_header("Range", f"bytes={offset}-")
+        if self.api_key:
+            request.add_header("api-key", self.api_key)
+        try:
+            response = urllib.request.urlopen(request, timeout=self.timeout)
+        except urllib.error.HTTPError as e:
+            if e.code == 416 and offset:
+                # 已下载部分不小于服务器上的文件，交给完整性校验判断
+                return
+            raise
+        with response:
+            mode = "ab" if offset and response.status == 206 else "wb"
+            with open(part_path, mode) as f:
+                while True:
+                    block = response.read(CHUNK_SIZE)
+                    if not block:
+                        break
+                    f.write(block)
+                    with self.lock:
+                        self.bytes_done += len(block)
+
+    def fetch(self, accession: str, force: bool = False) -> str:
+        """下载单个accession，返回"skipped"/"downloaded"；4xx错误或多次重试仍失败时抛出RuntimeError"""
+        final_path = os.path.join(self.output_dir, f"{accession}.zip")
+        part_path = final_path + ".part"
+        if not force and os.path.exists(final_path) and not verify_archive(final_path):
+            return "skipped"
+        error = ""
+        for attempt in range(self.retries + 1):
+            if attempt:
+                time.sleep(min(30.0, 2.0 ** attempt))
+            try:
+                self._download_once(accession, part_path)
+            except urllib.error.HTTPError as e:
+                # 4xx（如accession不存在）重试也不会成功，直接失败；5xx按网络错误重试
+                if 400 <= e.code < 500:
+                    raise RuntimeError(f"{accession} 下载失败：HTTP {e.code} {e.reason}") from e
+                error = str(e)
+                continue
+            except (urllib.error.URLError, http.client.HTTPException, OSError) as e:
+                # 网络错误或传输中断（如分块响应不完整）保留.part，下次从断点继续
+                error = str(e)
+                continue
+            error = verify_archive(part_path)
+            if not error:
+                os.replace(part_path, final_path)
+                return "downloaded"
+            # 续传结果校验失败（如服务器端文件已变化），删除后从头下载
+            os.remove(part_path)
+        raise RuntimeError(f"{accession} 下载失败（重试{self.retries}次）：{error}")
+
+    def fetch_all(self, accessions: list, force: bool = False) -> dict:
+        results = {"downloaded": [], "skipped": [], "failed": []}
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {executor.submit(self.fetch, accession, force): accession for accession in accessions}
+            for n, future in enumerate(as_completed(futures), 1):
+                accession = futures[future]
+                try:
+                    status = future.result()
+                except RuntimeError as e:
+                    print(f"[{n}/{len(accessions)}] {str(e)}")
+                    results["failed"].append(accession)
+                    continue
+                results[status].append(accession)
+                print(f"[{n}/{len(accessions)}] {accession}：{'已存在且校验通过' if status == 'skipped' else '下载完成'}")
+        elapsed = max(time.time() - start, 1e-6)
+        print(f"下载 {len(results['downloaded'])}，跳过 {len(results['skipped'])}，失败 {len(results['failed'])}；"
+              f"共 {self.bytes_done / 1e6:.1f} MB，{self.bytes_done / 1e6 / elapsed:.2f} MB/s")
+        return results
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    """
+    本地替身服务器：GET /<任意路径>?accessions=<accession>... 或 GET /<accession>.zip，
+    返回fixtures目录下的<accession>.zip，支持单段Range请求（206/416）
+    """
+    fixture_dir = "."
+    ACCESSION_PARAM = re.compile(r"[?&]accessions=([^&]+)")
+
+    def do_GET(self):
+        match = self.ACCESSION_PARAM.search(self.path)
+        accession = urllib.parse.unquote(match.group(1)) if match else os.path.basename(self.path.split("?")[0])
+        if accession.endswith(".zip"):
+            accession = accession[:-4]
+        path = os.path.join(self.fixture_dir, f"{os.path.basename(accession)}.zip")
+        if not os.path.isfile(path):
+            # 状态行只能是latin-1，中文说明放在响应正文中
+            self.send_error(404, "Accession not found", explain=f"未找到accession：{accession}")
+            return
+        size = os.path.getsize(path)
+        start, end = 0, size - 1
+        status = 200
+        range_header = self.headers.get("Range", "")
+        range_match = re.match(r"bytes=(\d+)-(\d*)$", range_header.strip())
+        if range_match:
+            start = int(range_match.group(1))
+            end = min(int(range_match.group(2)), size - 1) if range_match.group(2) else size - 1
+            if start >= size:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.end_headers()
+                return
+            status = 206
+        self.send_response(status)
+        self.send_header("Content-Type", "application/zip")
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(end - start + 1))
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.end_headers()
+        with open(path, "rb") as f:
+            f.seek(start)
+            self.wfile.write(f.read(end - start + 1))
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_fixtures(fixture_dir: str, host: str = "127.0.0.1", port: int = 8000) -> ThreadingHTTPServer:
+    """启动替身服务器（后台线程），返回服务器对象；port为0时自动分配端口（server.server_address[1]）"""
+    handler = type("Handler", (FixtureHandler,), {"fixture_dir": fixture_dir})
+    server = ThreadingHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def read_accessions(path: str) -> list:
+    accessions = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            accession = line.strip()
+            if accession and accession not in accessions:
+                accessions.append(accession)
+    return accessions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="并发、可断点续传的病毒基因组数据包下载（替代download.sh）")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    fetch_parser = subparsers.add_parser("fetch", help="下载accession数据包")
+    fetch_parser.add_argument("--accessions", required=True, help="accession列表文件（如cat_accessions.txt）")
+    fetch_parser.add_argument("--output-dir", required=True, help="数据包保存目录（即tiqu_cds.py读取的目录，如cat/）")
+    fetch_parser.add_argument("--endpoint", default=NCBI_ENDPOINT, help="带{accession}占位符的下载URL模板（默认NCBI Datasets v2）")
+    fetch_parser.add_argument("--workers", type=int, default=8, help="并发下载数（默认8）")
+    fetch_parser.add_argument("--retries", type=int, default=4, help="失败重试次数（默认4）")
+    fetch_parser.add_argument("--timeout", type=float, default=60.0, help="单次请求超时秒数（默认60）")
+    fetch_parser.add_argument("--api-key", default=os.environ.get("NCBI_API_KEY", ""), help="NCBI API key（默认读取环境变量NCBI_API_KEY）")
+    fetch_parser.add_argument("--force", action="store_true", help="已存在且校验通过的数据包也重新下载")
+
+    serve_parser = subparsers.add_parser("serve", help="启动本地替身服务器，提供fixtures目录中的<accession>.zip")
+    serve_parser.add_argument("--fixtures", required=True, help="fixture数据包目录")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        server = serve_fixtures(args.fixtures, args.host, args.port)
+        print(f"替身服务器已启动：http://{args.host}:{server.server_address[1]}/?accessions={{accession}}（Ctrl+C退出）")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            server.shutdown()
+        return
+
+    fetcher = GenomeFetcher(args.endpoint, args.output_dir, args.workers, args.retries, args.timeout, args.api_key)
+    results = fetcher.fetch_all(read_accessions(args.accessions), args.force)
+    if results["failed"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
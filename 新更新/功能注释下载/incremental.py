@@ -0,0 +1,287 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+import zipfile
+
+MANIFEST_NAME = ".manifest.json"
+FRAGMENT_DIR = ".fragments"
+CDS_MEMBER = "ncbi_dataset/data/cds.fna"
+GENOME_MEMBER = "ncbi_dataset/data/genomic.fna"
+REGION_COUNT = 4
+
+
+def sha256_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def file_fingerprint(path: str) -> dict:
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def parse_fasta_entries(text: str) -> list:
+    """解析FASTA文本，返回[(标题行, 序列)]，标题行保留">"及全部描述（与tiqu_4cds.py一致）"""
+    entries = []
+    title, parts = None, []
+    for line in text.splitlines():
+        if line.startswith(">"):
+            if title is not None:
+                entries.append((title, "".join(parts)))
+            title, parts = line, []
+        elif title is not None:
+            parts.append(line.strip())
+    if title is not None:
+        entries.append((title, "".join(parts)))
+    return entries
+
+
+def extract_promoter(title: str, genome: str, promoter_length: int):
+    """
+    按CDS标题行中第一段的起止位点（>序列名:起点-终点,...）提取上游promoter_length bp，
+    环状基因组跨越原点时从末尾补齐（与tiqu_promoter.py一致）；返回(输出标题, 序列)，无法解析时返回None
+    """
+    try:
+        seq_name, coords = title[1:].split()[0].split(":", 1)
+        start_str, end_str = coords.split(",")[0].split("-")[:2]
+        cds_start, cds_end = int(start_str), int(end_str)
+    except ValueError:
+        print(f"警告: 无法解析行, 格式错误. 跳过此行: {title}", file=sys.stderr)
+        return None
+    start_index = cds_start - promoter_length - 1
+    if start_index >= 0:
+        promoter = genome[start_index:cds_start - 1]
+    else:
+        promoter = genome[start_index:] + genome[:cds_start - 1]
+    if len(promoter) != promoter_length:
+        print(f"警告: 为'{seq_name}'提取的启动子长度不为{promoter_length} (实际为{len(promoter)}).", file=sys.stderr)
+    return f">{seq_name}:{cds_start}_{cds_end}", promoter
+
+
+def derive_fragments(zip_path: str, promoter_length: int) -> dict:
+    """
+    从单个accession的压缩包生成全部派生片段（各片段均为可直接拼接进合并文件的FASTA文本）：
+        cds: cds.fna原文（即tiqu_cds.py的output/<accession>.fasta）
+        genome: genomic.fna
+        region_1..4: 第i个CDS条目（tiqu_4cds.py的拆分方式）
+        promoter_1..4: 第i个CDS上游启动子（tiqu_promoter.py的提取方式）
+    """
+    with zipfile.ZipFile(zip_path, "r") as zf:
+        names = zf.namelist()
+        cds_name = next((n for n in names if n.endswith(CDS_MEMBER)), None)
+        genome_name = next((n for n in names if n.endswith(GENOME_MEMBER)), None)
+        if cds_name is None:
+            raise ValueError(f"在ZIP文件 {zip_path} 中未找到{CDS_MEMBER}")
+        cds_text = zf.read(cds_name).decode("utf-8", errors="replace")
+        genome_text = zf.read(genome_name).decode("utf-8", errors="replace") if genome_name else ""
+
+    fragments = {"cds": cds_text, "genome": genome_text}
+    entries = parse_fasta_entries(cds_text)
+    genome_entries = parse_fasta_entries(genome_text)
+    genome = genome_entries[0][1] if genome_entries else ""
+    if len(entries) != REGION_COUNT:
+        print(f"警告：{zip_path} 包含 {len(entries)} 个CDS条目，预期为{REGION_COUNT}个，不参与分区合并")
+        return fragments
+    for i, (title, sequence) in enumerate(entries, start=1):
+        fragments[f"region_{i}"] = f"{title}\n{sequence}\n"
+        promoter = extract_promoter(title, genome, promoter_length) if genome else None
+        if promoter:
+            fragments[f"promoter_{i}"] = f"{promoter[0]}\n{promoter[1]}\n"
+    return fragments
+
+
+class Manifest:
+    """
+    增量处理清单（<物种目录>/.manifest.json）：
+        accessions: {accession: {"archive": {size, mtime_ns, sha256}, "artifacts": {片段名: sha256}}}
+        merged: {合并文件路径: {"accessions": [已写入的accession顺序], "fingerprint": {size, mtime_ns}}}
+    每处理完一个accession立即原子写回，中断后重新运行从最后一个已完成记录继续
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.data = {"accessions": {}, "merged": {}}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.data = json.load(f)
+
+    def save(self) -> None:
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.path)
+
+
+class IncrementalPipeline:
+    def __init__(self, species: str, archive_dir: str, merged_dir: str, promoter_length: int = 500):
+        self.species = species
+        self.archive_dir = archive_dir
+        self.merged_dir = merged_dir
+        self.promoter_length = promoter_length
+        self.cds_dir = os.path.join(archive_dir, "output")
+        self.fragment_dir = os.path.join(archive_dir, FRAGMENT_DIR)
+        os.makedirs(self.cds_dir, exist_ok=True)
+        os.makedirs(self.fragment_dir, exist_ok=True)
+        os.makedirs(merged_dir, exist_ok=True)
+        self.manifest = Manifest(os.path.join(archive_dir, MANIFEST_NAME))
+
+    def merged_outputs(self) -> dict:
+        """合并输出文件 → 对应片段名"""
+        outputs = {
+            f"{self.species}_cds.fasta": "cds",
+            f"{self.species}_genome.fasta": "genome",
+        }
+        for i in range(1, REGION_COUNT + 1):
+            outputs[f"{self.species}_{i}.fasta"] = f"region_{i}"
+            outputs[f"{self.species}_pro_{i}.fasta"] = f"promoter_{i}"
+        return {os.path.join(self.merged_dir, name): key for name, key in outputs.items()}
+
+    def fragment_path(self, accession: str) -> str:
+        return os.path.join(self.fragment_dir, f"{accession}.json")
+
+    def load_fragments(self, accession: str) -> dict:
+        with open(self.fragment_path(accession), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def fragments_intact(self, accession: str, record: dict) -> bool:
+        """已记录的派生片段仍在磁盘上且哈希一致"""
+        try:
+            fragments = self.load_fragments(accession)
+        except (OSError, ValueError):
+            return False
+        if {k: sha256_bytes(v.encode("utf-8")) for k, v in fragments.items()} != record.get("artifacts"):
+            return False
+        cds_path = os.path.join(self.cds_dir, f"{accession}.fasta")
+        return os.path.exists(cds_path) and sha256_file(cds_path) == record["artifacts"].get("cds")
+
+    def update_accession(self, accession: str) -> str:
+        """
+        处理单个accession：压缩包指纹（大小、修改时间）未变且派生片段完好则跳过；
+        指纹变化时再比较内容哈希，内容相同只更新指纹。返回"new"/"changed"/"unchanged"/"missing"
+        """
+        zip_path = os.path.join(self.archive_dir, f"{accession}.zip")
+        if not os.path.exists(zip_path):
+            print(f"警告：未找到压缩包 {zip_path}，跳过")
+            return "missing"
+        records = self.manifest.data["accessions"]
+        record = records.get(accession)
+        fingerprint = file_fingerprint(zip_path)
+        if record and self.fragments_intact(accession, record):
+            archive = record["archive"]
+            if {"size": archive["size"], "mtime_ns": archive["mtime_ns"]} == fingerprint:
+                return "unchanged"
+            digest = sha256_file(zip_path)
+            if digest == archive["sha256"]:
+                archive.update(fingerprint)
+                self.manifest.save()
+                return "unchanged"
+        else:
+            digest = sha256_file(zip_path)
+
+        fragments = derive_fragments(zip_path, self.promoter_length)
+        with open(os.path.join(self.cds_dir, f"{accession}.fasta"), "w", encoding="utf-8") as f:
+            f.write(fragments["cds"])
+        tmp_path = self.fragment_path(accession) + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(fragments, f, ensure_ascii=False)
+        os.replace(tmp_path, self.fragment_path(accession))
+        status = "changed" if record else "new"
+        records[accession] = {
+            "archive": dict(fingerprint, sha256=digest),
+            "artifacts": {k: sha256_bytes(v.encode("utf-8")) for k, v in fragments.items()},
+        }
+        self.manifest.save()
+        return status
+
+    def update_merged(self, accessions: list, changed: set) -> None:
+        """
+        更新合并文件：若文件自上次写入后未被改动、已写入的accession是当前列表的前缀且其中没有变化的accession，
+        只把新增accession的片段追加到文件末尾；否则按当前顺序由各accession的片段重新拼接（不再读取压缩包）
+        """
+        merged = self.manifest.data["merged"]
+        cache = {}
+
+        def fragment(accession, key):
+            if accession not in cache:
+                cache[accession] = self.load_fragments(accession)
+            return cache[accession].get(key, "")
+
+        for path, key in self.merged_outputs().items():
+            previous = merged.get(path)
+            written = previous["accessions"] if previous else []
+            can_append = (
+                previous is not None
+                and os.path.exists(path)
+                and file_fingerprint(path) == previous["fingerprint"]
+                and accessions[:len(written)] == written
+                and not changed.intersection(written)
+            )
+            if can_append and len(written) == len(accessions):
+                continue
+            if can_append:
+                with open(path, "a", encoding="utf-8") as f:
+                    for accession in accessions[len(written):]:
+                        f.write(fragment(accession, key))
+                action = f"追加 {len(accessions) - len(written)} 个accession"
+            else:
+                with open(path, "w", encoding="utf-8") as f:
+                    for accession in accessions:
+                        f.write(fragment(accession, key))
+                action = f"重新拼接 {len(accessions)} 个accession"
+            merged[path] = {"accessions": list(accessions), "fingerprint": file_fingerprint(path)}
+            self.manifest.save()
+            print(f"{path}：{action}")
+
+    def run(self, accessions: list) -> None:
+        counts = {"new": 0, "changed": 0, "unchanged": 0, "missing": 0}
+        changed = set()
+        done = []
+        for accession in accessions:
+            try:
+                status = self.update_accession(accession)
+            except (zipfile.BadZipFile, ValueError, OSError) as e:
+                print(f"处理 {accession} 时出错: {str(e)}")
+                status = "missing"
+            counts[status] += 1
+            if status == "changed":
+                changed.add(accession)
+            if status != "missing":
+                done.append(accession)
+        print(f"新增 {counts['new']}，变化 {counts['changed']}，未变 {counts['unchanged']}，缺失/出错 {counts['missing']}")
+        self.update_merged(done, changed)
+
+
+def read_accessions(path: str) -> list:
+    accessions = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            accession = line.strip()
+            if accession and accession not in accessions:
+                accessions.append(accession)
+    return accessions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按accession增量处理：只对新增或变化的压缩包提取CDS/基因组/分区/启动子，并拼接进合并文件")
+    parser.add_argument("species", help="物种名（如cat、shrew），用于合并文件命名")
+    parser.add_argument("--accessions", required=True, help="accession列表文件（如cat_accessions.txt）")
+    parser.add_argument("--archive-dir", help="accession压缩包所在目录（默认与物种名相同）")
+    parser.add_argument("--merged-dir", default=".", help="合并文件输出目录（默认当前目录）")
+    parser.add_argument("--promoter-length", type=int, default=500, help="启动子长度（默认500）")
+    args = parser.parse_args()
+
+    pipeline = IncrementalPipeline(args.species, args.archive_dir or args.species, args.merged_dir, args.promoter_length)
+    pipeline.run(read_accessions(args.accessions))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import hashlib
+import os
+import sys
+import tempfile
+import time
+import unittest
+import zipfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from fetch_genomes import GenomeFetcher, serve_fixtures, verify_archive
+
+
+def make_fixture(path: str) -> bytes:
+    """写一个与NCBI数据包结构相同的小数据包（含md5sum.txt），返回其字节内容"""
+    members = {
+        "ncbi_dataset/data/genomic.fna": b">NC_000001.1 test\n" + b"ACGT" * 2000 + b"\n",
+        "ncbi_dataset/data/cds.fna": b">NC_000001.1:1-300 test\n" + b"ATG" * 100 + b"\n",
+    }
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_STORED) as zf:
+        for name, data in members.items():
+            zf.writestr(name, data)
+        zf.writestr("md5sum.txt", "".join(f"{hashlib.md5(data).hexdigest()}  {name}\n"
+                                          for name, data in members.items()))
+    with open(path, "rb") as f:
+        return f.read()
+
+
+class FetchGenomesTest(unittest.TestCase):
+    """替身服务器（临时端口）上的下载测试：完整下载、.part断点续传、未知accession返回404"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.fixtures = os.path.join(self.tmp.name, "fixtures")
+        self.output = os.path.join(self.tmp.name, "output")
+        os.makedirs(self.fixtures)
+        self.payload = make_fixture(os.path.join(self.fixtures, "NC_000001.1.zip"))
+        self.server = serve_fixtures(self.fixtures, port=0)
+        endpoint = f"http://127.0.0.1:{self.server.server_address[1]}/download?accessions={{accession}}"
+        self.fetcher = GenomeFetcher(endpoint, self.output, workers=2, retries=4, timeout=10)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp.cleanup()
+
+    def test_complete_download(self):
+        self.assertEqual(self.fetcher.fetch("NC_000001.1"), "downloaded")
+        final_path = os.path.join(self.output, "NC_000001.1.zip")
+        with open(final_path, "rb") as f:
+            self.assertEqual(f.read(), self.payload)
+        self.assertEqual(verify_archive(final_path), "")
+        self.assertFalse(os.path.exists(final_path + ".part"))
+        self.assertEqual(self.fetcher.fetch("NC_000001.1"), "skipped")
+
+    def test_resume_from_part(self):
+        half = len(self.payload) // 2
+        os.makedirs(self.output, exist_ok=True)
+        with open(os.path.join(self.output, "NC_000001.1.zip.part"), "wb") as f:
+            f.write(self.payload[:half])
+        self.assertEqual(self.fetcher.fetch("NC_000001.1"), "downloaded")
+        with open(os.path.join(self.output, "NC_000001.1.zip"), "rb") as f:
+            self.assertEqual(f.read(), self.payload)
+        # 只传输了剩余部分（Range请求得到206）
+        self.assertEqual(self.fetcher.bytes_done, len(self.payload) - half)
+
+    def test_unknown_accession_fails_without_retry(self):
+        t0 = time.time()
+        with self.assertRaises(RuntimeError) as context:
+            self.fetcher.fetch("NC_999999.1")
+        self.assertIn("404", str(context.exception))
+        # 4xx不重试（重试会有2/4/8/16秒的退避）
+        self.assertLess(time.time() - t0, 1.5)
+        results = self.fetcher.fetch_all(["NC_999999.1", "NC_000001.1"])
+        self.assertEqual(results["failed"], ["NC_999999.1"])
+        self.assertEqual(results["downloaded"], ["NC_000001.1"])
+
+
+if __name__ == "__main__":
+    unittest.main()
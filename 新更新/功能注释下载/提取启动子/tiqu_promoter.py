@@ -1,41 +1,33 @@
 import argparse
+import os
 import sys
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "tools"))
+from fasta_io import iter_fasta
+from promoter_windows import CircularGenome, parse_windows, sweep_windows
+
 def parse_fasta(fasta_file: str) -> dict[str, str]:
     """
     解析一个FASTA文件并返回一个序列名称到序列的字典。
     序列中的换行符会被移除。
     """
-    sequences = {}
-    current_seq_id = None
-    current_seq_parts = []
     try:
-        with open(fasta_file, 'r') as f:
-            for line in f:
-                line = line.strip()
-                if not line:
-                    continue
-                if line.startswith('>'):
-                    # 如果已有序列，先保存
-                    if current_seq_id:
-                        sequences[current_seq_id] = ''.join(current_seq_parts)
-                    
-                    # 记录新的序列ID，注意去掉'>'和可能存在的空格
-                    current_seq_id = line[1:].split()[0]
-                    current_seq_parts = []
-                else:
-                    if current_seq_id:
-                        current_seq_parts.append(line)
-        
-        # 保存文件中的最后一个序列
-        if current_seq_id:
-            sequences[current_seq_id] = ''.join(current_seq_parts)
-            
+        return {record.id: record.sequence for record in iter_fasta(fasta_file) if record.id}
     except FileNotFoundError:
         print(f"错误: 文件未找到 -> {fasta_file}", file=sys.stderr)
         sys.exit(1) # 退出程序
-        
-    return sequences
+
+def parse_cat_line(line: str) -> tuple[str, int, int]:
+    """
+    解析cat文件中的一行，返回(序列名称, 第一段起始位点, 第一段终止位点)
+    格式: >序列名称:第一段起始位点-第一段终止位点,第二段...
+    """
+    header = line[1:]
+    seq_name, coords_str = header.split(':', 1)
+    first_coord_pair = coords_str.split('_')[0]
+    start_str, end_str = first_coord_pair.split('-')
+    return seq_name, int(start_str), int(end_str)
+
 
 def extract_promoters(cat_file: str, genome_dict: dict, output_file: str):
     """
@@ -53,14 +45,7 @@ def extract_promoters(cat_file: str, genome_dict: dict, output_file: str):
                 # --- 1. 解析cat文件中的行 ---
                 # >序列名称:第一段起始位点-第一段终止位点,第二段...
                 try:
-                    header = line[1:]
-                    seq_name, coords_str = header.split(':', 1)
-                    first_coord_pair = coords_str.split('_')[0]
-                    start_str, end_str = first_coord_pair.split('-')
-                    
-                    cds_start = int(start_str)
-                    cds_end = int(end_str)
-                    
+                    seq_name, cds_start, cds_end = parse_cat_line(line)
                 except ValueError:
                     print(f"警告: 无法解析行, 格式错误. 跳过此行: {line}", file=sys.stderr)
                     continue
@@ -121,6 +106,34 @@ def extract_promoters(cat_file: str, genome_dict: dict, output_file: str):
     print(f"启动子序列提取完成，已保存至: {output_file}")
 
 
+def iter_window_records(cat_file: str, genome_dict: dict):
+    """
+    扫描模式的记录生成器：逐行解析cat文件，给出(输出FASTA头, 环状基因组, CDS起始位点)
+    每个基因组只建立一次CircularGenome，所有窗口共用同一环状索引
+    """
+    genomes = {}
+    try:
+        with open(cat_file, 'r') as cat_f:
+            for line in cat_f:
+                line = line.strip()
+                if not line or not line.startswith('>'):
+                    continue
+                try:
+                    seq_name, cds_start, cds_end = parse_cat_line(line)
+                except ValueError:
+                    print(f"警告: 无法解析行, 格式错误. 跳过此行: {line}", file=sys.stderr)
+                    continue
+                if seq_name not in genome_dict:
+                    print(f"警告: 在Domestic基因组文件中未找到序列 '{seq_name}'. 跳过.", file=sys.stderr)
+                    continue
+                if seq_name not in genomes:
+                    genomes[seq_name] = CircularGenome(genome_dict[seq_name])
+                yield f"{seq_name}:{cds_start}_{cds_end}", genomes[seq_name], cds_start
+    except FileNotFoundError:
+        print(f"错误: 输入文件未找到 -> {cat_file}", file=sys.stderr)
+        sys.exit(1)
+
+
 def main():
     """
     主函数，用于解析命令行参数并启动程序。
@@ -148,6 +161,17 @@ def main():
         help='输出启动子序列的FASTA文件名。'
     )
     
+    parser.add_argument(
+        '--windows',
+        help='扫描模式：一次提取多个窗口，逗号分隔的"上游[:下游]"列表，如 100,250,500,1000:100。\n'
+             '每个窗口输出一个文件（--output_file加_up{上游}_down{下游}后缀）。'
+    )
+
+    parser.add_argument(
+        '--columnar',
+        help='扫描模式下改为输出单个列式TSV文件（每个窗口一列），不再逐窗口输出FASTA。'
+    )
+
     args = parser.parse_args()
     
     # 1. 解析基因组文件
@@ -159,6 +183,17 @@ def main():
     print(f"解析完成，共找到 {len(genome_sequences)} 条序列。")
     
     # 2. 提取启动子并写入文件
+    if args.windows:
+        try:
+            windows = parse_windows(args.windows)
+        except ValueError as e:
+            parser.error(str(e))
+        print(f"扫描模式：根据 {args.cat_file} 一次提取 {len(windows)} 个窗口...")
+        count = sweep_windows(iter_window_records(args.cat_file, genome_sequences), windows,
+                              args.output_file, args.columnar, fasta_outputs=not args.columnar)
+        print(f"共处理 {count} 个CDS")
+        return
+
     print(f"正在根据 {args.cat_file} 提取启动子...")
     extract_promoters(args.cat_file, genome_sequences, args.output_file)
 